@@ -3,26 +3,11 @@ import dash_bootstrap_components as dbc
 import sys
 import os
 
-core_path = os.path.abspath(os.path.join(os.getcwd(), 'core'))
-sys.path.append(core_path)
-
-pipeline_path = os.path.abspath(os.path.join(os.getcwd(), 'core', 'pipeline'))
-sys.path.append(pipeline_path)
-
-interfaces_path = os.path.abspath(os.path.join(os.getcwd(), 'core', 'interfaces'))
-sys.path.append(interfaces_path)
-
-filters_path = os.path.abspath(os.path.join(os.getcwd(), 'core', 'pipeline', 'filters'))
-sys.path.append(filters_path)
-
-convolutions_path = os.path.abspath(os.path.join(os.getcwd(), 'core', 'pipeline', 'convolutions'))
-sys.path.append(convolutions_path)
-
-edges_path = os.path.abspath(os.path.join(os.getcwd(), 'core', 'pipeline', 'edges'))
-sys.path.append(edges_path)
-
-callbacks_path = os.path.abspath(os.path.join(os.getcwd(), 'layout','callbacks'))
-sys.path.append(callbacks_path)
+# Core modules import each other as top-level 'interfaces.*' and 'pipeline.*'
+# modules, and operators as 'filters.*', 'convolutions.*' and 'edges.*'.
+root_path = os.path.dirname(os.path.abspath(__file__))
+for path in ('core', os.path.join('core', 'pipeline')):
+    sys.path.append(os.path.join(root_path, path))
 
 app = dash.Dash(
     __name__,
@@ -33,10 +18,10 @@ app.title = "Image Editor"
 
 from layout.layout import create_layout
 # from layout.callbacks.upload_image import register_callbacks as register_upload_callbacks
-from layout.callbacks.callbacks import register_callbacks 
+from layout.callbacks.callbacks import register_callbacks, TIMING_PANEL
 
 
-app.layout = create_layout()
+app.layout = create_layout(timing_panel=TIMING_PANEL)
 
 register_callbacks(app)
 
@@ -0,0 +1,454 @@
+"""Micro-benchmarks of the operators, pipelines and image analytics.
+
+Every operator is timed over a matrix of resolutions, working dtypes,
+channel layouts and kernel sizes, together with a few typical pipeline
+chains (on the whole image, in tiles, and on thumbnails cut from it, one
+by one and batched) and the analytics behind the histogram and statistics
+panels. For
+each case the best and median wall time, the throughput in megapixels per
+second and the peak memory traced by ``tracemalloc`` are recorded.
+
+The time to import the entry points in a fresh interpreter is measured
+too and checked against a cold-start budget, since every batch worker and
+app process pays it.
+
+Results are written as JSON tagged with the machine they were measured on
+and compared with a stored baseline of the same machine; cases that got
+slower (or use more memory) than the baseline allows are reported and make
+the command exit with status 1.
+
+Example:
+    python benchmark.py --quick --save-baseline
+    python benchmark.py --quick -k "*gaussian*"
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+root_path = os.path.dirname(os.path.abspath(__file__))
+for path in ('core', os.path.join('core', 'pipeline')):
+    sys.path.append(os.path.join(root_path, path))
+
+import numpy as np
+import scipy
+from pipeline.analytics import compute_analytics
+from pipeline.batching import execute_batches
+from pipeline.precision import PRECISIONS, saturate
+from pipeline.recipes import build_pipeline, parse_recipe
+from pipeline.registry import list_operators
+from pipeline.step_cache import StepCache
+from layout.callbacks.utils import generate_histogram, generate_image_stats, generate_projections
+
+# Resolutions in megapixels (10**6 pixels), at a 4:3 aspect ratio.
+RESOLUTIONS = (0.3, 2, 12, 50)
+QUICK_RESOLUTIONS = (0.3, 2)
+CHANNEL_LAYOUTS = {'gray': 1, 'rgb': 3, 'rgba': 4}
+KERNEL_SIZES = (3, 7, 15, 31)
+QUICK_KERNEL_SIZES = (3, 15)
+
+# Parameters of the operators without a kernel size. Point operators get
+# values that change every pixel, so no shortcut hides their cost.
+OPERATOR_PARAMS: Dict[str, Dict[str, Any]] = {
+    'brightness': {'value': 20},
+    'contrast': {'value': 1.2},
+    'grayscale': {'method': 'luminosity', 'intensity': 1.0},
+    'binarization': {'threshold': 128},
+    'negative': {},
+    'sobel': {'threshold': 64},
+    'roberts': {'threshold': 32},
+}
+# Parameters of the convolutions, for a given kernel size.
+KERNEL_PARAMS: Dict[str, Callable[[int], Dict[str, Any]]] = {
+    'average': lambda size: {'kernel_size': size},
+    'gaussian': lambda size: {'kernel_size': size, 'sigma': size / 6},
+    'sharpening': lambda size: {'kernel_size': size, 'alpha': 1.0},
+}
+# Typical chains, run through ImagePipeline without a step cache.
+CHAINS: Dict[str, List[Dict[str, Any]]] = {
+    'point': [{'name': 'brightness', 'params': {'value': 20}},
+              {'name': 'contrast', 'params': {'value': 1.2}},
+              {'name': 'negative'}],
+    'linear': [{'name': 'average', 'params': {'kernel_size': 5}},
+               {'name': 'gaussian', 'params': {'kernel_size': 7, 'sigma': 1.5}},
+               {'name': 'sharpening', 'params': {'kernel_size': 3, 'alpha': 1.0}}],
+    'edges': [{'name': 'grayscale'},
+              {'name': 'gaussian', 'params': {'kernel_size': 5, 'sigma': 1.0}},
+              {'name': 'sobel', 'params': {'threshold': 64}}],
+}
+# Side of the thumbnails the chains are also run on, one by one and batched.
+THUMBNAIL_SIZE = 64
+
+# A case is only reported as a regression when it got slower by more than
+# the tolerance and by at least this many seconds, to ignore timer noise.
+MIN_REGRESSION_SECONDS = 0.002
+# Likewise for peak memory, in bytes.
+MIN_REGRESSION_BYTES = 2**20
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_MIN_TIME = 0.5
+DEFAULT_MAX_REPEATS = 20
+# Seconds allowed for importing each entry point in a fresh interpreter. On
+# the reference machine they took 0.45 s (main) and 1.2 s (app) while every
+# operator, scipy and pandas were imported up front.
+STARTUP_BUDGETS = {'main': 0.25, 'app': 1.0}
+STARTUP_REPEATS = 5
+RESULTS_DIR = os.path.join(root_path, 'benchmarks')
+
+
+class Case(NamedTuple):
+    """One benchmark: a function of the input image, and what it is."""
+    id: str
+    group: str
+    name: str
+    params: Dict[str, Any]
+    run: Callable[[np.array], Any]
+
+
+def machine_info() -> Dict[str, Any]:
+    """Describe the machine and the libraries the results depend on."""
+    return {
+        'hostname': platform.node(),
+        'system': platform.system(),
+        'release': platform.release(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+    }
+
+
+def machine_tag(info: Dict[str, Any]) -> str:
+    """A file-name friendly name of the machine, e.g. ``host-Linux-x86_64-8cpu``.
+
+    Library versions are left out, so upgrading them is measured against the
+    same baseline.
+    """
+    tag = f"{info['hostname']}-{info['system']}-{info['machine']}-{info['cpu_count']}cpu"
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', tag)
+
+
+def image_shape(megapixels: float, channels: int) -> Tuple[int, ...]:
+    """The shape of a 4:3 image of about ``megapixels`` million pixels."""
+    height = max(1, round((megapixels * 1e6 * 3 / 4) ** 0.5))
+    width = max(1, round(megapixels * 1e6 / height))
+    return (height, width) if channels == 1 else (height, width, channels)
+
+
+def make_image(shape: Tuple[int, ...], dtype: np.dtype, seed: int = 0) -> np.array:
+    """A reproducible read-only test image with values in [0, 255].
+
+    Random values are blurred along the rows, so the image has both noise
+    and smooth regions like a photograph.
+    """
+    rng = np.random.default_rng(seed)
+    img = rng.integers(0, 256, size=shape, dtype=np.uint8)
+    smooth = np.cumsum(img, axis=1, dtype=np.uint32)
+    img[:, 8:] = (smooth[:, 8:] - smooth[:, :-8]) // 8
+    img = img.astype(dtype)
+    img.setflags(write=False)
+    return img
+
+
+def iter_cases(kernel_sizes: Tuple[int, ...], precision: str) -> Iterator[Case]:
+    """All cases for images of one working precision."""
+    for spec in list_operators():
+        name = spec.name
+        filter_class, params_class = spec.load()
+        if name in KERNEL_PARAMS:
+            variants = [KERNEL_PARAMS[name](size) for size in kernel_sizes]
+        else:
+            variants = [OPERATOR_PARAMS.get(name, {})]
+        for values in variants:
+            params = params_class(**values)
+            params.validate()
+            suffix = f"/k{values['kernel_size']}" if 'kernel_size' in values else ''
+            yield Case(f"operator/{name}{suffix}", 'operator', name, values,
+                       lambda img, filter=filter_class(), params=params: filter.apply(img, params))
+    for name, steps in CHAINS.items():
+        recipe = {'precision': precision, 'steps': steps}
+        yield Case(f"pipeline/{name}", 'pipeline', name, {'steps': steps},
+                   lambda img, recipe=recipe: build_pipeline(img, recipe, StepCache(0)).execute())
+        yield Case(f"pipeline/{name}-tiled", 'pipeline', f"{name}-tiled", {'steps': steps},
+                   lambda img, recipe=recipe: build_pipeline(img, recipe, StepCache(0)).execute_tiled())
+        yield Case(f"pipeline/{name}-thumbnails", 'pipeline', f"{name}-thumbnails", {'steps': steps},
+                   lambda img, recipe=recipe: run_thumbnails(img, recipe))
+        yield Case(f"pipeline/{name}-batched", 'pipeline', f"{name}-batched", {'steps': steps},
+                   lambda img, recipe=recipe: run_thumbnails(img, recipe, batched=True))
+    yield Case("analytics/compute", 'analytics', 'compute', {},
+               lambda img: compute_analytics(saturate(img, np.uint8)))
+    yield Case("analytics/figures", 'analytics', 'figures', {}, render_analytics)
+
+
+def cut_thumbnails(img: np.array, size: int = THUMBNAIL_SIZE) -> List[np.array]:
+    """Split an image into ``size`` x ``size`` views, dropping partial ones at the edges."""
+    return [img[top:top + size, left:left + size]
+            for top in range(0, img.shape[0] - size + 1, size)
+            for left in range(0, img.shape[1] - size + 1, size)]
+
+
+def run_thumbnails(img: np.array, recipe: Dict[str, Any], batched: bool = False):
+    """Run a recipe on every thumbnail of an image, one pipeline per
+    thumbnail or stacked into batches by ``execute_batches``.
+    """
+    if batched:
+        precision, steps = parse_recipe(recipe)
+        for _ in execute_batches(cut_thumbnails(img), steps, precision):
+            pass
+        return
+    for thumbnail in cut_thumbnails(img):
+        build_pipeline(thumbnail, recipe, StepCache(0)).execute()
+
+
+def render_analytics(img: np.array):
+    """Build the histogram, projection and statistics panels of an image."""
+    analytics = compute_analytics(saturate(img, np.uint8))
+    return generate_histogram(analytics), generate_projections(analytics), generate_image_stats(analytics)
+
+
+def time_case(run: Callable[[], Any], min_time: float, max_repeats: int) -> List[float]:
+    """Run once to warm up, then repeat until ``min_time`` seconds have passed.
+
+    Returns:
+        List[float]: The wall time of every repeat, at least one.
+    """
+    run()
+    times = []
+    while len(times) < max_repeats and (not times or sum(times) < min_time):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def peak_memory(run: Callable[[], Any]) -> int:
+    """Bytes allocated at the peak of one run, beyond what was allocated before.
+
+    NumPy reports its data buffers to ``tracemalloc``, so array temporaries
+    are included. Tracing slows allocations down, hence the separate run.
+    """
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        run()
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(resolutions: Tuple[float, ...], precisions: Tuple[str, ...], layouts: Tuple[str, ...],
+                   kernel_sizes: Tuple[int, ...], patterns: Optional[List[str]] = None,
+                   min_time: float = DEFAULT_MIN_TIME, max_repeats: int = DEFAULT_MAX_REPEATS,
+                   memory: bool = True, report: Callable[[Dict[str, Any]], None] = None) -> List[Dict[str, Any]]:
+    """Run every case of the matrix whose id matches one of ``patterns``.
+
+    Case ids look like ``operator/gaussian/k7/12MP/uint8/rgb``. Cases that
+    raise (e.g. an operator that does not support a channel layout) are
+    recorded with their error instead of timings.
+
+    Returns:
+        List[Dict[str, Any]]: One result per case.
+    """
+    results = []
+    for megapixels in resolutions:
+        for precision in precisions:
+            for layout in layouts:
+                shape = image_shape(megapixels, CHANNEL_LAYOUTS[layout])
+                suffix = f"{megapixels:g}MP/{precision}/{layout}"
+                cases = [case for case in iter_cases(kernel_sizes, precision)
+                         if not patterns or any(fnmatch.fnmatch(f"{case.id}/{suffix}", pattern)
+                                                for pattern in patterns)]
+                if not cases:
+                    continue
+                img = make_image(shape, PRECISIONS[precision])
+                for case in cases:
+                    result = {
+                        'id': f"{case.id}/{suffix}",
+                        'group': case.group,
+                        'name': case.name,
+                        'params': case.params,
+                        'megapixels': megapixels,
+                        'shape': list(shape),
+                        'precision': precision,
+                        'layout': layout,
+                    }
+                    run = lambda case=case: case.run(img)
+                    try:
+                        times = time_case(run, min_time, max_repeats)
+                        best = min(times)
+                        result.update({
+                            'seconds': best,
+                            'median_seconds': float(np.median(times)),
+                            'repeats': len(times),
+                            'megapixels_per_second': shape[0] * shape[1] / 1e6 / best,
+                            'peak_bytes': peak_memory(run) if memory else None,
+                        })
+                    except (Exception, MemoryError) as exc:
+                        result['error'] = f"{type(exc).__name__}: {exc}"
+                    results.append(result)
+                    if report is not None:
+                        report(result)
+                del img
+    return results
+
+
+def time_startup(module: str) -> float:
+    """Seconds a fresh interpreter takes to import ``module`` from the project root."""
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    output = subprocess.run([sys.executable, '-c', code], cwd=root_path, capture_output=True,
+                            text=True, check=True).stdout
+    return float(output.split()[-1])
+
+
+def run_startup_benchmarks(patterns: Optional[List[str]] = None, repeats: int = STARTUP_REPEATS,
+                           report: Callable[[Dict[str, Any]], None] = None) -> List[Dict[str, Any]]:
+    """Time the imports of the entry points (cases ``startup/<module>``).
+
+    Returns:
+        List[Dict[str, Any]]: One result per entry point, with its budget.
+    """
+    results = []
+    for module, budget in STARTUP_BUDGETS.items():
+        result = {'id': f"startup/{module}", 'group': 'startup', 'name': module, 'budget_seconds': budget}
+        if patterns and not any(fnmatch.fnmatch(result['id'], pattern) for pattern in patterns):
+            continue
+        try:
+            times = [time_startup(module) for _ in range(repeats)]
+            result.update({'seconds': min(times), 'median_seconds': float(np.median(times)), 'repeats': repeats})
+        except (subprocess.CalledProcessError, ValueError) as exc:
+            result['error'] = f"{type(exc).__name__}: {exc}"
+        results.append(result)
+        if report is not None:
+            report(result)
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]],
+            tolerance: float = DEFAULT_TOLERANCE) -> List[Dict[str, Any]]:
+    """Find the cases that got slower or use more memory than in ``baseline``.
+
+    A case regresses when its best time (or peak memory) exceeds the
+    baseline's by more than ``tolerance`` (a fraction) and by more than the
+    noise floor. Cases missing from either side are not compared.
+
+    Returns:
+        List[Dict[str, Any]]: ``{'id', 'metric', 'baseline', 'current', 'ratio'}``
+        for every regression.
+    """
+    previous = {result['id']: result for result in baseline if 'error' not in result}
+    regressions = []
+    for result in results:
+        base = previous.get(result['id'])
+        if base is None or 'error' in result:
+            continue
+        for metric, floor in (('seconds', MIN_REGRESSION_SECONDS), ('peak_bytes', MIN_REGRESSION_BYTES)):
+            old, new = base.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > floor:
+                regressions.append({'id': result['id'], 'metric': metric, 'baseline': old,
+                                    'current': new, 'ratio': new / old if old else float('inf')})
+    return regressions
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    if 'error' in result:
+        return f"{result['id']:<52} {result['error']}"
+    if result['group'] == 'startup':
+        return (f"{result['id']:<52} {result['seconds'] * 1000:10.2f} ms "
+                f"(budget {result['budget_seconds'] * 1000:.0f} ms)")
+    peak = '' if result['peak_bytes'] is None else f"{result['peak_bytes'] / 2**20:10.1f} MB"
+    return (f"{result['id']:<52} {result['seconds'] * 1000:10.2f} ms "
+            f"{result['megapixels_per_second']:10.1f} MP/s{peak}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark operators, pipelines and analytics.")
+    parser.add_argument('--quick', action='store_true',
+                        help=f"only {', '.join(map(str, QUICK_RESOLUTIONS))} MP and kernel sizes "
+                             f"{', '.join(map(str, QUICK_KERNEL_SIZES))}")
+    parser.add_argument('--resolutions', type=float, nargs='+', help=f"megapixels (default: {', '.join(map(str, RESOLUTIONS))})")
+    parser.add_argument('--precisions', nargs='+', choices=list(PRECISIONS), default=list(PRECISIONS))
+    parser.add_argument('--layouts', nargs='+', choices=list(CHANNEL_LAYOUTS), default=list(CHANNEL_LAYOUTS))
+    parser.add_argument('--kernel-sizes', type=int, nargs='+')
+    parser.add_argument('-k', '--filter', action='append', dest='patterns', metavar='PATTERN',
+                        help="only run cases whose id matches this glob, e.g. '*sobel*/uint8/*' (repeatable)")
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME,
+                        help="seconds to repeat each case for (default: %(default)s)")
+    parser.add_argument('--max-repeats', type=int, default=DEFAULT_MAX_REPEATS)
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc run of every case")
+    parser.add_argument('--no-startup', action='store_true', help="skip the cold-start cases")
+    parser.add_argument('-o', '--output', help="results file (default: benchmarks/<machine>/<time>.json)")
+    parser.add_argument('--baseline', help="baseline to compare with (default: benchmarks/<machine>/baseline.json)")
+    parser.add_argument('--save-baseline', action='store_true', help="also store the results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown as a fraction (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    info = machine_info()
+    tag = machine_tag(info)
+    resolutions = tuple(args.resolutions or (QUICK_RESOLUTIONS if args.quick else RESOLUTIONS))
+    kernel_sizes = tuple(args.kernel_sizes or (QUICK_KERNEL_SIZES if args.quick else KERNEL_SIZES))
+    for size in kernel_sizes:
+        if size < 3 or size % 2 == 0:
+            parser.error("kernel sizes must be odd and at least 3")
+
+    print(f"Machine {tag}, numpy {info['numpy']}, scipy {info['scipy']}")
+    report = lambda result: print(format_result(result), flush=True)
+    results = [] if args.no_startup else run_startup_benchmarks(args.patterns, report=report)
+    results += run_benchmarks(resolutions, tuple(args.precisions), tuple(args.layouts), kernel_sizes,
+                              args.patterns, args.min_time, args.max_repeats, not args.no_memory, report)
+    document = {
+        'machine': info,
+        'tag': tag,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'results': results,
+    }
+
+    directory = os.path.join(RESULTS_DIR, tag)
+    output = args.output or os.path.join(directory, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(document, file, indent=1)
+    print(f"Saved {len(results)} results to {output}")
+
+    status = 0
+    for result in results:
+        if result.get('seconds', 0) > result.get('budget_seconds', float('inf')):
+            print(f"OVER BUDGET {result['id']}: {result['seconds'] * 1000:.0f} ms "
+                  f"(budget {result['budget_seconds'] * 1000:.0f} ms)")
+            status = 1
+    baseline_path = args.baseline or os.path.join(directory, 'baseline.json')
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+        if baseline.get('tag') != tag:
+            print(f"Warning: the baseline was measured on {baseline.get('tag')}, not on {tag}", file=sys.stderr)
+        regressions = compare(results, baseline['results'], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression['id']} {regression['metric']}: "
+                  f"{regression['baseline']:.4g} -> {regression['current']:.4g} (x{regression['ratio']:.2f})")
+        print(f"{len(regressions)} regressions against {baseline_path}")
+        status = 1 if regressions else status
+    elif args.baseline:
+        parser.error(f"baseline {args.baseline} not found")
+
+    if args.save_baseline:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'baseline.json'), 'w') as file:
+            json.dump(document, file, indent=1)
+        print(f"Saved baseline for {tag}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,121 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from interfaces.IParams import IParams
+from typing import Optional
 import numpy as np
 
 class IBase(ABC):
     @abstractmethod
-    def apply(self, img: np.array, params: IParams) -> np.array:
+    def apply(self, img: np.array, params: IParams, out: Optional[np.array] = None) -> np.array:
         """Apply the filter to the image.
+
+        ``img`` may also be a batch of same-sized images stacked on a
+        leading axis, ``(images, rows, columns, channels)`` with a channel
+        axis even for gray images (see ``image_buffer.spatial_axes``).
+        Every image of a batch is processed on its own, with no pixels
+        mixed across images, and the result is a batch as well.
         
         Args:
             img (np.array): The input image.
             params (FilterParams): The parameters for the filter.
+            out (np.array): Array to write the result into, of the result's
+                shape and the input dtype. Only passed to operators whose
+                ``supports_out`` is true, and only the same array as
+                ``img`` if ``supports_in_place`` is true.
         
         Returns:
-            np.array: The image after applying the filter.
+            np.array: The image after applying the filter (``out`` if given).
+        """
+        pass
+
+    def supports_out(self, params: IParams) -> bool:
+        """Return whether ``apply`` can write its result into an ``out`` array.
+
+        The pipeline then runs chains of steps through reused buffers
+        instead of allocating every step's result.
+
+        Args:
+            params (IParams): The parameters for the filter.
+
+        Returns:
+            bool: True if ``apply`` accepts ``out``.
+        """
+        return False
+
+    def supports_in_place(self, params: IParams) -> bool:
+        """Return whether ``out`` may be the input image itself.
+
+        True for operators whose output pixel only depends on the same input
+        pixel; operators that read neighbouring pixels or change the number
+        of channels need a separate buffer.
+
+        Args:
+            params (IParams): The parameters for the filter.
+
+        Returns:
+            bool: True if ``apply(img, params, out=img)`` is allowed.
+        """
+        return False
+
+    def get_lut(self, params: IParams) -> Optional[np.array]:
+        """Return the operator as a 256-entry uint8 lookup table, if possible.
+
+        Point operators, whose output pixel depends only on the same input
+        value, return a table ``lut`` such that ``apply(img) == lut[img]`` for
+        uint8 images. The pipeline composes adjacent tables into one pass.
+
+        Args:
+            params (IParams): The parameters for the filter.
+
+        Returns:
+            Optional[np.array]: The lookup table, or None for other operators.
+        """
+        return None
+
+    def get_footprint(self, params: IParams) -> Optional[int]:
+        """Return how far, in pixels, an output pixel can see into the input.
+
+        Tiled execution reads this many extra pixels around every tile. Point
+        operators return 0 and a k x k convolution returns k // 2.
+
+        Args:
+            params (IParams): The parameters for the filter.
+
+        Returns:
+            Optional[int]: The radius, or None if the operator needs the whole
+                image and cannot be tiled.
+        """
+        return None
+
+    def get_kernel_plan(self, params: IParams) -> Optional['KernelPlan']:
+        """Return the operator as a linear, shift-invariant convolution, if it is one.
+
+        Pipelines fuse adjacent operators that return a plan into a single
+        convolution with the composed kernel (by default only in float
+        precisions; see ``ImagePipeline``).
+
+        Args:
+            params (IParams): The parameters for the filter.
+
+        Returns:
+            Optional[KernelPlan]: The kernel plan, or None for other operators.
+        """
+        return None
+
+    def get_output_channels(self, params: IParams, channels: int) -> int:
+        """Return how many color channels the operator outputs.
+
+        Operators receive gray images as 2-D arrays (one-channel in
+        batches) and color images with three channels; alpha never reaches
+        them. Operators that reduce color to a single channel, like
+        grayscale conversion, return 1 so that the following steps only
+        process one channel.
+
+        Args:
+            params (IParams): The parameters for the filter.
+            channels (int): The color channels of the input, 1 or 3.
+
+        Returns:
+            int: The color channels of the output, 1 or 3.
         """
-        pass
\ No newline at end of file
+        return channels
@@ -40,4 +40,18 @@ class IParams(ABC):
             }
         }
         """
-        raise NotImplementedError("Subclasses must implement get_param_definitions")
\ No newline at end of file
+        raise NotImplementedError("Subclasses must implement get_param_definitions")
+
+    def scaled(self, factor: float) -> 'IParams':
+        """Return parameters adapted to an image resized by ``factor``.
+
+        Used to run a faithful preview on a reduced copy of the image.
+        Parameters without a spatial extent are returned unchanged.
+
+        Args:
+            factor (float): The size of the reduced image relative to the original.
+
+        Returns:
+            IParams: The scaled parameters.
+        """
+        return self
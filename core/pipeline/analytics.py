@@ -0,0 +1,155 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import numpy as np
+from pipeline.image_buffer import ChannelLayout
+from pipeline.step_cache import fingerprint_image
+
+# Rows are processed in bands of about this many pixels, so every band is
+# reduced while it is still in cache.
+ANALYTICS_CHUNK_PIXELS = 2**18
+DEFAULT_ANALYTICS_ENTRIES = 32
+
+
+@dataclass(frozen=True)
+class ImageAnalytics:
+    """Statistics, projections and histogram of a uint8 image.
+
+    Per-channel statistics are derived exactly from the 256-bin histogram.
+    """
+    shape: Tuple[int, ...]
+    histogram: np.array
+    row_projection: np.array
+    column_projection: np.array
+
+    @property
+    def channels(self) -> int:
+        return self.histogram.shape[0]
+
+    @property
+    def layout(self) -> ChannelLayout:
+        return ChannelLayout.from_shape(self.shape)
+
+    @property
+    def pixel_count(self) -> int:
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def min(self) -> np.array:
+        """The smallest value of each channel."""
+        return np.argmax(self.histogram > 0, axis=1)
+
+    @property
+    def max(self) -> np.array:
+        """The largest value of each channel."""
+        return 255 - np.argmax(self.histogram[:, ::-1] > 0, axis=1)
+
+    @property
+    def mean(self) -> np.array:
+        """The mean value of each channel."""
+        return self.histogram @ np.arange(256) / self.pixel_count
+
+    @property
+    def std(self) -> np.array:
+        """The standard deviation of each channel."""
+        values = np.arange(256)
+        mean = self.mean
+        variance = self.histogram @ (values * values) / self.pixel_count - mean * mean
+        return np.sqrt(np.maximum(variance, 0))
+
+
+def compute_analytics(image: np.array) -> ImageAnalytics:
+    """Compute the histogram and projections of a uint8 image in one pass.
+
+    The image is read once, in bands of rows: each band is counted into the
+    histogram (every channel offset into its own 256 bins, so one
+    ``np.bincount`` covers all of them) and summed along both axes while
+    it is still in cache. Projections are sums of the mean of the color
+    channels, like summing a grayscale version of the image; alpha only
+    has its histogram.
+
+    Args:
+        image (np.array): A uint8 image of any ``ChannelLayout``.
+
+    Returns:
+        ImageAnalytics: The results.
+    """
+    if image.dtype != np.uint8:
+        raise ValueError("Analytics require a uint8 image")
+    if image.ndim not in (2, 3):
+        raise ValueError("Unsupported image dimensions")
+    shape = image.shape
+    color_channels = ChannelLayout.from_shape(shape).color_channels
+    if image.ndim == 2:
+        image = image[:, :, np.newaxis]
+    height, width, channels = image.shape
+    offsets = np.arange(channels, dtype=np.uint16) * 256
+    histogram = np.zeros(channels * 256, dtype=np.int64)
+    row_sums = np.empty(height, dtype=np.uint64)
+    column_sums = np.zeros(width, dtype=np.uint64)
+    rows = max(1, ANALYTICS_CHUNK_PIXELS // max(width, 1))
+    for top in range(0, height, rows):
+        band = image[top:top + rows]
+        bins = band.reshape(-1, channels) + offsets
+        histogram += np.bincount(bins.ravel(), minlength=channels * 256)
+        # Adding channel planes is much faster than reducing the short last axis.
+        pixel_sums = band[:, :, 0].astype(np.uint16)
+        for channel in range(1, color_channels):
+            pixel_sums += band[:, :, channel]
+        row_sums[top:top + rows] = pixel_sums.sum(axis=1, dtype=np.uint64)
+        column_sums += pixel_sums.sum(axis=0, dtype=np.uint64)
+    return ImageAnalytics(
+        shape=shape,
+        histogram=histogram.reshape(channels, 256),
+        row_projection=row_sums / color_channels,
+        column_projection=column_sums / color_channels,
+    )
+
+
+class AnalyticsCache:
+    """Thread-safe LRU cache of ``ImageAnalytics`` keyed by image fingerprint.
+
+    Results are a few kilobytes each, so the cache is bounded by entries.
+    """
+    def __init__(self, max_entries: int = DEFAULT_ANALYTICS_ENTRIES):
+        if max_entries < 0:
+            raise ValueError("max_entries must not be negative")
+        self.__max_entries = max_entries
+        self.__entries: "OrderedDict[str, ImageAnalytics]" = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, image: np.array, key: Optional[str] = None) -> ImageAnalytics:
+        """Return the analytics of ``image``, computing them on a miss.
+
+        Args:
+            image (np.array): A grayscale or color uint8 image.
+            key (str): The image's fingerprint, if already known.
+
+        Returns:
+            ImageAnalytics: The results.
+        """
+        key = key or fingerprint_image(image)
+        with self.__lock:
+            analytics = self.__entries.get(key)
+            if analytics is not None:
+                self.__entries.move_to_end(key)
+                return analytics
+        analytics = compute_analytics(image)
+        if self.__max_entries:
+            with self.__lock:
+                self.__entries[key] = analytics
+                while len(self.__entries) > self.__max_entries:
+                    self.__entries.popitem(last=False)
+        return analytics
+
+    def clear(self):
+        """Drop all cached results."""
+        with self.__lock:
+            self.__entries.clear()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__entries
+
+    def __len__(self) -> int:
+        return len(self.__entries)
@@ -0,0 +1,110 @@
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+from interfaces.IBase import IBase
+from interfaces.IParams import IParams
+from pipeline.image_buffer import ChannelLayout, ImageBuffer
+from pipeline.image_pipeline import ImagePipeline
+from pipeline.precision import DEFAULT_PRECISION
+from pipeline.step_cache import StepCache
+
+DEFAULT_BATCH_SIZE = 64
+# Batches are also limited to this many bytes of pixels, so that the float
+# temporaries of a step still fit in the CPU caches between its passes.
+# Beyond that batches get slower per image than single images; images
+# larger than the limit are processed one at a time.
+DEFAULT_BATCH_BYTES = 2**19
+
+
+def stack_images(images: List[Union[np.array, ImageBuffer]]) -> ImageBuffer:
+    """Stack images of the same shape and dtype into a batch.
+
+    Gray images get a channel axis, as every image of a batch does (see
+    ``image_buffer.spatial_axes``). The batch takes the colorspace of the
+    first image.
+
+    Args:
+        images (List[np.array | ImageBuffer]): The images.
+
+    Returns:
+        ImageBuffer: The batch, a new 4-D array.
+
+    Raises:
+        ValueError: If the images differ in shape or dtype.
+    """
+    buffers = [ImageBuffer.from_array(image) for image in images]
+    first = buffers[0]
+    if any(buffer.shape != first.shape or buffer.dtype != first.dtype for buffer in buffers):
+        raise ValueError("images of a batch must have the same shape and dtype")
+    pixels = np.stack([buffer.pixels for buffer in buffers])
+    if first.layout is ChannelLayout.GRAY:
+        pixels = pixels[..., np.newaxis]
+    return ImageBuffer(pixels, first.layout, first.colorspace)
+
+
+def unstack_images(batch: np.array, layout: ChannelLayout) -> List[np.array]:
+    """Split a batch into views of its images, 2-D for gray ones."""
+    if layout is ChannelLayout.GRAY:
+        batch = batch[..., 0]
+    return list(batch)
+
+
+def iter_batches(images: Iterable[Union[np.array, ImageBuffer]], batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_bytes: int = DEFAULT_BATCH_BYTES) -> Iterator[ImageBuffer]:
+    """Group consecutive images of the same shape and dtype into batches.
+
+    A batch ends when it is full or the next image differs, so the order
+    of the images is kept and at most one batch is held at a time. Sort
+    mixed-size inputs by size to get full batches.
+
+    Args:
+        images (Iterable[np.array | ImageBuffer]): The images, consumed lazily.
+        batch_size (int): The largest number of images in a batch.
+        max_bytes (int): The largest size of a batch's pixels; an image
+            larger than this makes a batch of its own.
+
+    Returns:
+        Iterator[ImageBuffer]: The batches (see ``stack_images``).
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    group: List[ImageBuffer] = []
+    for image in images:
+        image = ImageBuffer.from_array(image)
+        if group and (len(group) == batch_size or (len(group) + 1) * image.pixels.nbytes > max_bytes
+                      or image.shape != group[0].shape or image.dtype != group[0].dtype):
+            yield stack_images(group)
+            group = []
+        group.append(image)
+    if group:
+        yield stack_images(group)
+
+
+def execute_batches(images: Iterable[Union[np.array, ImageBuffer]], steps: List[Tuple[IBase, IParams]],
+                    precision: str = DEFAULT_PRECISION, batch_size: int = DEFAULT_BATCH_SIZE,
+                    max_bytes: int = DEFAULT_BATCH_BYTES, fuse_linear: Optional[bool] = None) -> Iterator[np.array]:
+    """Run the same steps on many images, a stacked batch at a time.
+
+    Every step processes a whole batch in one call, so the per-step work
+    done in Python (planning, kernel lookup, dispatch) is paid once per
+    batch rather than once per image. Results are the same as running an
+    ``ImagePipeline`` on every image; nothing is cached.
+
+    Args:
+        images (Iterable[np.array | ImageBuffer]): The images, consumed
+            lazily and grouped by ``iter_batches``.
+        steps (List[Tuple[IBase, IParams]]): The steps, e.g. from
+            ``recipes.parse_recipe``.
+        precision (str): The working precision.
+        batch_size (int): The largest number of images in a batch.
+        max_bytes (int): The largest size of a batch's pixels.
+        fuse_linear (bool): Passed on to ``ImagePipeline``.
+
+    Returns:
+        Iterator[np.array]: The processed images, in input order, as views
+        of their batch's result.
+    """
+    for batch in iter_batches(images, batch_size, max_bytes):
+        pipeline = ImagePipeline(batch, precision, StepCache(0), fuse_linear)
+        for filter, params in steps:
+            pipeline.add_step(filter, params)
+        yield from unstack_images(pipeline.execute(), pipeline.get_output_layout())
@@ -0,0 +1,9 @@
+from pipeline.registry import register_operator
+
+# Linear filters; their footprint is half the kernel size.
+register_operator('average', 'Average Blur', 'convolutions.average:AverageConvolution',
+                  'convolutions.average:AverageParams', footprint='kernel_size', cost=6)
+register_operator('gaussian', 'Gaussian Blur', 'convolutions.gaussian:GaussianConvolution',
+                  'convolutions.gaussian:GaussianParams', footprint='kernel_size', cost=7)
+register_operator('sharpening', 'Sharpening', 'convolutions.sharpening:SharpeningConvolution',
+                  'convolutions.sharpening:SharpeningParams', footprint='kernel_size', cost=8)
@@ -1,7 +1,9 @@
 from dataclasses import dataclass
-from convolutions.base_convolution import BaseConvolution, ConvolutionParams
+from typing import Optional
+from convolutions.base_convolution import BaseConvolution, ConvolutionParams, get_forced_backend
+from pipeline.image_buffer import spatial_axes
+from pipeline.precision import compute_dtype, saturate
 import numpy as np
-from scipy.ndimage import convolve
 
 @dataclass
 class AverageParams(ConvolutionParams):
@@ -27,28 +29,25 @@ class AverageParams(ConvolutionParams):
         
 class AverageConvolution(BaseConvolution):
     @classmethod
-    def apply(cls, img: np.array, params: AverageParams) -> np.array:
+    def apply(cls, img: np.array, params: AverageParams, out: Optional[np.array] = None) -> np.array:
         """Apply the average convolution to the image.
         
         Args:
             img (np.array): The input image.
             params (AverageParams): The parameters for the convolution.
+            out (np.array): Array to write the result into.
         
         Returns:
             np.array: The processed image.
         """
         params.validate()
-        kernel = cls._create_kernel(params.kernel_size)
-        if img.ndim == 2:  # Grayscale image
-            return cls._apply_convolution(img, kernel)
-        elif img.ndim == 3:  # Color image
-            channels = []
-            for i in range(img.shape[2]):
-                channel = cls._apply_convolution(img[:, :, i], kernel)
-                channels.append(channel)
-            return np.stack(channels, axis=2)
-        else:
+        if img.ndim not in (2, 3, 4):
             raise ValueError("Unsupported image dimensions")
+        if not np.issubdtype(img.dtype, np.integer) or get_forced_backend() is not None:
+            # Float sums in a table depend on the window's position, which
+            # would make tiled results differ from whole-image ones.
+            return cls._convolve(img, cls.get_kernel_plan(params), out=out)
+        return cls._box_filter(img, params.kernel_size, out)
     
     @classmethod
     def _create_kernel(cls, kernel_size: int) -> np.array:
@@ -63,14 +62,39 @@ class AverageConvolution(BaseConvolution):
         return np.ones((kernel_size, kernel_size)) / kernel_size**2
 
     @classmethod
-    def _apply_convolution(cls, img: np.array, kernel: np.array) -> np.array:
-        """Apply the convolution to the image.
-        
+    def _box_filter(cls, img: np.array, kernel_size: int, out: Optional[np.array] = None) -> np.array:
+        """Average the image over a square window using a summed-area table.
+
+        Every output pixel is computed from four table lookups, so the cost
+        does not depend on ``kernel_size``. Only used for integer images,
+        which are accumulated in uint32: the table may wrap around, but each
+        window sum is far below 2**32, so the modular differences are exact.
+
         Args:
             img (np.array): The input image.
-            kernel (np.array): The convolution kernel.
-        
+            kernel_size (int): The size of the kernel.
+            out (np.array): Array to write the result into.
+
         Returns:
-            np.array: The processed image.
+            np.array: The blurred image, saturated to the input dtype.
         """
-        return convolve(img, kernel, mode='reflect')
\ No newline at end of file
+        radius = kernel_size // 2
+        rows, cols = spatial_axes(img)
+        # Indexes the axes before the spatial ones: the images of a batch.
+        lead = (slice(None),) * rows
+        padded = cls._pad(img, radius, radius)
+        acc_dtype = np.uint32 if img.itemsize <= 2 else np.uint64
+        table_shape = (padded.shape[rows] + 1, padded.shape[cols] + 1)
+        table = np.zeros(padded.shape[:rows] + table_shape + padded.shape[cols + 1:], dtype=acc_dtype)
+        inner = table[lead + (slice(1, None), slice(1, None))]
+        np.cumsum(padded, axis=rows, dtype=acc_dtype, out=inner)
+        np.cumsum(inner, axis=cols, dtype=acc_dtype, out=inner)
+        del padded
+
+        k = kernel_size
+        after, before = slice(k, None), slice(None, -k)
+        window_sum = table[lead + (after, after)] - table[lead + (before, after)]
+        window_sum -= table[lead + (after, before)]
+        window_sum += table[lead + (before, before)]
+        result = np.divide(window_sum, k * k, dtype=compute_dtype(img.dtype))
+        return saturate(result, img.dtype, out=out)
@@ -1,38 +1,444 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from math import log2
+from typing import Iterator, Optional, Tuple
 import numpy as np
 from interfaces.IBase import IBase
 from interfaces.IParams import IParams
+from pipeline.image_buffer import spatial_axes
+from pipeline.precision import compute_dtype, saturate
+
+# Singular values below this fraction of the largest one are treated as zero
+# when checking whether a kernel is (low-rank) separable.
+SEPARABLE_TOLERANCE = 1e-10
+KERNEL_CACHE_SIZE = 128
+# scipy is imported by the functions that use it, since it takes longer to
+# import than everything else a batch worker needs.
+
+# scipy.ndimage boundary modes expressed as np.pad modes.
+PAD_MODES = {
+    'reflect': 'symmetric',
+    'mirror': 'reflect',
+    'nearest': 'edge',
+    'wrap': 'wrap',
+    'constant': 'constant',
+}
+
+BACKENDS = ('direct', 'separable', 'fft')
+# Images are transformed in blocks of at most this many rows and columns
+# (overlap-add), which bounds the size of the complex spectra.
+FFT_BLOCK_SIZE = 1024
+# Costs relative to one tap of a dense ndimage convolution, measured on
+# x86-64: one tap of a 1D pass, and one FFT sample per log2 of the size.
+SEPARABLE_COST_FACTOR = 0.4
+FFT_COST_FACTOR = 0.45
+
+_forced_backend: ContextVar[Optional[str]] = ContextVar('forced_backend', default=None)
+_spatial_only: ContextVar[bool] = ContextVar('spatial_only', default=False)
+
+
+@contextmanager
+def force_backend(backend: Optional[str]) -> Iterator[None]:
+    """Make every convolution in the current context use ``backend``.
+
+    Meant for tests and benchmarks; ``None`` restores the cost model. Kernel
+    plans without separable factors still run densely under 'separable'.
+
+    Args:
+        backend (str): One of ``BACKENDS`` or None.
+    """
+    if backend is not None and backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    token = _forced_backend.set(backend)
+    try:
+        yield
+    finally:
+        _forced_backend.reset(token)
+
+
+def get_forced_backend() -> Optional[str]:
+    """Return the backend forced by ``force_backend``, if any."""
+    return _forced_backend.get()
+
+
+@contextmanager
+def spatial_backends(enabled: bool = True) -> Iterator[None]:
+    """Keep the convolutions of the current context off the FFT backend.
+
+    The direct and separable backends compute every pixel from its
+    neighbourhood alone, and which of them is cheaper does not depend on
+    the image shape, so a tile gets exactly the pixels it has in the whole
+    image. The rounding of the overlap-add FFT depends on where its blocks
+    fall. A backend forced with ``force_backend`` takes precedence.
+
+    Args:
+        enabled (bool): False leaves the choice to the cost model, as
+            outside the context.
+    """
+    token = _spatial_only.set(enabled)
+    try:
+        yield
+    finally:
+        _spatial_only.reset(token)
+
+
+@dataclass(frozen=True)
+class KernelPlan:
+    """A convolution kernel together with its cheapest known decomposition.
+
+    The kernel is equivalent to ``identity * delta + sum(outer(col, row))``
+    over ``factors``. When ``factors`` is None the kernel is applied directly.
+    """
+    kernel: np.ndarray
+    identity: float = 0.0
+    factors: Optional[Tuple[Tuple[np.ndarray, np.ndarray], ...]] = None
+
+    @property
+    def rank(self) -> Optional[int]:
+        return None if self.factors is None else len(self.factors)
+
+    @property
+    def preserves_range(self) -> bool:
+        """Whether outputs stay within the range of the inputs (weights >= 0, sum <= 1)."""
+        return bool(np.all(self.kernel >= 0) and self.kernel.sum() <= 1 + 1e-9)
+
+    @property
+    def is_centrosymmetric(self) -> bool:
+        """Whether the kernel is unchanged by a 180 degree rotation."""
+        return bool(np.allclose(self.kernel, self.kernel[::-1, ::-1]))
+
+    @property
+    def is_axis_symmetric(self) -> bool:
+        """Whether the kernel is unchanged by flipping its rows and, separately, its columns."""
+        return bool(np.allclose(self.kernel, self.kernel[::-1, :]) and np.allclose(self.kernel, self.kernel[:, ::-1]))
+
+
+def compose_plans(first: KernelPlan, second: KernelPlan) -> KernelPlan:
+    """Return the plan of convolving with ``first`` and then with ``second``.
+
+    The composed kernel is the full 2D convolution of both kernels. When both
+    plans are separable the composition is too: identity terms and rank-1
+    terms are multiplied out pairwise, with 1D factors convolved together.
+    The separable form is dropped if it would cost more than the dense one.
+
+    Args:
+        first (KernelPlan): The plan applied first.
+        second (KernelPlan): The plan applied second.
+
+    Returns:
+        KernelPlan: The composed plan.
+    """
+    (h1, w1), (h2, w2) = first.kernel.shape, second.kernel.shape
+    kernel = np.zeros((h1 + h2 - 1, w1 + w2 - 1))
+    for i in range(h1):
+        for j in range(w1):
+            if first.kernel[i, j]:
+                kernel[i:i + h2, j:j + w2] += first.kernel[i, j] * second.kernel
+    kernel.setflags(write=False)
+    if first.factors is None or second.factors is None:
+        return KernelPlan(kernel=kernel)
+
+    factors = []
+    if first.identity:
+        factors.extend((first.identity * col, row) for col, row in second.factors)
+    if second.identity:
+        factors.extend((second.identity * col, row) for col, row in first.factors)
+    for col1, row1 in first.factors:
+        for col2, row2 in second.factors:
+            factors.append((np.convolve(col1, col2), np.convolve(row1, row2)))
+    if sum(col.size + row.size for col, row in factors) >= kernel.size:
+        return KernelPlan(kernel=kernel)
+    for col, row in factors:
+        col.setflags(write=False)
+        row.setflags(write=False)
+    return KernelPlan(kernel=kernel, identity=first.identity * second.identity, factors=tuple(factors))
+
+
+def _fft_block_shape(shape: Tuple[int, ...], kernel_shape: Tuple[int, int]) -> Tuple[int, int]:
+    """Return the fast transform size used for overlap-add blocks of an image."""
+    from scipy import fft
+    return tuple(fft.next_fast_len(min(size + k - 1, FFT_BLOCK_SIZE) + k - 1, real=True)
+                 for size, k in zip(shape[:2], kernel_shape))
+
+
+def estimate_costs(plan: KernelPlan, shape: Tuple[int, ...]) -> dict:
+    """Estimate the work per output sample of each convolution backend.
+
+    Spatial backends cost one multiply-add per kernel tap (dense) or per
+    tap of each 1D factor (separable), the latter being cheaper. An
+    overlap-add FFT costs a forward and an inverse transform of every
+    block, ``O(log n)`` per sample, plus the overlap of neighbouring
+    blocks; the kernel spectrum is shared.
+
+    Args:
+        plan (KernelPlan): The kernel plan to apply.
+        shape (Tuple[int, ...]): The image shape.
+
+    Returns:
+        dict: Estimated cost per backend; 'separable' is missing if the
+        plan has no separable factors.
+    """
+    kernel_shape = plan.kernel.shape
+    costs = {'direct': float(plan.kernel.size)}
+    if plan.factors is not None:
+        costs['separable'] = SEPARABLE_COST_FACTOR * (sum(col.size + row.size for col, row in plan.factors) + bool(plan.identity))
+    block_shape = _fft_block_shape(shape, kernel_shape)
+    block_size = block_shape[0] * block_shape[1]
+    covered = (block_shape[0] - kernel_shape[0] + 1) * (block_shape[1] - kernel_shape[1] + 1)
+    costs['fft'] = FFT_COST_FACTOR * 2 * log2(block_size) * block_size / covered
+    return costs
+
+
+def choose_backend(plan: KernelPlan, shape: Tuple[int, ...]) -> str:
+    """Pick the cheapest backend for ``plan`` on an image of ``shape``.
+
+    A backend forced with ``force_backend`` takes precedence; within
+    ``spatial_backends`` the FFT is not considered.
+    """
+    forced = get_forced_backend()
+    if forced == 'separable' and plan.factors is None:
+        return 'direct'
+    if forced is not None:
+        return forced
+    costs = estimate_costs(plan, shape)
+    if _spatial_only.get():
+        del costs['fft']
+    return min(costs, key=costs.get)
 
 
 class BaseConvolution(IBase):
+    # Boundary handling passed to scipy.ndimage, overridden per operator.
+    mode = 'reflect'
+    cval = 0.0
+
     @abstractmethod
-    def apply(self, img: np.array, kernel: np.array) -> np.array:
+    def apply(self, img: np.array, kernel: np.array, out: Optional[np.array] = None) -> np.array:
         """Apply the convolution to the image.
-        
+
         Args:
             img (np.array): The input image.
             kernel (np.array): The convolution kernel.
-        
+            out (np.array): Array to write the result into; never ``img``.
+
         Returns:
             np.array: The processed image.
         """
         pass
-    
+
+    @classmethod
+    def supports_out(cls, params: 'ConvolutionParams') -> bool:
+        return True
+
     @abstractmethod
     def _create_kernel(self, kernel_size: int) -> np.array:
         """Create the convolution kernel.
-        
+
         Args:
             kernel_size (int): The size of the kernel.
-        
+
         Returns:
             np.array: The convolution kernel.
         """
         pass
-    
+
+    @classmethod
+    def get_footprint(cls, params: 'ConvolutionParams') -> int:
+        """A k x k kernel reaches k // 2 pixels in every direction."""
+        return params.kernel_size // 2
+
+    @classmethod
+    def get_kernel_plan(cls, params: 'ConvolutionParams') -> KernelPlan:
+        """Return the cached kernel plan this operator convolves with.
+
+        Args:
+            params (ConvolutionParams): The parameters for the convolution.
+
+        Returns:
+            KernelPlan: The kernel plan.
+        """
+        params.validate()
+        return cls._get_plan(*cls._kernel_args(params))
+
+    @classmethod
+    def _kernel_args(cls, params: 'ConvolutionParams') -> tuple:
+        """Return the ``_create_kernel`` arguments for the given parameters."""
+        return (params.kernel_size,)
+
+    @classmethod
+    @lru_cache(maxsize=KERNEL_CACHE_SIZE)
+    def _get_plan(cls, *kernel_args) -> KernelPlan:
+        """Build (once) the kernel and its decomposition for the given arguments.
+
+        Plans are cached per operator class and kernel arguments, so repeated
+        calls with the same parameters skip kernel construction and the SVD.
+
+        Args:
+            *kernel_args: Arguments forwarded to ``_create_kernel``.
+
+        Returns:
+            KernelPlan: The read-only kernel plan.
+        """
+        kernel = np.asarray(cls._create_kernel(*kernel_args), dtype=np.float64)
+        kernel.setflags(write=False)
+        identity, factors = cls._decompose_kernel(kernel, *kernel_args)
+        if factors is not None:
+            for col, row in factors:
+                col.setflags(write=False)
+                row.setflags(write=False)
+        return KernelPlan(kernel=kernel, identity=identity, factors=factors)
+
+    @classmethod
+    def _decompose_kernel(cls, kernel: np.array, *kernel_args):
+        """Split the kernel into a sum of separable (rank-1) terms.
+
+        The default uses an SVD and keeps the decomposition only when running
+        ``rank`` pairs of 1D passes is cheaper than one dense 2D pass.
+
+        Args:
+            kernel (np.array): The dense 2D kernel.
+            *kernel_args: Arguments the kernel was created with.
+
+        Returns:
+            tuple: ``(identity, factors)`` as stored on ``KernelPlan``.
+        """
+        u, s, vt = np.linalg.svd(kernel)
+        if s[0] == 0:
+            return 0.0, None
+        rank = int(np.sum(s > SEPARABLE_TOLERANCE * s[0]))
+        rows, cols = kernel.shape
+        if rank * (rows + cols) >= rows * cols:
+            return 0.0, None
+        factors = tuple(
+            (u[:, i] * s[i], vt[i, :].copy()) for i in range(rank)
+        )
+        return 0.0, factors
+
+    @classmethod
+    def _convolve(cls, img: np.array, plan: KernelPlan, mode: Optional[str] = None,
+                  out: Optional[np.array] = None) -> np.array:
+        """Convolve a grayscale or color image, or a batch, with a kernel plan.
+
+        Color channels, and the images of a batch, are filtered
+        independently in a single call, without splitting the image into
+        per-channel copies: the kernel only spans the spatial axes. The
+        backend (dense, separable or FFT) is picked by ``choose_backend``;
+        the FFT result equals the spatial ones up to floating-point
+        rounding. Float images are accumulated directly in ``out``, if
+        given; uint8 ones in a float array that is then saturated into it.
+
+        Args:
+            img (np.array): The input image.
+            plan (KernelPlan): The kernel plan to apply.
+            mode (str): Boundary mode overriding ``cls.mode``.
+            out (np.array): Array to write the result into; never ``img``.
+
+        Returns:
+            np.array: The processed image, saturated to the input dtype.
+        """
+        from scipy.ndimage import convolve, convolve1d
+        if img.ndim not in (2, 3, 4):
+            raise ValueError("Unsupported image dimensions")
+        work_dtype = compute_dtype(img.dtype)
+        mode = mode or cls.mode
+        rows, cols = spatial_axes(img)
+        backend = choose_backend(plan, img.shape[rows:cols + 1])
+        # Where the sums can go straight into the output array.
+        target = out if out is not None and out.dtype == work_dtype else None
+        if backend == 'fft':
+            result = cls._fft_convolve(img, plan.kernel, work_dtype, mode)
+        elif backend == 'direct':
+            kernel = plan.kernel.reshape((1,) * rows + plan.kernel.shape + (1,) * (img.ndim - cols - 1))
+            result = convolve(img, kernel, output=work_dtype if target is None else target, mode=mode, cval=cls.cval)
+        else:
+            result = None
+            if plan.identity:
+                result = np.multiply(img, plan.identity, dtype=work_dtype, out=target)
+            for col, row in plan.factors:
+                tmp = convolve1d(img, col, axis=rows, output=work_dtype, mode=mode, cval=cls.cval)
+                if result is None:
+                    result = convolve1d(tmp, row, axis=cols, output=work_dtype if target is None else target,
+                                        mode=mode, cval=cls.cval)
+                else:
+                    result += convolve1d(tmp, row, axis=cols, mode=mode, cval=cls.cval)
+        return saturate(result, img.dtype, out=out)
+
+    @classmethod
+    def _fft_convolve(cls, img: np.array, kernel: np.array, work_dtype: np.dtype, mode: str) -> np.array:
+        """Convolve in the frequency domain, block by block (overlap-add).
+
+        The image is padded by the kernel radius the way ``mode`` extends
+        borders, so the valid part of the linear convolution equals the
+        spatial result. Blocks of at most ``FFT_BLOCK_SIZE`` samples per
+        axis are transformed one at a time and their full convolutions are
+        added into the output, overlapping by the kernel size minus one.
+
+        Args:
+            img (np.array): The input image, 2D or 3D with channels last,
+                or a batch.
+            kernel (np.array): The square 2D kernel, with an odd size.
+            work_dtype (np.dtype): The floating-point type to compute in.
+            mode (str): The boundary mode.
+
+        Returns:
+            np.array: The unsaturated result in ``work_dtype``.
+        """
+        from scipy import fft
+        kernel_h, kernel_w = kernel.shape
+        axes = spatial_axes(img)
+        # Indexes the axes before the spatial ones: the images of a batch.
+        lead = (slice(None),) * axes[0]
+        padded = cls._pad(img, kernel_h // 2, kernel_h // 2, mode)
+        height, width = padded.shape[axes[0]:axes[1] + 1]
+        fft_shape = _fft_block_shape(img.shape[axes[0]:], kernel.shape)
+        block_h, block_w = fft_shape[0] - kernel_h + 1, fft_shape[1] - kernel_w + 1
+
+        kernel_spectrum = fft.rfft2(kernel.astype(work_dtype), s=fft_shape)
+        kernel_spectrum = kernel_spectrum.reshape(kernel_spectrum.shape + (1,) * (img.ndim - axes[1] - 1))
+        full_shape = (height + kernel_h - 1, width + kernel_w - 1)
+        full = np.zeros(img.shape[:axes[0]] + full_shape + img.shape[axes[1] + 1:], dtype=work_dtype)
+        for top in range(0, height, block_h):
+            for left in range(0, width, block_w):
+                block = padded[lead + (slice(top, top + block_h), slice(left, left + block_w))].astype(work_dtype)
+                spectrum = fft.rfft2(block, s=fft_shape, axes=axes)
+                spectrum *= kernel_spectrum
+                out = fft.irfft2(spectrum, s=fft_shape, axes=axes)
+                rows = min(fft_shape[0], full.shape[axes[0]] - top)
+                cols = min(fft_shape[1], full.shape[axes[1]] - left)
+                window = lead + (slice(top, top + rows), slice(left, left + cols))
+                full[window] += out[lead + (slice(rows), slice(cols))]
+        return full[lead + (slice(kernel_h - 1, height), slice(kernel_w - 1, width))]
+
+    @classmethod
+    def _pad(cls, img: np.array, before: int, after: int, mode: Optional[str] = None) -> np.array:
+        """Pad the two spatial axes the same way ``mode`` extends borders.
+
+        Args:
+            img (np.array): The input image.
+            before (int): Number of samples to add before each spatial axis.
+            after (int): Number of samples to add after each spatial axis.
+            mode (str): Boundary mode overriding ``cls.mode``.
+
+        Returns:
+            np.array: The padded image.
+        """
+        pad_width = [(0, 0)] * img.ndim
+        for axis in spatial_axes(img):
+            pad_width[axis] = (before, after)
+        mode = mode or cls.mode
+        if mode == 'constant':
+            return np.pad(img, pad_width, mode='constant', constant_values=cls.cval)
+        return np.pad(img, pad_width, mode=PAD_MODES[mode])
+
 class ConvolutionParams(IParams):
     """Base class for convolution parameters."""
     def validate(self):
         pass
-    
\ No newline at end of file
+
+    def scaled(self, factor: float) -> 'ConvolutionParams':
+        """Scale ``kernel_size`` to the nearest odd size of at least 3."""
+        kernel_size = max(3, 2 * int(round((self.kernel_size * factor - 1) / 2)) + 1)
+        return replace(self, kernel_size=kernel_size)
+
@@ -0,0 +1,122 @@
+from dataclasses import dataclass
+from functools import reduce
+from typing import Any, Dict, Optional, Tuple
+from convolutions.base_convolution import BaseConvolution, ConvolutionParams, KernelPlan, compose_plans
+from interfaces.IBase import IBase
+from interfaces.IParams import IParams
+from pipeline.image_buffer import spatial_axes
+import numpy as np
+
+# Boundary modes for which convolving twice equals convolving once with the
+# composed kernel. Circular convolution always composes; 'reflect' and
+# 'mirror' extend the image evenly along each axis on its own, which
+# convolving keeps only if every kernel is symmetric about both axes.
+COMPOSABLE_MODES = ('reflect', 'mirror', 'wrap')
+SYMMETRIC_MODES = ('reflect', 'mirror')
+
+
+@dataclass
+class FusedParams(ConvolutionParams):
+    """A run of linear pipeline steps to be applied as one convolution."""
+    steps: Tuple[Tuple[IBase, IParams], ...] = ()
+
+    def __post_init__(self):
+        self.__plan = None
+
+    def validate(self):
+        if len(self.steps) < 2:
+            raise ValueError("steps must contain at least two convolutions")
+        for filter, params in self.steps:
+            if filter.get_kernel_plan(params) is None:
+                raise ValueError(f"{type(filter).__name__} is not a linear filter")
+
+    def get_param_definitions() -> Dict[str, Any]:
+        return {
+        }
+
+    @property
+    def plan(self) -> KernelPlan:
+        """The composed kernel plan of all steps."""
+        if self.__plan is None:
+            self.__plan = reduce(compose_plans, (filter.get_kernel_plan(params) for filter, params in self.steps))
+        return self.__plan
+
+    @property
+    def kernel_size(self) -> int:
+        return self.plan.kernel.shape[0]
+
+    @property
+    def mode(self) -> str:
+        """The shared boundary mode if the steps compose exactly, else None."""
+        modes = {getattr(filter, 'mode', None) for filter, _ in self.steps}
+        if len(modes) != 1 or next(iter(modes)) not in COMPOSABLE_MODES:
+            return None
+        mode = next(iter(modes))
+        if mode in SYMMETRIC_MODES:
+            plans = (filter.get_kernel_plan(params) for filter, params in self.steps)
+            if not all(plan.is_axis_symmetric for plan in plans):
+                return None
+        return mode
+
+class FusedConvolution(BaseConvolution):
+    @classmethod
+    def apply(cls, img: np.array, params: FusedParams, out: Optional[np.array] = None) -> np.array:
+        """Apply a run of convolutions as a single pass with the composed kernel.
+
+        In the interior the result equals applying the steps one by one, up
+        to the rounding that is skipped between steps. Near the border each
+        step's own boundary mode matters; unless all steps share a mode that
+        composes exactly, the border band (as wide as the combined kernel
+        radius) is recomputed by running the steps one by one on thin strips.
+
+        Args:
+            img (np.array): The input image.
+            params (FusedParams): The steps to fuse.
+            out (np.array): Array to write the result into.
+
+        Returns:
+            np.array: The processed image.
+        """
+        params.validate()
+        mode = params.mode
+        result = cls._convolve(img, params.plan, mode=mode or 'reflect', out=out)
+        if mode is None:
+            cls._fix_border(img, result, params)
+        return result
+
+    @classmethod
+    def get_kernel_plan(cls, params: FusedParams) -> KernelPlan:
+        return params.plan
+
+    @classmethod
+    def _create_kernel(cls, params: FusedParams) -> np.array:
+        return params.plan.kernel
+
+    @classmethod
+    def _fix_border(cls, img: np.array, result: np.array, params: FusedParams):
+        """Overwrite the border band of ``result`` with the step-by-step result.
+
+        A strip twice as wide as the radius is processed for each side; its
+        inner half absorbs the errors introduced by the strip's own edges.
+        """
+        radius = params.kernel_size // 2
+        rows, cols = spatial_axes(img)
+        height, width = img.shape[rows], img.shape[cols]
+        if 2 * radius >= min(height, width):
+            result[...] = cls._apply_steps(img, params)
+            return
+        band = 2 * radius
+        # Strips span every image of a batch.
+        lead = (slice(None),) * rows
+        top, bottom = lead + (slice(None, radius),), lead + (slice(-radius, None),)
+        result[top] = cls._apply_steps(img[lead + (slice(None, band),)], params)[top]
+        result[bottom] = cls._apply_steps(img[lead + (slice(-band, None),)], params)[bottom]
+        left, right = lead + (slice(None), slice(None, radius)), lead + (slice(None), slice(-radius, None))
+        result[left] = cls._apply_steps(img[lead + (slice(None), slice(None, band))], params)[left]
+        result[right] = cls._apply_steps(img[lead + (slice(None), slice(-band, None))], params)[right]
+
+    @staticmethod
+    def _apply_steps(img: np.array, params: FusedParams) -> np.array:
+        for filter, step_params in params.steps:
+            img = filter.apply(img, step_params)
+        return img
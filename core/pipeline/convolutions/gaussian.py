@@ -1,7 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from typing import Optional
 from convolutions.base_convolution import BaseConvolution, ConvolutionParams
 import numpy as np
-from scipy.ndimage import convolve
 
 @dataclass
 class GaussianParams(ConvolutionParams):
@@ -16,6 +16,11 @@ class GaussianParams(ConvolutionParams):
             raise ValueError("kernel_size must be at least 3")
         if self.sigma <= 0:
             raise ValueError("sigma must be positive")
+
+    def scaled(self, factor: float) -> 'GaussianParams':
+        """Scale the kernel size and sigma together."""
+        return replace(super().scaled(factor), sigma=self.sigma * factor)
+
     def get_param_definitions():
         return {
             'kernel_size': {
@@ -35,30 +40,27 @@ class GaussianParams(ConvolutionParams):
         }
         
 class GaussianConvolution(BaseConvolution):
+    mode = 'constant'
+
     @classmethod
-    def apply(cls, img: np.array, params: GaussianParams) -> np.array:
+    def apply(cls, img: np.array, params: GaussianParams, out: Optional[np.array] = None) -> np.array:
         """Apply the Gaussian convolution to the image.
         
         Args:
             img (np.array): The input image.
             params (GaussianParams): The parameters for the convolution.
+            out (np.array): Array to write the result into.
         
         Returns:
             np.array: The processed image.
         """
         params.validate()
-        kernel = cls._create_kernel(params.kernel_size, params.sigma)
-        if img.ndim == 2:  # Grayscale image
-            return cls._apply_convolution(img, kernel)
-        elif img.ndim == 3:  # Color image
-            channels = []
-            for i in range(img.shape[2]):
-                channel = cls._apply_convolution(img[:, :, i], kernel)
-                channels.append(channel)
-            return np.stack(channels, axis=2)
-        else:
-            raise ValueError("Unsupported image dimensions")
+        return cls._convolve(img, cls.get_kernel_plan(params), out=out)
     
+    @classmethod
+    def _kernel_args(cls, params: GaussianParams) -> tuple:
+        return (params.kernel_size, params.sigma)
+
     @classmethod
     def _create_kernel(cls, kernel_size: int, sigma: float) -> np.array:
         """Create the Gaussian convolution kernel.
@@ -75,13 +77,3 @@ class GaussianConvolution(BaseConvolution):
             (kernel_size, kernel_size)
         )
         return kernel / np.sum(kernel)
- 
-    @classmethod
-    def _apply_convolution(cls, img: np.array, kernel: np.array) -> np.array:
-        """Apply the convolution to the image.
-        
-        Args:
-            img (np.array): The input image.
-            kernel (np.array): The convolution kernel.
-        """
-        return convolve(img, kernel, mode='constant', cval=0.0)
\ No newline at end of file
@@ -1,7 +1,7 @@
 from dataclasses import dataclass
+from typing import Optional
 from convolutions.base_convolution import BaseConvolution, ConvolutionParams
 import numpy as np
-from scipy.ndimage import convolve
 
 @dataclass
 class SharpeningParams(ConvolutionParams):
@@ -37,29 +37,24 @@ class SharpeningParams(ConvolutionParams):
         
 class SharpeningConvolution(BaseConvolution):
     @classmethod
-    def apply(cls, img: np.array, params: SharpeningParams) -> np.array:
+    def apply(cls, img: np.array, params: SharpeningParams, out: Optional[np.array] = None) -> np.array:
         """Apply the sharpening convolution to the image.
         
         Args:
             img (np.array): The input image.
             params (SharpeningParams): The parameters for the convolution.
+            out (np.array): Array to write the result into.
         
         Returns:
             np.array: The processed image.
         """
         params.validate()
-        kernel = cls._create_kernel(params.kernel_size, params.alpha)
-        if img.ndim == 2:  # Grayscale image
-            return cls._apply_convolution(img, kernel)
-        elif img.ndim == 3:  # Color image
-            channels = []
-            for i in range(img.shape[2]):
-                channel = cls._apply_convolution(img[:, :, i], kernel)
-                channels.append(channel)
-            return np.stack(channels, axis=2)
-        else:
-            raise ValueError("Unsupported image dimensions")
+        return cls._convolve(img, cls.get_kernel_plan(params), out=out)
     
+    @classmethod
+    def _kernel_args(cls, params: SharpeningParams) -> tuple:
+        return (params.kernel_size, params.alpha)
+
     @classmethod
     def _create_kernel(cls, kernel_size: int, alpha: float) -> np.array:
         """Create the sharpening convolution kernel.
@@ -76,14 +71,17 @@ class SharpeningConvolution(BaseConvolution):
         return kernel
 
     @classmethod
-    def _apply_convolution(cls, img: np.array, kernel: np.array) -> np.array:
-        """Apply the convolution to the image.
-        
+    def _decompose_kernel(cls, kernel: np.array, kernel_size: int, alpha: float):
+        """Split the kernel into an identity term minus a separable box blur.
+
         Args:
-            img (np.array): The input image.
-            kernel (np.array): The convolution kernel.
-        
+            kernel (np.array): The dense sharpening kernel.
+            kernel_size (int): The size of the kernel.
+            alpha (float): The strength of the sharpening effect.
+
         Returns:
-            np.array: The processed image.
+            tuple: ``(identity, factors)`` as stored on ``KernelPlan``.
         """
-        return convolve(img, kernel)
\ No newline at end of file
+        off_center = 1 / (kernel_size**2 - 1)
+        box = np.full(kernel_size, 1.0)
+        return 1 + alpha + off_center, ((-off_center * box, box),)
@@ -0,0 +1,7 @@
+from pipeline.registry import register_operator
+
+# Gradient-threshold edge detectors, reading one pixel around each pixel.
+register_operator('sobel', 'Sobel Edge', 'edges.sobel:SobelEdge', 'edges.sobel:SobelParams',
+                  footprint=1, cost=2)
+register_operator('roberts', 'Roberts Edge', 'edges.roberts:RobertsEdge', 'edges.roberts:RobertsParams',
+                  footprint=1, cost=1.5)
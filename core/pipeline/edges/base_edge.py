@@ -1,25 +1,177 @@
-from abc import ABC, abstractmethod
+from abc import abstractmethod
 from dataclasses import dataclass
+from typing import NamedTuple, Optional, Tuple
 import numpy as np
 from interfaces.IBase import IBase
 from interfaces.IParams import IParams
+from pipeline.precision import compute_dtype
+
+# ITU-R BT.601 luma weights, and the same weights in 8-bit fixed point
+# (they sum to 256, so integer luma stays within the input range).
+LUMA_WEIGHTS = (0.2989, 0.5870, 0.1140)
+LUMA_WEIGHTS_FIXED = (77, 150, 29)
+
+class Gradient(NamedTuple):
+    """The two derivatives of an image.
+
+    ``gx`` grows towards increasing columns and ``gy`` towards increasing
+    rows. Integer images give int16 derivatives (int32 for wider inputs),
+    float images give derivatives in their compute dtype.
+    """
+    gx: np.array
+    gy: np.array
+    # Angle of the derivative axes, for operators with rotated kernels.
+    rotation: float = 0.0
+
+    def magnitude_squared(self) -> np.array:
+        """Return gx² + gy², widened so that it cannot overflow."""
+        dtype = np.result_type(self.gx.dtype, np.int32) if self.gx.dtype.kind == 'i' else self.gx.dtype
+        gx = self.gx.astype(dtype)
+        gy = self.gy.astype(dtype)
+        gx *= gx
+        gy *= gy
+        gx += gy
+        return gx
+
+    @property
+    def magnitude(self) -> np.array:
+        """The gradient magnitude, as floats."""
+        return np.hypot(self.gx, self.gy, dtype=compute_dtype(self.gx.dtype))
+
+    @property
+    def direction(self) -> np.array:
+        """The gradient direction in radians, in ``[-pi, pi]``."""
+        direction = np.arctan2(self.gy, self.gx, dtype=compute_dtype(self.gx.dtype))
+        if self.rotation:
+            direction += self.rotation
+            direction[direction > np.pi] -= 2 * np.pi
+        return direction
 
 class BaseEdge(IBase):
-    @abstractmethod
-    def apply(self, img: np.array, params: 'EdgeParams') -> np.array:
+    # Samples the derivative kernels reach before and after each pixel.
+    reach: Tuple[int, int] = (1, 1)
+
+    @classmethod
+    def apply(cls, img: np.array, params: 'EdgeParams', out: Optional[np.array] = None) -> np.array:
         """Apply the edge detection to the image.
-        
+
+        Pixels whose squared gradient magnitude exceeds the squared
+        threshold become 255, the others 0. The result is a single 2-D
+        channel for gray and color images alike (one-channel in batches);
+        it is only expanded to RGB for display.
+
         Args:
             img (np.array): The input image.
             params (EdgeParams): The parameters for the edge detection.
-        
+            out (np.array): Array to write the result into.
+
         Returns:
             np.array: The processed image.
         """
+        params.validate()
+        if img.ndim not in (2, 3, 4):
+            raise ValueError("Unsupported image dimensions")
+        mask = cls.edge_mask(cls.gradient(img), params.threshold)
+        if img.ndim == 4:
+            mask = mask[..., np.newaxis]
+        if out is None:
+            return np.where(mask, np.array(255, dtype=img.dtype), np.array(0, dtype=img.dtype))
+        return np.multiply(mask, out.dtype.type(255), out=out)
+
+    @classmethod
+    def gradient(cls, img: np.array) -> Gradient:
+        """Compute both derivatives of the image's luma in one pass.
+
+        The luma is padded once (mirroring the border like
+        ``scipy.ndimage``'s 'reflect' mode) and the derivatives are read
+        from shifted views of it, without generic convolutions. The luma of
+        a batch is padded with the images on the last axis, where the
+        derivatives' slicing of the first two axes leaves them apart.
+
+        Args:
+            img (np.array): A grayscale or color image, or a batch.
+
+        Returns:
+            Gradient: The derivatives, shaped like the image without its
+            channel axis.
+        """
+        gray = cls._luma(img)
+        if img.ndim == 4:
+            gray = np.moveaxis(gray, 0, -1)
+        before, after = cls.reach
+        pad_width = ((before, after), (before, after)) + ((0, 0),) * (gray.ndim - 2)
+        padded = np.pad(gray, pad_width, mode='symmetric')
+        if np.issubdtype(padded.dtype, np.integer):
+            padded = padded.astype(np.int16 if padded.itemsize == 1 else np.int32)
+        gx, gy = cls._derivatives(padded)
+        if img.ndim == 4:
+            gx, gy = np.moveaxis(gx, -1, 0), np.moveaxis(gy, -1, 0)
+        return Gradient(gx, gy)
+
+    @staticmethod
+    def edge_mask(gradient: Gradient, threshold: float) -> np.array:
+        """Return where the gradient magnitude is above ``threshold``.
+
+        Squared magnitudes are compared with the squared threshold, so no
+        square root is taken.
+        """
+        if threshold < 0:
+            return np.ones(gradient.gx.shape, dtype=bool)
+        return gradient.magnitude_squared() > threshold * threshold
+
+    @classmethod
+    def _luma(cls, img: np.array) -> np.array:
+        """Return the luma of a color image, or a grayscale image as is.
+
+        Integer images use fixed-point weights, so their luma keeps the
+        integer dtype; float images are converted to their compute dtype.
+        """
+        if img.ndim == 2:
+            return img
+        if img.shape[-1] == 1:
+            return img[..., 0]
+        if np.issubdtype(img.dtype, np.integer):
+            acc_dtype = np.uint32 if img.itemsize <= 2 else np.uint64
+            r, g, b = LUMA_WEIGHTS_FIXED
+            luma = np.multiply(img[..., 0], r, dtype=acc_dtype)
+            luma += np.multiply(img[..., 1], g, dtype=acc_dtype)
+            luma += np.multiply(img[..., 2], b, dtype=acc_dtype)
+            luma += 128
+            luma >>= 8
+            return luma.astype(img.dtype)
+        work_dtype = compute_dtype(img.dtype)
+        return np.dot(img[..., :3], np.array(LUMA_WEIGHTS, dtype=work_dtype))
+
+    @classmethod
+    @abstractmethod
+    def _derivatives(cls, padded: np.array) -> Tuple[np.array, np.array]:
+        """Compute the derivatives from the luma padded by ``cls.reach``.
+
+        Args:
+            padded (np.array): The padded luma, int16/int32 or float. Axes
+                after the first two hold separate images of a batch.
+
+        Returns:
+            Tuple[np.array, np.array]: ``(gx, gy)`` of the unpadded shape.
+        """
         pass
-    
+
+    @classmethod
+    def get_footprint(cls, params: 'EdgeParams') -> int:
+        """The gradient kernels reach one pixel in every direction."""
+        return max(cls.reach)
+
+    @classmethod
+    def supports_out(cls, params: 'EdgeParams') -> bool:
+        return True
+
+    @classmethod
+    def get_output_channels(cls, params: 'EdgeParams', channels: int) -> int:
+        """The edge mask is a single channel."""
+        return 1
+
 @dataclass
 class EdgeParams(IParams):
     """Base class for edge detection parameters with validation"""
     def validate(self):
-        pass
\ No newline at end of file
+        pass
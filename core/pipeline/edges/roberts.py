@@ -1,7 +1,7 @@
 from dataclasses import dataclass
-from edges.base_edge import BaseEdge, EdgeParams
+from typing import Tuple
+from edges.base_edge import BaseEdge, EdgeParams, Gradient
 import numpy as np
-from scipy.ndimage import convolve
 
 @dataclass
 class RobertsParams(EdgeParams):
@@ -24,55 +24,19 @@ class RobertsParams(EdgeParams):
         }
         
 class RobertsEdge(BaseEdge):
-    # @classmethod
-    # def apply(cls, img: np.array, params: RobertsParams) -> np.array:
-    #     """Apply the Roberts edge detection to the image.
-        
-    #     Args:
-    #         img (np.array): The input image.
-    #         params (RobertsParams): The parameters for the edge detection.
-        
-    #     Returns:
-    #         np.array: The processed image.
-    #     """
-    #     params.validate()
-    #     roberts_x = np.array([[1, 0], [0, -1]])
-    #     roberts_y = np.array([[0, 1], [-1, 0]])
-        
-    #     if img.ndim == 3:
-    #         img = np.dot(img[..., :3], [0.2989, 0.5870, 0.1140]).astype(np.uint8)
-        
-    #     gradient_x = np.abs(convolve(img, roberts_x, mode='reflect'))
-    #     gradient_y = np.abs(convolve(img, roberts_y, mode='reflect'))
-    #     gradient = np.sqrt(gradient_x ** 2 + gradient_y ** 2)
-        
-    #     return np.where(gradient > params.threshold, 255, 0)
+    # The derivatives are taken towards the next row and column.
+    reach = (0, 1)
+
     @classmethod
-    def apply(cls, img: np.array, params: RobertsParams) -> np.array:
-        """Apply the Roberts edge detection to the image."""
-        params.validate()
-        
-        original_shape = img.shape
-        has_color = img.ndim == 3
-        
-        if has_color:
-            gray_img = np.dot(img[..., :3], [0.2989, 0.5870, 0.1140]).astype(np.uint8)
-        else:
-            gray_img = img
-        
-        roberts_x = np.array([[1, 0], [0, -1]])
-        roberts_y = np.array([[0, 1], [-1, 0]])
-        
-        gradient_x = np.abs(convolve(gray_img, roberts_x, mode='reflect'))
-        gradient_y = np.abs(convolve(gray_img, roberts_y, mode='reflect'))
-        gradient = np.sqrt(gradient_x ** 2 + gradient_y ** 2)
-        
-        edge_img = np.where(gradient > params.threshold, 255, 0).astype(np.uint8)
-        
-        if has_color:
-            result = np.zeros_like(img)
-            for i in range(min(3, original_shape[2])):  
-                result[..., i] = edge_img
-            return result
-        else:
-            return edge_img
\ No newline at end of file
+    def _derivatives(cls, padded: np.array) -> Tuple[np.array, np.array]:
+        """Roberts cross: differences along the two diagonals."""
+        return padded[1:, 1:] - padded[:-1, :-1], padded[1:, :-1] - padded[:-1, 1:]
+
+    @classmethod
+    def gradient(cls, img: np.array) -> Gradient:
+        """Compute the diagonal derivatives of the image's luma.
+
+        ``gx`` and ``gy`` of the result run along the main and the anti
+        diagonal; its ``direction`` accounts for the 45 degree rotation.
+        """
+        return super().gradient(img)._replace(rotation=np.pi / 4)
@@ -0,0 +1,13 @@
+from pipeline.registry import register_operator
+
+# Point operators: every output pixel depends only on the same input pixel.
+register_operator('brightness', 'Brightness', 'filters.brightness:BrightnessFilter',
+                  'filters.brightness:BrightnessParams')
+register_operator('contrast', 'Contrast', 'filters.contrast:ContrastFilter',
+                  'filters.contrast:ContrastParams')
+register_operator('grayscale', 'Grayscale', 'filters.grayscale:GrayscaleFilter',
+                  'filters.grayscale:GrayscaleParams', cost=4)
+register_operator('binarization', 'Binarization', 'filters.binarization:BinarizationFilter',
+                  'filters.binarization:BinarizationParams')
+register_operator('negative', 'Negative', 'filters.negative:NegativeFilter',
+                  'filters.negative:NegativeParams')
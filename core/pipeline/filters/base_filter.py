@@ -1,23 +1,119 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from typing import Optional
 import numpy as np
 from interfaces.IBase import IBase
 from interfaces.IParams import IParams
+from pipeline.precision import compute_dtype, row_bands, saturate
+
+
+def apply_lut(lut: np.array, img: np.array, out: Optional[np.array] = None) -> np.array:
+    """Map a uint8 image through a 256-entry lookup table, like ``lut[img]``.
+
+    np.take widens its indices to intp, 8 bytes per pixel, so bands of
+    rows are looked up one at a time to keep that temporary small.
+
+    Args:
+        lut (np.array): The lookup table.
+        img (np.array): The uint8 image.
+        out (np.array): Array to write the result into, possibly ``img``.
+
+    Returns:
+        np.array: The mapped image (``out`` if given).
+    """
+    if out is None:
+        out = np.empty(img.shape, dtype=lut.dtype)
+    for band in row_bands(img.shape):
+        # uint8 values are always valid indices, and 'clip' lets take write to out unbuffered.
+        np.take(lut, img[band], out=out[band], mode='clip')
+    return out
 
 class BaseFilter(IBase):
     @abstractmethod
-    def apply(self, img: np.array, params: 'FilterParams') -> np.array:
+    def apply(self, img: np.array, params: 'FilterParams', out: Optional[np.array] = None) -> np.array:
         """Apply the filter to the image.
         
         Args:
             img (np.array): The input image.
             params (FilterParams): The parameters for the filter.
+            out (np.array): Array to write the result into.
         
         Returns:
             np.array: The processed image.
         """
         pass
+
+    @classmethod
+    def get_footprint(cls, params: 'FilterParams') -> int:
+        """Filters only look at the pixel itself."""
+        return 0
+
+    @classmethod
+    def supports_out(cls, params: 'FilterParams') -> bool:
+        return True
     
+class PointFilter(BaseFilter):
+    """Base class for filters that map each pixel value independently."""
+    @classmethod
+    @abstractmethod
+    def _transfer(cls, values: np.array, params: 'FilterParams') -> np.array:
+        """Map pixel values to output values before clipping to [0, 255].
+
+        Args:
+            values (np.array): The input values, as a float array.
+            params (FilterParams): The parameters for the filter.
+
+        Returns:
+            np.array: The transformed values.
+        """
+        pass
+
+    @classmethod
+    def get_lut(cls, params: 'FilterParams') -> np.array:
+        """Tabulate the filter over all 256 uint8 values.
+
+        Args:
+            params (FilterParams): The parameters for the filter.
+
+        Returns:
+            np.array: The uint8 lookup table.
+        """
+        params.validate()
+        values = cls._transfer(np.arange(256, dtype=np.float64), params)
+        return saturate(values, np.uint8)
+
+    @classmethod
+    def apply(cls, img: np.array, params: 'FilterParams', out: Optional[np.array] = None) -> np.array:
+        """Apply the filter, through the lookup table for uint8 images.
+
+        Float images are transformed in their own precision, a band of rows
+        at a time, and clipped to [0, 255]; the result always has the input
+        dtype.
+
+        Args:
+            img (np.array): The input image.
+            params (FilterParams): The parameters for the filter.
+            out (np.array): Array to write the result into, possibly ``img``.
+
+        Returns:
+            np.array: The processed image.
+        """
+        if img.dtype == np.uint8:
+            return apply_lut(cls.get_lut(params), img, out)
+        params.validate()
+        if out is None:
+            out = np.empty(img.shape, dtype=img.dtype)
+        work_dtype = compute_dtype(img.dtype)
+        for band in row_bands(img.shape):
+            values = cls._transfer(img[band].astype(work_dtype, copy=False), params)
+            saturate(values, img.dtype, out=out[band])
+        return out
+
+    @classmethod
+    def supports_in_place(cls, params: 'FilterParams') -> bool:
+        """Every pixel is mapped on its own, so the image can be overwritten."""
+        return True
+
 @dataclass
 class FilterParams(IParams):
     """Bazowa klasa parametrów z walidacją"""
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from filters.base_filter import BaseFilter, FilterParams
+from filters.base_filter import PointFilter, FilterParams
 import numpy as np
 
 @dataclass
@@ -22,17 +22,16 @@ class BinarizationParams(FilterParams):
             }
         }
         
-class BinarizationFilter(BaseFilter):
+class BinarizationFilter(PointFilter):
     @classmethod
-    def apply(self, img: np.array, params: BinarizationParams) -> np.array:
+    def _transfer(cls, values: np.array, params: BinarizationParams) -> np.array:
         """Convert the image to binary using the specified threshold.
-        
+
         Args:
-            img (np.array): The input image.
+            values (np.array): The input pixel values.
             params (BinarizationParams): The parameters for the filter.
-        
+
         Returns:
-            np.array: The binary image.
+            np.array: The transformed pixel values.
         """
-        params.validate()
-        return np.where(img > params.threshold, 255, 0)
\ No newline at end of file
+        return np.where(values > params.threshold, 255, 0)
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from filters.base_filter import BaseFilter, FilterParams
+from filters.base_filter import PointFilter, FilterParams
 import numpy as np
 
 @dataclass
@@ -24,18 +24,16 @@ class BrightnessParams(FilterParams):
         }
         
         
-class BrightnessFilter(BaseFilter):
+class BrightnessFilter(PointFilter):
     @classmethod
-    def apply(self, img: np.array, params: BrightnessParams) -> np.array:
+    def _transfer(cls, values: np.array, params: BrightnessParams) -> np.array:
         """Adjust the brightness of the image.
-        
+
         Args:
-            img (np.array): The input image.
+            values (np.array): The input pixel values.
             params (BrightnessParams): The parameters for the filter.
-        
+
         Returns:
-            np.array: The image with adjusted brightness.
+            np.array: The transformed pixel values.
         """
-        params.validate()
-        img = img + params.value
-        return np.clip(img, 0, 255)
\ No newline at end of file
+        return values + params.value
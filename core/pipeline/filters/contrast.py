@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from filters.base_filter import BaseFilter, FilterParams
+from filters.base_filter import PointFilter, FilterParams
 import numpy as np
 
 @dataclass
@@ -22,18 +22,16 @@ class ContrastParams(FilterParams):
             }
         }
         
-class ContrastFilter(BaseFilter):
+class ContrastFilter(PointFilter):
     @classmethod
-    def apply(self, img: np.array, params: ContrastParams) -> np.array:
+    def _transfer(cls, values: np.array, params: ContrastParams) -> np.array:
         """Adjust the contrast of the image.
-        
+
         Args:
-            img (np.array): The input image.
+            values (np.array): The input pixel values.
             params (ContrastParams): The parameters for the filter.
-        
+
         Returns:
-            np.array: The image with adjusted contrast.
+            np.array: The transformed pixel values.
         """
-        params.validate()
-        img = (img - 128) * params.value + 128
-        return np.clip(img, 0, 255)
\ No newline at end of file
+        return (values - 128) * params.value + 128
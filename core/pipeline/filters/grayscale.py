@@ -1,5 +1,7 @@
 from dataclasses import dataclass
+from typing import Optional
 from filters.base_filter import BaseFilter, FilterParams
+from pipeline.precision import compute_dtype, saturate
 import numpy as np
 
 @dataclass
@@ -53,22 +55,31 @@ class GrayscaleFilter(BaseFilter):
     #     elif params.method == "lightness":
     #         img = np.max(img, axis=-1)
     #     return img * params.intensity
-    def apply(self, img: np.array, params: GrayscaleParams) -> np.array:
-        """Convert the image to grayscale using the specified method."""
+    def apply(self, img: np.array, params: GrayscaleParams, out: Optional[np.array] = None) -> np.array:
+        """Convert the image to grayscale using the specified method.
+
+        The result is a single 2-D channel (one-channel in batches); it is
+        only expanded to RGB for display. Gray input is already gray, so
+        only the intensity applies.
+        """
         params.validate()
-        original_shape = img.shape
-        
-        if params.method == "luminosity":
-            gray = np.dot(img[...,:3], [0.21, 0.72, 0.07])
+        work_dtype = compute_dtype(img.dtype)
+
+        if img.ndim == 2 or img.shape[-1] == 1:
+            gray = img.astype(work_dtype)
+        elif params.method == "luminosity":
+            gray = np.dot(img[...,:3], np.array([0.21, 0.72, 0.07], dtype=work_dtype))
         elif params.method == "average":
-            gray = np.mean(img, axis=-1)
+            gray = np.mean(img[...,:3], axis=-1, dtype=work_dtype)
         elif params.method == "lightness":
-            gray = np.max(img, axis=-1)
-            
-        gray = gray * params.intensity
-        
-        result = np.zeros_like(img)
-        for i in range(min(3, original_shape[2])):  
-            result[..., i] = gray
-            
-        return result
\ No newline at end of file
+            gray = np.max(img[...,:3], axis=-1).astype(work_dtype)
+        if img.ndim == 4 and gray.ndim == 3:
+            gray = gray[..., np.newaxis]
+
+        gray *= work_dtype.type(params.intensity)
+        return saturate(gray, img.dtype, out=out)
+
+    @classmethod
+    def get_output_channels(cls, params: GrayscaleParams, channels: int) -> int:
+        """The result is a single gray channel."""
+        return 1
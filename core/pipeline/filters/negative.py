@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from filters.base_filter import BaseFilter, FilterParams
+from filters.base_filter import PointFilter, FilterParams
 import numpy as np
 from typing import Dict, Any
 
@@ -15,16 +15,16 @@ class NegativeParams(FilterParams):
         return {
         }
 
-class NegativeFilter(BaseFilter):
+class NegativeFilter(PointFilter):
     @classmethod
-    def apply(self, img: np.array, params: NegativeParams) -> np.array:
+    def _transfer(cls, values: np.array, params: NegativeParams) -> np.array:
         """Convert the image to its negative.
-        
+
         Args:
-            img (np.array): The input image.
+            values (np.array): The input pixel values.
             params (NegativeParams): The parameters for the filter.
-        
+
         Returns:
-            np.array: The negative image.
+            np.array: The transformed pixel values.
         """
-        return 255 - img
\ No newline at end of file
+        return 255 - values
@@ -0,0 +1,361 @@
+import io
+import os
+import tempfile
+import threading
+from queue import Queue
+from typing import Any, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, TypeVar, Union
+import numpy as np
+from interfaces.IBase import IBase
+from interfaces.IParams import IParams
+from pipeline.image_buffer import ImageBuffer
+from pipeline.image_pipeline import ImagePipeline
+from pipeline.precision import DEFAULT_PRECISION, saturate
+from pipeline.step_cache import StepCache
+
+# Frames decoded ahead of the one being processed.
+DEFAULT_PREFETCH = 2
+# Formats FrameWriter encodes frame by frame, by file extension. Pillow only
+# writes APNG and animated WebP from a complete list of frames.
+FRAME_FORMATS = {'.gif': 'GIF', '.tif': 'TIFF', '.tiff': 'TIFF'}
+# Size of the chunks encode_frames reads back from temporary files.
+CHUNK_SIZE = 2**20
+# Alpha below this is fully transparent in GIF frames, which have no partial transparency.
+GIF_ALPHA_THRESHOLD = 128
+
+T = TypeVar('T')
+
+
+class Frame(NamedTuple):
+    """One frame of a multi-frame image."""
+    image: ImageBuffer
+    # Display time in milliseconds, for animations.
+    duration: Optional[int] = None
+
+
+def _to_frame(image: Any) -> Frame:
+    return Frame(ImageBuffer.from_pil(image), image.info.get('duration'))
+
+
+def frame_format(path: str) -> Optional[str]:
+    """The format ``FrameWriter`` writes for a file name, or None if it writes none for its extension."""
+    return FRAME_FORMATS.get(os.path.splitext(path)[1].lower())
+
+
+class FrameSource:
+    """The frames of an animation (GIF, APNG, WebP), a multi-page TIFF or an
+    image sequence, decoded lazily.
+
+    Only the frame count is read up front. Iterating decodes one frame at a
+    time and ``read`` decodes a single frame, so memory does not grow with
+    the number of frames. Every iteration and ``read`` opens the file anew,
+    so a source can be shared by threads.
+    """
+    def __init__(self, source: Union[bytes, str, Sequence[str]]):
+        """Read the frame count of a source.
+
+        Args:
+            source (bytes | str | Sequence[str]): An encoded file, the path
+                of a file, or the paths of an image sequence, one frame per
+                file.
+
+        Raises:
+            ValueError: For an empty image sequence.
+        """
+        if isinstance(source, (bytes, str, os.PathLike)):
+            self.__source, self.__paths = source, None
+            with self.__open() as image:
+                self.__count = getattr(image, 'n_frames', 1)
+                self.__format = image.format
+                self.__loop = image.info.get('loop')
+        else:
+            self.__source, self.__paths = None, list(source)
+            if not self.__paths:
+                raise ValueError("an image sequence needs at least one file")
+            self.__count, self.__format, self.__loop = len(self.__paths), None, None
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def __iter__(self) -> Iterator[Frame]:
+        """Decode the frames in order, one at a time."""
+        from PIL import Image
+        if self.__paths is not None:
+            for path in self.__paths:
+                with Image.open(path) as image:
+                    yield _to_frame(image)
+            return
+        with self.__open() as image:
+            for index in range(self.__count):
+                image.seek(index)
+                yield _to_frame(image)
+
+    def read(self, index: int) -> Frame:
+        """Decode the frame at ``index`` only.
+
+        Formats that store frames as differences (GIF, APNG) still have to
+        decode the frames before it, but they are not kept.
+        """
+        from PIL import Image
+        if not 0 <= index < self.__count:
+            raise IndexError(f"frame {index} out of range for {self.__count} frames")
+        if self.__paths is not None:
+            with Image.open(self.__paths[index]) as image:
+                return _to_frame(image)
+        with self.__open() as image:
+            image.seek(index)
+            return _to_frame(image)
+
+    @property
+    def format(self) -> Optional[str]:
+        """The PIL format of the file, or None for image sequences."""
+        return self.__format
+
+    @property
+    def loop(self) -> Optional[int]:
+        """How many times an animation repeats (0 forever), or None if the file does not say."""
+        return self.__loop
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the encoded file kept in memory."""
+        return len(self.__source) if isinstance(self.__source, bytes) else 0
+
+    def __open(self) -> Any:
+        from PIL import Image
+        return Image.open(io.BytesIO(self.__source) if isinstance(self.__source, bytes) else self.__source)
+
+
+def prefetch(items: Iterable[T], depth: int = DEFAULT_PREFETCH) -> Iterator[T]:
+    """Iterate over ``items`` while a background thread produces the next ones.
+
+    At most ``depth`` items wait in a queue, so producing (e.g. decoding
+    frames) overlaps their consumption without running ahead of it.
+    Exceptions raised by ``items`` are re-raised to the consumer. Closing
+    the iterator early stops the thread and closes ``items``.
+
+    Args:
+        items (Iterable): The items, consumed on the background thread.
+        depth (int): The largest number of items produced ahead.
+
+    Returns:
+        Iterator: The items, in order.
+    """
+    if depth < 1:
+        raise ValueError("depth must be at least 1")
+    queue: Queue = Queue(maxsize=depth)
+    stop = threading.Event()
+    end = object()
+
+    def produce():
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                queue.put((item, None))
+                if stop.is_set():
+                    return
+            queue.put((end, None))
+        except BaseException as exc:
+            queue.put((end, exc))
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, name='prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = queue.get()
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        # Make room for the item the producer may be blocked on; it stops
+        # after putting it.
+        while not queue.empty():
+            queue.get_nowait()
+        thread.join()
+
+
+def process_frames(frames: Iterable[Frame], steps: List[Tuple[IBase, IParams]],
+                   precision: str = DEFAULT_PRECISION, fuse_linear: Optional[bool] = None,
+                   depth: int = DEFAULT_PREFETCH) -> Iterator[Frame]:
+    """Run the same steps on every frame, one frame at a time.
+
+    The next ``depth`` frames are decoded in the background while a frame
+    is processed (see ``prefetch``); with ``depth`` 0 they are decoded in
+    between. Nothing is cached, so about ``depth + 2`` frames are held at
+    once however long the animation is, as long as the caller does not
+    keep the results.
+
+    Args:
+        frames (Iterable[Frame]): The frames, e.g. a ``FrameSource``.
+        steps (List[Tuple[IBase, IParams]]): The steps to run.
+        precision (str): The working precision.
+        fuse_linear (bool): Passed on to ``ImagePipeline``.
+        depth (int): The number of frames decoded ahead.
+
+    Returns:
+        Iterator[Frame]: The processed frames, with their durations.
+    """
+    for frame in prefetch(frames, depth) if depth else frames:
+        pipeline = ImagePipeline(frame.image, precision, StepCache(0), fuse_linear)
+        for filter, params in steps:
+            pipeline.add_step(filter, params)
+        yield frame._replace(image=ImageBuffer.from_array(pipeline.execute(), frame.image.colorspace))
+
+
+def _gif_frame(image: ImageBuffer) -> Any:
+    """Quantize a frame to a palette image of its own 256 colors (255 and a
+    transparent one if it has alpha).
+    """
+    from PIL import Image
+    color, alpha = image.layout.split(saturate(image.pixels, np.uint8))
+    colors = 256 if alpha is None else 255
+    frame = Image.fromarray(np.ascontiguousarray(color)).convert('P', palette=Image.Palette.ADAPTIVE, colors=colors)
+    if alpha is not None:
+        frame.paste(colors, mask=Image.fromarray(np.ascontiguousarray(alpha < GIF_ALPHA_THRESHOLD)))
+        frame.info['transparency'] = colors
+    return frame
+
+
+class FrameWriter:
+    """Encodes frames one at a time into an animated GIF or a multi-page TIFF.
+
+    Every frame is written as soon as it is given, so only the frame being
+    encoded is held. GIF frames get a palette of their own. TIFF pages link
+    back to the previous ones, so TIFF files must be seekable and readable.
+    """
+    def __init__(self, file: Any, format: Optional[str] = None, loop: Optional[int] = 0):
+        """Start a file.
+
+        Args:
+            file (str | file object): A path, or a binary file object.
+            format (str): 'GIF' or 'TIFF'; by default taken from the path.
+            loop (int): How many times a GIF repeats, 0 forever and None once.
+
+        Raises:
+            ValueError: For other formats.
+        """
+        self.__owns_file = isinstance(file, (str, os.PathLike))
+        format = (format or frame_format(os.fspath(file) if self.__owns_file else '') or '').upper()
+        if format not in FRAME_FORMATS.values():
+            raise ValueError(f"cannot write frames as {format or 'an unknown format'!r}, "
+                             f"expected one of {', '.join(sorted(set(FRAME_FORMATS.values())))}")
+        self.__file = open(file, 'w+b') if self.__owns_file else file
+        self.__format = format
+        self.__loop = loop
+        self.__frames = 0
+        self.__closed = False
+        self.__tiff = None
+        if format == 'TIFF':
+            from PIL import TiffImagePlugin
+            self.__tiff = TiffImagePlugin.AppendingTiffWriter(self.__file, new=True)
+
+    def write(self, frame: Frame):
+        """Encode the next frame."""
+        if self.__closed:
+            raise ValueError("the frame writer is closed")
+        if self.__tiff is not None:
+            frame.image.to_pil().save(self.__tiff, format='TIFF')
+            self.__tiff.newFrame()
+        else:
+            self.__write_gif(frame)
+        self.__frames += 1
+
+    def close(self):
+        """Finish the file (and close it if it was opened from a path)."""
+        if self.__closed:
+            return
+        self.__closed = True
+        if self.__tiff is None and self.__frames:
+            self.__file.write(b';')
+        if self.__owns_file:
+            self.__file.close()
+
+    @property
+    def frames(self) -> int:
+        """The number of frames written."""
+        return self.__frames
+
+    def __enter__(self) -> 'FrameWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __write_gif(self, frame: Frame):
+        from PIL import GifImagePlugin
+        image = _gif_frame(frame.image)
+        params = {'include_color_table': True}
+        if frame.duration is not None:
+            params['duration'] = frame.duration
+        if 'transparency' in image.info:
+            # Clear transparent frames before the next one instead of drawing over them.
+            params.update(transparency=image.info['transparency'], disposal=2)
+        if not self.__frames:
+            info = dict(params)
+            if self.__loop is not None:
+                info['loop'] = self.__loop
+            header, _ = GifImagePlugin.getheader(image, info=info)
+            for chunk in header:
+                self.__file.write(chunk)
+        chunks = GifImagePlugin.getdata(image, (0, 0), **params)
+        for chunk in chunks:
+            self.__file.write(chunk)
+        # The list belongs to a class getdata defines on every call, which
+        # only the cyclic garbage collector frees; empty it now.
+        chunks.clear()
+
+
+def save_frames(frames: Iterable[Frame], file: Any, format: Optional[str] = None,
+                loop: Optional[int] = 0) -> int:
+    """Write frames to a file as they come (see ``FrameWriter``).
+
+    Returns:
+        int: The number of frames written.
+    """
+    with FrameWriter(file, format, loop) as writer:
+        for frame in frames:
+            writer.write(frame)
+        return writer.frames
+
+
+def _take(buffer: io.BytesIO) -> bytes:
+    """Return what was written to ``buffer`` and empty it."""
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def encode_frames(frames: Iterable[Frame], format: str, loop: Optional[int] = 0) -> Iterator[bytes]:
+    """Encode frames as they come and yield the encoded bytes, e.g. to stream a response.
+
+    GIF data is yielded after every frame. TIFF pages link back to earlier
+    ones, so they go to a temporary file that is read back at the end;
+    either way only a frame at a time is held in memory.
+
+    Args:
+        frames (Iterable[Frame]): The frames, e.g. from ``process_frames``.
+        format (str): 'GIF' or 'TIFF'.
+        loop (int): How many times a GIF repeats, 0 forever and None once.
+
+    Returns:
+        Iterator[bytes]: Consecutive chunks of the file.
+    """
+    if format.upper() == 'TIFF':
+        with tempfile.TemporaryFile() as file:
+            save_frames(frames, file, format, loop)
+            file.seek(0)
+            yield from iter(lambda: file.read(CHUNK_SIZE), b'')
+        return
+    buffer = io.BytesIO()
+    with FrameWriter(buffer, format, loop) as writer:
+        for frame in frames:
+            writer.write(frame)
+            yield _take(buffer)
+    yield _take(buffer)
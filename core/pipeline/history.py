@@ -0,0 +1,201 @@
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+from interfaces.IBase import IBase
+from interfaces.IParams import IParams
+from pipeline.image_pipeline import ImagePipeline
+from pipeline.precision import DEFAULT_PRECISION, saturate
+from pipeline.step_cache import StepCache
+
+DEFAULT_HISTORY_BYTES = 256 * 2**20
+# Longest side of the thumbnail kept for every state.
+THUMBNAIL_SIZE = 96
+
+
+class HistoryEntry(NamedTuple):
+    """One applied step, with what it cost and what it produced."""
+    filter: IBase
+    params: IParams
+    cost: float
+    thumbnail: np.array
+
+
+def make_thumbnail(img: np.array, size: int = THUMBNAIL_SIZE) -> np.array:
+    """Return a small uint8 copy of ``img`` by taking every n-th pixel.
+
+    Striding is much cheaper than resampling and good enough for a strip of
+    previews; the result is copied so it does not keep ``img`` alive.
+    """
+    stride = max(1, -(-max(img.shape[:2]) // size))
+    return saturate(np.array(img[::stride, ::stride]), np.uint8)
+
+
+class EditHistory:
+    """Undo/redo history of an image, backed by the list of applied steps.
+
+    Every state is defined by the original image and the steps leading to
+    it. Full images are kept only as checkpoints: the original, the current
+    state and as many others as fit into ``max_bytes``. When the budget is
+    exceeded, the checkpoint whose removal adds the least replay time
+    (measured when its steps were first applied) is dropped, so expensive
+    steps keep their results and runs of cheap ones are merged. Any other
+    state is rebuilt by replaying the steps from the nearest earlier
+    checkpoint; states reached that way become checkpoints themselves.
+
+    Steps are replayed one by one, without fusing convolutions, so a
+    rebuilt state is identical to the one first computed.
+    """
+    def __init__(self, img: np.array, max_bytes: int = DEFAULT_HISTORY_BYTES,
+                 precision: str = DEFAULT_PRECISION):
+        """Start a history whose first state is ``img``.
+
+        Args:
+            img (np.array): The original image. It must not be modified.
+            max_bytes (int): Budget for checkpoints other than the original
+                and the current state.
+            precision (str): The working precision of the steps.
+        """
+        if max_bytes < 0:
+            raise ValueError("max_bytes must not be negative")
+        self.__max_bytes = max_bytes
+        self.__precision = precision
+        self.__entries: List[HistoryEntry] = []
+        self.__checkpoints: Dict[int, np.array] = {0: img}
+        self.__thumbnail = make_thumbnail(img)
+        self.__cursor = 0
+        self.__lock = threading.RLock()
+
+    def push(self, filter: IBase, params: IParams, result: Optional[np.array] = None,
+             cost: Optional[float] = None) -> np.array:
+        """Apply a step to the current state and make the result current.
+
+        Steps that had been undone are discarded.
+
+        Args:
+            filter (IBase): The filter to be applied.
+            params (IParams): The parameters for the filter.
+            result (np.array): The step's output, if it was computed
+                elsewhere (e.g. by a background job).
+            cost (float): Seconds it took to compute ``result``.
+
+        Returns:
+            np.array: The new current image.
+        """
+        with self.__lock:
+            if result is None:
+                start = time.perf_counter()
+                result = self.__replay(self.__checkpoints[self.__cursor], [(filter, params)])
+                cost = time.perf_counter() - start
+            else:
+                result.setflags(write=False)
+            del self.__entries[self.__cursor:]
+            for index in [index for index in self.__checkpoints if index > self.__cursor]:
+                del self.__checkpoints[index]
+            self.__entries.append(HistoryEntry(filter, params, cost or 0.0, make_thumbnail(result)))
+            self.__cursor += 1
+            self.__checkpoints[self.__cursor] = result
+            self.__enforce_budget()
+            return result
+
+    def undo(self) -> np.array:
+        """Step back one state, if possible, and return the current image."""
+        with self.__lock:
+            return self.goto(max(self.__cursor - 1, 0))
+
+    def redo(self) -> np.array:
+        """Step forward one state, if possible, and return the current image."""
+        with self.__lock:
+            return self.goto(min(self.__cursor + 1, len(self.__entries)))
+
+    def goto(self, index: int) -> np.array:
+        """Make the state after ``index`` steps current and return its image.
+
+        Args:
+            index (int): The state, from 0 (the original) to ``len(self)``.
+
+        Returns:
+            np.array: The image of that state.
+        """
+        with self.__lock:
+            if not 0 <= index <= len(self.__entries):
+                raise IndexError(f"history state {index} out of range")
+            if index not in self.__checkpoints:
+                base = max(checkpoint for checkpoint in self.__checkpoints if checkpoint < index)
+                steps = [(entry.filter, entry.params) for entry in self.__entries[base:index]]
+                self.__checkpoints[index] = self.__replay(self.__checkpoints[base], steps)
+            self.__cursor = index
+            self.__enforce_budget()
+            return self.__checkpoints[index]
+
+    @property
+    def current(self) -> np.array:
+        """The image of the current state."""
+        return self.__checkpoints[self.__cursor]
+
+    @property
+    def cursor(self) -> int:
+        """The number of steps applied to reach the current state."""
+        return self.__cursor
+
+    @property
+    def can_undo(self) -> bool:
+        return self.__cursor > 0
+
+    @property
+    def can_redo(self) -> bool:
+        return self.__cursor < len(self.__entries)
+
+    @property
+    def steps(self) -> List[Tuple[IBase, IParams]]:
+        """All recorded steps, including undone ones."""
+        return [(entry.filter, entry.params) for entry in self.__entries]
+
+    @property
+    def applied_steps(self) -> List[Tuple[IBase, IParams]]:
+        """The steps leading to the current state."""
+        with self.__lock:
+            return [(entry.filter, entry.params) for entry in self.__entries[:self.__cursor]]
+
+    @property
+    def thumbnails(self) -> List[np.array]:
+        """A small image of every state, starting with the original."""
+        return [self.__thumbnail] + [entry.thumbnail for entry in self.__entries]
+
+    @property
+    def checkpoints(self) -> List[int]:
+        """The states whose full image is kept, in order."""
+        return sorted(self.__checkpoints)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the kept images, excluding the original."""
+        return sum(img.nbytes for index, img in self.__checkpoints.items() if index) + \
+            sum(entry.thumbnail.nbytes for entry in self.__entries)
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __replay(self, img: np.array, steps: List[Tuple[IBase, IParams]]) -> np.array:
+        pipeline = ImagePipeline(img, self.__precision, StepCache(0), fuse_linear=False)
+        for filter, params in steps:
+            pipeline.add_step(filter, params)
+        result = pipeline.execute()
+        result.setflags(write=False)
+        return result
+
+    def __enforce_budget(self):
+        """Drop the cheapest-to-rebuild checkpoints until they fit the budget."""
+        while True:
+            removable = [index for index in sorted(self.__checkpoints) if index not in (0, self.__cursor)]
+            size = sum(self.__checkpoints[index].nbytes for index in removable)
+            if not removable or size <= self.__max_bytes:
+                return
+            self.__checkpoints.pop(min(removable, key=self.__removal_cost))
+
+    def __removal_cost(self, index: int) -> float:
+        """Replay time of the longest chain that would have to start before ``index``."""
+        indices = sorted(self.__checkpoints)
+        position = indices.index(index)
+        end = indices[position + 1] if position + 1 < len(indices) else len(self.__entries)
+        return sum(entry.cost for entry in self.__entries[indices[position - 1]:end])
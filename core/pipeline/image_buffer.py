@@ -0,0 +1,217 @@
+from enum import Enum
+from typing import Any, NamedTuple, Optional, Tuple
+import numpy as np
+from pipeline.precision import saturate
+
+# Colorspace of decoded images. Operators keep the colorspace of their input.
+DEFAULT_COLORSPACE = 'sRGB'
+# PIL modes decoded as (or converted to) one of the layouts; see ImageBuffer.from_pil.
+_PIL_MODES = {'L': 'L', 'LA': 'LA', 'RGB': 'RGB', 'RGBA': 'RGBA', '1': 'L', 'La': 'LA', 'RGBa': 'RGBA'}
+
+
+def spatial_axes(img: np.array) -> Tuple[int, int]:
+    """The row and column axes of an image, or of a batch of images.
+
+    Batches are 4-D, ``(images, rows, columns, channels)``, with one
+    channel for gray images; single images are 2-D or 3-D.
+    """
+    return (1, 2) if img.ndim == 4 else (0, 1)
+
+
+class ChannelLayout(Enum):
+    """The channels of an image, named like the matching PIL modes.
+
+    Gray images are 2-D arrays; the others have the channels on the last
+    axis, with alpha last. In batches (see ``spatial_axes``) every layout
+    has the channel axis, gray ones with a single channel.
+    """
+    GRAY = 'L'
+    GRAY_ALPHA = 'LA'
+    RGB = 'RGB'
+    RGBA = 'RGBA'
+
+    @property
+    def color_channels(self) -> int:
+        return 1 if self.value.startswith('L') else 3
+
+    @property
+    def has_alpha(self) -> bool:
+        return self.value.endswith('A')
+
+    @property
+    def channels(self) -> int:
+        return self.color_channels + self.has_alpha
+
+    @classmethod
+    def of(cls, color_channels: int, alpha: bool = False) -> 'ChannelLayout':
+        """The layout with ``color_channels`` (1 or 3) color channels, and alpha if ``alpha``."""
+        if color_channels not in (1, 3):
+            raise ValueError(f"unsupported number of color channels: {color_channels}")
+        return cls(('L' if color_channels == 1 else 'RGB') + ('A' if alpha else ''))
+
+    @classmethod
+    def from_shape(cls, shape: Tuple[int, ...]) -> 'ChannelLayout':
+        """The layout of an array of ``shape``: 2-D or one channel is gray,
+        two channels gray with alpha, three RGB and four RGBA. 4-D shapes
+        are batches, with the channels on the last axis.
+        """
+        if len(shape) == 4:
+            shape = shape[1:]
+        if len(shape) == 2:
+            return cls.GRAY
+        if len(shape) != 3 or not 1 <= shape[2] <= 4:
+            raise ValueError(f"unsupported image shape {shape}")
+        return (cls.GRAY, cls.GRAY_ALPHA, cls.RGB, cls.RGBA)[shape[2] - 1]
+
+    def with_color_channels(self, color_channels: int) -> 'ChannelLayout':
+        """The same layout, alpha included, with another number of color channels."""
+        return ChannelLayout.of(color_channels, self.has_alpha)
+
+    def shape(self, height: int, width: int, batch: Optional[int] = None) -> Tuple[int, ...]:
+        """The array shape of an image of this layout, or of a batch of ``batch`` images."""
+        if batch is not None:
+            return (batch, height, width, self.channels)
+        return (height, width) if self is ChannelLayout.GRAY else (height, width, self.channels)
+
+    def split(self, pixels: np.array) -> Tuple[np.array, Optional[np.array]]:
+        """Return views of the color channels (2-D for gray) and of the alpha channel, if any.
+
+        The color channels of a batch keep the channel axis, gray or not.
+        """
+        if not self.has_alpha:
+            return pixels, None
+        color = pixels[..., 0] if self.color_channels == 1 and pixels.ndim == 3 else pixels[..., :-1]
+        return color, pixels[..., -1]
+
+    def merge(self, color: np.array, alpha: Optional[np.array], out: Optional[np.array] = None) -> np.array:
+        """Put color channels and alpha back together, the inverse of ``split``.
+
+        Without alpha ``color`` itself is returned (or copied into ``out``).
+        Color already written into ``out`` (e.g. its ``split`` view) is not
+        copied again. Alpha is converted to the dtype of ``color``.
+        """
+        if out is None and not self.has_alpha:
+            return color
+        if out is None:
+            out = np.empty(color.shape[:spatial_axes(color)[1] + 1] + (self.channels,), dtype=color.dtype)
+        if not np.may_share_memory(color, out):
+            self.split(out)[0][...] = color
+        if not self.has_alpha:
+            return out
+        saturate(alpha, out.dtype, out=out[..., -1])
+        return out
+
+
+class ImageBuffer(NamedTuple):
+    """Pixels together with their channel layout and colorspace.
+
+    ``ImagePipeline`` runs its steps on the color channels only, with
+    gray images kept as one 2-D channel, and passes alpha through
+    untouched. Gray images are only expanded to RGB by ``to_rgb``, for
+    consumers that need three channels; encoders take them as they are.
+    """
+    pixels: np.array
+    layout: ChannelLayout
+    colorspace: str = DEFAULT_COLORSPACE
+
+    @classmethod
+    def from_array(cls, pixels: Any, colorspace: str = DEFAULT_COLORSPACE) -> 'ImageBuffer':
+        """Wrap an array, or return an ``ImageBuffer`` as is.
+
+        The layout follows from the shape (see ``ChannelLayout.from_shape``);
+        a single channel on the last axis of an image is dropped, without a
+        copy. 4-D arrays are batches of images (see ``spatial_axes``).
+        """
+        if isinstance(pixels, ImageBuffer):
+            return pixels
+        layout = ChannelLayout.from_shape(pixels.shape)
+        if pixels.ndim == 3 and layout is ChannelLayout.GRAY:
+            pixels = pixels[..., 0]
+        return cls(pixels, layout, colorspace)
+
+    @classmethod
+    def from_pil(cls, image: Any) -> 'ImageBuffer':
+        """Convert a PIL image, keeping gray images gray and keeping alpha.
+
+        Palette images become RGBA if they have a transparent color and RGB
+        otherwise, integer and float images become 8-bit gray and other
+        modes (CMYK, YCbCr...) are converted to RGB.
+        """
+        mode = _PIL_MODES.get(image.mode)
+        if mode is None and image.mode[0] in 'IF':
+            mode = 'L'
+        elif mode is None:
+            mode = 'RGBA' if image.mode == 'P' and 'transparency' in image.info else 'RGB'
+        if image.mode != mode:
+            image = image.convert(mode)
+        return cls(np.asarray(image), ChannelLayout(mode))
+
+    @classmethod
+    def open(cls, file: Any) -> 'ImageBuffer':
+        """Decode an image file (a path or a file object)."""
+        from PIL import Image
+        with Image.open(file) as image:
+            return cls.from_pil(image)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.pixels.dtype
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.pixels.shape
+
+    @property
+    def is_batch(self) -> bool:
+        return self.pixels.ndim == 4
+
+    @property
+    def color(self) -> np.array:
+        """The color channels, as a view (2-D for gray images)."""
+        return self.layout.split(self.pixels)[0]
+
+    @property
+    def alpha(self) -> Optional[np.array]:
+        """The alpha channel, as a view, or None."""
+        return self.layout.split(self.pixels)[1]
+
+    def with_color(self, color: np.array) -> 'ImageBuffer':
+        """A buffer of new color channels (2-D for gray) with this buffer's alpha."""
+        layout = self.layout.with_color_channels(1 if color.ndim == 2 else color.shape[2])
+        return self._replace(pixels=layout.merge(color, self.alpha), layout=layout)
+
+    def to_rgb(self) -> 'ImageBuffer':
+        """Expand a gray image to three channels (RGB or RGBA); color images are returned as is.
+
+        Without alpha the channels are read-only broadcast views of the gray
+        plane, so nothing is copied.
+        """
+        if self.layout.color_channels == 3:
+            return self
+        color = self.color
+        rgb = np.broadcast_to(color[:, :, np.newaxis], color.shape + (3,))
+        if not self.layout.has_alpha:
+            return self._replace(pixels=rgb, layout=ChannelLayout.RGB)
+        return self._replace(pixels=ChannelLayout.RGBA.merge(rgb, self.alpha), layout=ChannelLayout.RGBA)
+
+    def to_pil(self) -> Any:
+        """Convert to a PIL image of the matching mode, saturating to uint8."""
+        from PIL import Image
+        # PIL picks the mode from the shape: L, LA, RGB or RGBA.
+        return Image.fromarray(np.ascontiguousarray(saturate(self.pixels, np.uint8)))
+
+    def save(self, file: Any, format: Optional[str] = None):
+        """Encode the image, e.g. as PNG, which stores every layout as it is.
+
+        Formats without alpha (such as JPEG) get the color channels only.
+        """
+        image = self.to_pil()
+        try:
+            image.save(file, format=format)
+        except OSError:
+            if not self.layout.has_alpha:
+                raise
+            if hasattr(file, 'seek'):
+                file.seek(0)
+                file.truncate()
+            image.convert(self.layout.value[:-1]).save(file, format=format)
@@ -1,15 +1,77 @@
 import sys
 import os
-from typing import List, Tuple
+import threading
+from typing import Callable, List, NamedTuple, Optional, Tuple, Union
 import numpy as np
 from interfaces.IBase import IBase
 from interfaces.IParams import IParams
+from pipeline.precision import DEFAULT_PRECISION, get_dtype, saturate
+from pipeline.image_buffer import ChannelLayout, ImageBuffer
+from pipeline.step_cache import StepCache, chain_key, fingerprint_image
+from pipeline.pyramid import ImagePyramid
+from pipeline.tiling import DEFAULT_TILE_SIZE, Tile, plan_tiles
+from pipeline.parallel import ParallelExecutor
+from pipeline.instrumentation import PipelineRun, begin_run
+from convolutions.base_convolution import spatial_backends
+from convolutions.fused import FusedConvolution, FusedParams
+from filters.base_filter import apply_lut
+
+class _Stage(NamedTuple):
+    """One unit of execution: a single step, or a fused run of point or linear steps."""
+    steps: List[Tuple[IBase, IParams]]
+    lut: Optional[np.ndarray]
+    key: Optional[str]
+    plan: Optional[object] = None
+    fused: Optional[FusedParams] = None
 
 class ImagePipeline:
-    def __init__(self,img: np.array):
-        """Initialize the ImagePipeline with an empty list of steps."""
+    def __init__(self,img: Union[np.array, ImageBuffer], precision: str = DEFAULT_PRECISION,
+                 cache: Optional[StepCache] = None, fuse_linear: Optional[bool] = None,
+                 allow_fft: bool = False):
+        """Initialize the ImagePipeline with an empty list of steps.
+
+        Steps only see the color channels, as a 2-D array for gray images:
+        a gray image stays one channel all the way through, and alpha is
+        passed through to the output untouched.
+
+        Args:
+            img (np.array | ImageBuffer): The input image, with values in
+                [0, 255]. Arrays are gray, gray and alpha, RGB or RGBA by
+                their shape (see ``ChannelLayout.from_shape``). It must
+                not be modified while the pipeline is in use. It may be an
+                ``np.memmap``, which ``execute_tiled`` reads tile by tile.
+                A 4-D array is a batch of same-sized images, processed
+                together by every step (see ``batching.execute_batches``
+                for grouping images into batches).
+            precision (str): The working precision, 'uint8' (rounded and
+                saturated after every step), 'float32' or 'float64'.
+            cache (StepCache): Cache for intermediate results, which may be
+                shared between pipelines. A private one is created if omitted;
+                pass ``StepCache(0)`` to disable caching.
+            fuse_linear (bool): Whether adjacent convolutions are run as one
+                convolution with the composed kernel. In float precisions the
+                results then differ only by floating-point rounding. In uint8
+                the rounding between the steps is skipped, and later kernels
+                with a gain above one (sharpening) amplify the difference,
+                so results can differ by several levels. By default (None)
+                only float pipelines fuse.
+            allow_fft (bool): Whether convolutions may pick the FFT backend
+                when the cost model prefers it. Its rounding depends on the
+                image extent, so results then differ slightly from
+                ``execute_tiled`` (which never uses it) and from pipelines
+                without it. Off by default, so that a pipeline gives the
+                same pixels however it is run (see ``spatial_backends``).
+        """
         self.__steps: List[Tuple[IBase, IParams]] = []
-        self.__img = img
+        self.__dtype = get_dtype(precision)
+        self.__precision = precision
+        self.__source = ImageBuffer.from_array(img)
+        self.__img = None
+        self.__cache = cache if cache is not None else StepCache()
+        self.__fuse_linear = fuse_linear if fuse_linear is not None else self.__dtype != np.uint8
+        self.__allow_fft = allow_fft
+        self.__fingerprint = None
+        self.__buffers = threading.local()
         
     def add_step(self, filter: IBase, params: IParams):
         """Add a filter step to the pipeline with validation.
@@ -18,30 +80,404 @@ class ImagePipeline:
             filter (IBase): The filter to be applied.
             params (IParams): The parameters for the filter.
         """
-        if not isinstance(filter, IBase):
-            raise TypeError("filter must be an instance of IBase")
-        if not isinstance(params, IParams):
-            raise TypeError("params must be an instance of IParams")
+        self.__check_step(filter, params)
         self.__steps.append((filter, params))
+
+    def insert_step(self, index: int, filter: IBase, params: IParams):
+        """Insert a filter step before the given position.
+
+        Args:
+            index (int): The position of the new step.
+            filter (IBase): The filter to be applied.
+            params (IParams): The parameters for the filter.
+        """
+        self.__check_step(filter, params)
+        self.__steps.insert(index, (filter, params))
+
+    def set_step(self, index: int, filter: IBase, params: IParams):
+        """Replace the filter step at the given position.
+
+        Args:
+            index (int): The position of the step.
+            filter (IBase): The filter to be applied.
+            params (IParams): The parameters for the filter.
+        """
+        self.__check_step(filter, params)
+        self.__steps[index] = (filter, params)
+
+    def remove_step(self, index: int):
+        """Remove the filter step at the given position.
+
+        Args:
+            index (int): The position of the step.
+        """
+        del self.__steps[index]
         
-    def execute(self) -> np.array:
+    def execute(self, out: Optional[np.array] = None) -> np.array:
         """Execute the pipeline on the given image.
+
+        Runs of adjacent point operators are composed into a single lookup
+        table and applied in one pass over uint8 images. The output of every
+        stage is memoized under the input fingerprint plus the chain of
+        (operator, params) leading to it, so after editing, inserting or
+        removing step k only steps k onward are recomputed.
+
+        Without caching (``StepCache(0)``) no stage result is kept, so the
+        stages write into two alternating buffers instead of new arrays:
+        ``out`` and a working buffer the pipeline keeps for later runs (see
+        ``__plan_buffers``). Repeated runs into the same ``out`` then
+        allocate nothing but the temporaries inside operators.
+
+        Hooks registered with ``instrumentation.register_hook`` or
+        ``instrumentation.instrument`` are told about the run and every stage.
         
         Args:
-            img (np.array): The input image.
+            out (np.array): Array to write the result into. Must match
+                ``get_output_shape`` and the working dtype, and must not
+                share memory with the input. A new array is allocated if
+                omitted (and, with caching, the result may be a read-only
+                cached array).
         
         Returns:
-            np.array: The processed image.
+            np.array: The processed image, in the working precision dtype,
+                with the channels of ``get_output_layout`` (``out`` if given).
         """
-        img=self.__img
-        for filter, params in self.__steps:
-            img = filter.apply(img, params)
-        return img
+        layout = self.get_output_layout()
+        if out is not None:
+            self.__check_out(out)
+        run = begin_run('execute', self.__steps, self.__source.shape, self.__dtype)
+        img=self.__get_img()
+        if not self.__cache.enabled:
+            if out is None:
+                out = np.empty(self.get_output_shape(), dtype=self.__dtype)
+            img = self.__run_stages(img, self.__plan_stages(keyed=False), run=run, out=layout.split(out)[0])
+            start = 0
+        else:
+            stages = self.__plan_stages()
+            start = 0
+            for index in range(len(stages) - 1, -1, -1):
+                cached = self.__cache.get(stages[index].key)
+                if cached is not None:
+                    img, start = cached, index + 1
+                    break
+            img = self.__run_stages(img, stages[start:], cache=True, run=run, first=start)
+        if run is not None:
+            run.finish(cached_stages=start)
+        return layout.merge(img, self.__source.alpha, out=out)
     
+    def execute_tiled(self, tile_size: int = DEFAULT_TILE_SIZE, out: Optional[np.array] = None,
+                      executor: Optional[ParallelExecutor] = None,
+                      progress: Optional[Callable[[int, int], None]] = None) -> np.array:
+        """Execute the pipeline tile by tile, with bounded memory.
+
+        Every tile is read with a halo equal to the summed footprint of all
+        steps, processed through the whole chain and cropped back, so the
+        result is identical to ``execute``, whatever the tile size.
+        Convolutions stay on the spatial backends even with ``allow_fft``,
+        whose results would depend on the tiling. Only one tile and its temporaries
+        are in memory at a time, which together with memory-mapped input and
+        ``out`` arrays (see ``tiling.open_memmap``) bounds peak memory by the
+        tile size rather than the image size. Intermediate results are not
+        cached.
+
+        With an ``executor`` tiles are processed concurrently on its threads;
+        tiles write to disjoint parts of ``out``, and peak memory grows with
+        the number of workers rather than the image size.
+
+        Args:
+            tile_size (int): The side of a tile, in pixels.
+            out (np.array): Array to write the result into, e.g. an
+                ``np.memmap``. Must match ``get_output_shape`` and the
+                working dtype.
+                A new in-memory array is allocated if omitted.
+            executor (ParallelExecutor): Thread pool to spread tiles over.
+                Tiles run one after another in this thread if omitted.
+            progress (Callable[[int, int], None]): Called with the number of
+                finished tiles and the total after every tile, one call at
+                a time.
+
+        Returns:
+            np.array: The processed image (``out`` if given).
+
+        Raises:
+            ValueError: For batches, which are not split into tiles.
+        """
+        source = self.__source
+        if source.is_batch:
+            raise ValueError("execute_tiled does not support batches of images")
+        if out is None:
+            out = np.empty(self.get_output_shape(), dtype=self.__dtype)
+        else:
+            self.__check_out(out)
+        stages = self.__plan_stages(keyed=False)
+        halo = self.get_halo()
+        tiles = plan_tiles(source.shape, tile_size, halo)
+        run = begin_run('execute_tiled', self.__steps, source.shape, self.__dtype, tiles=len(tiles))
+        layout = self.get_output_layout()
+        run_tile = lambda tile: self._run_tile(stages, tile, out, layout, run)
+        if progress is not None:
+            run_tile = self.__report_progress(run_tile, len(tiles), progress)
+        if executor is None:
+            for tile in tiles:
+                run_tile(tile)
+        else:
+            executor.map(run_tile, tiles)
+        if isinstance(out, np.memmap):
+            out.flush()
+        if run is not None:
+            run.finish()
+        return out
+
+    def get_halo(self) -> int:
+        """Get the accumulated footprint of all steps, in pixels.
+
+        Raises:
+            ValueError: If a step cannot be tiled.
+        """
+        halo = 0
+        for filter, params in self.__steps:
+            footprint = filter.get_footprint(params)
+            if footprint is None:
+                raise ValueError(f"{type(filter).__name__} does not support tiled execution")
+            halo += footprint
+        return halo
+
+    @staticmethod
+    def __report_progress(run_tile: Callable[[Tile], None], total: int,
+                          progress: Callable[[int, int], None]) -> Callable[[Tile], None]:
+        """Wrap ``run_tile`` so that ``progress`` is called after every tile."""
+        lock = threading.Lock()
+        done = [0]
+
+        def run_and_report(tile: Tile):
+            run_tile(tile)
+            with lock:
+                done[0] += 1
+                progress(done[0], total)
+        return run_and_report
+
+    def _run_tile(self, stages: List[_Stage], tile: Tile, out: np.array, layout: ChannelLayout,
+                  run: Optional[PipelineRun] = None):
+        """Process one tile with its halo and write the cropped result, and alpha, to ``out``."""
+        color, alpha = self.__source.color, self.__source.alpha
+        img = saturate(np.asarray(color[tile.src_rows, tile.src_cols]), self.__dtype)
+        img = self.__run_stages(img, stages, run=run, tile=tile)
+        if alpha is not None:
+            alpha = np.asarray(alpha[tile.rows, tile.cols])
+        layout.merge(img[tile.crop], alpha, out=out[tile.rows, tile.cols])
+
+    def preview(self, pyramid: ImagePyramid, width: int) -> np.array:
+        """Execute the pipeline on a reduced copy of the image for display.
+
+        The pyramid level closest to ``width`` (and not narrower) is used,
+        with every step's parameters scaled to that level.
+
+        Args:
+            pyramid (ImagePyramid): The pyramid of this pipeline's input image.
+            width (int): The display width, in device pixels.
+
+        Returns:
+            np.array: The processed reduced image.
+        """
+        level, scale = pyramid.level_for(width)
+        if scale == 1.0:
+            return self.execute()
+        # Previews are only displayed, so they may fuse steps and take the FFT where it is faster.
+        proxy = ImagePipeline(ImageBuffer.from_array(level, self.__source.colorspace), self.__precision, self.__cache,
+                              fuse_linear=True, allow_fft=True)
+        for filter, params in self.__steps:
+            proxy.add_step(filter, params.scaled(scale))
+        return proxy.execute()
+
     def clear(self):
         """Clear all steps from the pipeline."""
         self.__steps = []
 
     def get_steps(self):
         """Get the list of steps in the pipeline."""
-        return self.__steps
\ No newline at end of file
+        return self.__steps
+
+    def get_precision(self) -> str:
+        """Get the working precision of the pipeline."""
+        return self.__precision
+
+    def get_cache(self) -> StepCache:
+        """Get the cache of intermediate results."""
+        return self.__cache
+
+    def get_output_layout(self) -> ChannelLayout:
+        """Get the channel layout of the result: the input's, with as many
+        color channels as the last step outputs, and the input's alpha.
+        """
+        channels = self.__source.layout.color_channels
+        for filter, params in self.__steps:
+            channels = filter.get_output_channels(params, channels)
+        return self.__source.layout.with_color_channels(channels)
+
+    def get_output_shape(self) -> Tuple[int, ...]:
+        """Get the shape of the result."""
+        shape = self.__source.shape
+        if self.__source.is_batch:
+            return self.get_output_layout().shape(*shape[1:3], batch=shape[0])
+        return self.get_output_layout().shape(*shape[:2])
+
+    def __get_img(self) -> np.array:
+        """Get the input's color channels converted to the working precision."""
+        if self.__img is None:
+            self.__img = saturate(np.asarray(self.__source.color), self.__dtype)
+        return self.__img
+
+    def __run_stages(self, img: np.array, stages: List[_Stage], cache: bool = False,
+                     run: Optional[PipelineRun] = None, first: int = 0, tile: Optional[Tile] = None,
+                     out: Optional[np.array] = None) -> np.array:
+        """Run stages in order, optionally memoizing their outputs.
+
+        Memoized outputs are new arrays. Otherwise the stages write into
+        reused buffers, the last one into ``out`` if given.
+
+        Stages are reported to ``run``, numbered from ``first``, if given.
+        """
+        targets = [None] * len(stages) if cache else self.__plan_buffers(img, stages, out)
+        # Tiles may run on other threads, so the backend restriction is set here.
+        with spatial_backends(tile is not None or not self.__allow_fft):
+            for index, (stage, target) in enumerate(zip(stages, targets), start=first):
+                if run is None:
+                    img = self.__run_stage(stage, img, target)
+                else:
+                    img = run.step(index, stage.steps, img,
+                                   lambda img, stage=stage, target=target: self.__run_stage(stage, img, target),
+                                   tile, out=target)
+                if cache:
+                    self.__cache.put(stage.key, img)
+        return img
+
+    @staticmethod
+    def __run_stage(stage: _Stage, img: np.array, out: Optional[np.array] = None) -> np.array:
+        if stage.lut is not None:
+            return apply_lut(stage.lut, img, out)
+        if stage.fused is not None:
+            return FusedConvolution.apply(img, stage.fused, out=out)
+        filter, params = stage.steps[0]
+        if out is None:
+            return filter.apply(img, params)
+        return filter.apply(img, params, out=out)
+
+    @staticmethod
+    def __stage_capabilities(stage: _Stage) -> Tuple[bool, bool]:
+        """Whether a stage can write into an ``out`` array, and whether that may be its input."""
+        if stage.lut is not None:
+            return True, True
+        if stage.fused is not None:
+            return True, False
+        filter, params = stage.steps[0]
+        return filter.supports_out(params), filter.supports_in_place(params)
+
+    def __plan_buffers(self, img: np.array, stages: List[_Stage],
+                       out: Optional[np.array] = None) -> List[Optional[np.array]]:
+        """Choose the array every stage writes into, ping-ponging between two buffers.
+
+        The last stage writes into ``out`` if given. Working backwards, every
+        other stage writes into the buffer its successor does not, unless the
+        successor can run in place. ``out`` serves as one of the two buffers
+        when it is contiguous and large enough for every intermediate result;
+        otherwise two working buffers of this pipeline are used, which are
+        kept per thread and reused by all later runs. Stages that cannot
+        write into an ``out`` array get None and allocate their result.
+
+        Args:
+            img (np.array): The input of the first stage.
+            stages (List[_Stage]): The stages to run.
+            out (np.array): Where the last stage writes.
+
+        Returns:
+            List[Optional[np.array]]: The output array of every stage.
+        """
+        if not stages:
+            return []
+        batched = img.ndim == 4
+        size = img.shape[:3] if batched else img.shape[:2]
+        channels = 1 if img.ndim == 2 else img.shape[-1]
+        shapes = []
+        for stage in stages:
+            for filter, params in stage.steps:
+                channels = filter.get_output_channels(params, channels)
+            shapes.append(size if channels == 1 and not batched else size + (channels,))
+        sizes = [int(np.prod(shape)) for shape in shapes]
+        capabilities = [self.__stage_capabilities(stage) for stage in stages]
+
+        # Buffer -1 is ``out``, 0 and 1 are working buffers.
+        reuse_out = out is not None and out.flags.c_contiguous and max(sizes[:-1], default=0) <= out.size
+        pool = (-1, 0) if reuse_out else (0, 1)
+        buffers = [-1 if out is not None else pool[0]] * len(stages)
+        for index in range(len(stages) - 2, -1, -1):
+            successor = buffers[index + 1]
+            if capabilities[index + 1][1] and successor in pool:
+                buffers[index] = successor
+            else:
+                buffers[index] = pool[1] if successor == pool[0] else pool[0]
+
+        targets = []
+        for index, (buffer, shape, size) in enumerate(zip(buffers, shapes, sizes)):
+            if not capabilities[index][0]:
+                targets.append(None)
+            elif buffer == -1:
+                targets.append(out if index == len(stages) - 1 else out.reshape(-1)[:size].reshape(shape))
+            else:
+                needed = max(size for other, size in zip(buffers, sizes) if other == buffer)
+                targets.append(self.__working_buffer(buffer, needed)[:size].reshape(shape))
+        return targets
+
+    def __working_buffer(self, index: int, size: int) -> np.array:
+        """The calling thread's working buffer ``index``, grown to at least ``size`` elements."""
+        buffers = getattr(self.__buffers, 'arrays', None)
+        if buffers is None:
+            buffers = self.__buffers.arrays = [None, None]
+        if buffers[index] is None or buffers[index].size < size:
+            buffers[index] = np.empty(size, dtype=self.__dtype)
+        return buffers[index]
+
+    def __check_out(self, out: np.array):
+        if out.shape != self.get_output_shape() or out.dtype != self.__dtype:
+            raise ValueError("out must match the output shape and the working precision dtype")
+        if not out.flags.writeable:
+            raise ValueError("out must be writeable")
+        if np.may_share_memory(out, self.__source.pixels):
+            raise ValueError("out must not share memory with the input image")
+
+    def __plan_stages(self, keyed: bool = True) -> List[_Stage]:
+        """Group the steps into stages and, if ``keyed``, compute their cache keys.
+
+        Adjacent point operators share one lookup table. Adjacent linear
+        operators share one composed convolution, as long as every step but
+        the last keeps values in range, so skipping the clipping between
+        them does not change the result.
+        """
+        key = None
+        if keyed:
+            if self.__fingerprint is None:
+                self.__fingerprint = fingerprint_image(self.__get_img())
+            key = f"{self.__fingerprint}:{self.__precision}" + (":fused" if self.__fuse_linear else "") + \
+                (":fft" if self.__allow_fft else "")
+        stages: List[_Stage] = []
+        for filter, params in self.__steps:
+            if keyed:
+                key = chain_key(key, filter, params)
+            lut = filter.get_lut(params) if self.__dtype == np.uint8 else None
+            plan = filter.get_kernel_plan(params) if self.__fuse_linear and lut is None else None
+            previous = stages[-1] if stages else None
+            if lut is not None and previous is not None and previous.lut is not None:
+                stages[-1] = _Stage(previous.steps + [(filter, params)], lut[previous.lut], key)
+            elif plan is not None and previous is not None and previous.plan is not None and previous.plan.preserves_range:
+                stages[-1] = _Stage(previous.steps + [(filter, params)], None, key, plan)
+            else:
+                stages.append(_Stage([(filter, params)], lut, key, plan))
+        return [stage._replace(fused=FusedParams(tuple(stage.steps)))
+                if stage.plan is not None and len(stage.steps) > 1 else stage
+                for stage in stages]
+
+    @staticmethod
+    def __check_step(filter: IBase, params: IParams):
+        if not isinstance(filter, IBase):
+            raise TypeError("filter must be an instance of IBase")
+        if not isinstance(params, IParams):
+            raise TypeError("params must be an instance of IParams")
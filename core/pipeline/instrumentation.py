@@ -0,0 +1,305 @@
+import itertools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import numpy as np
+from interfaces.IBase import IBase
+from interfaces.IParams import IParams
+from pipeline.tiling import Tile
+
+DEFAULT_MAX_EVENTS = 100000
+
+
+class RunEvent(NamedTuple):
+    """One call of ``ImagePipeline.execute`` or ``execute_tiled``.
+
+    ``before_run`` receives the event with zero times; ``after_run`` the
+    complete one. ``cpu`` is the CPU time of the calling thread only.
+    """
+    run: int
+    method: str
+    steps: Tuple[Tuple[IBase, IParams], ...]
+    shape: Tuple[int, ...]
+    dtype: np.dtype
+    thread: int
+    start: float
+    wall: float = 0.0
+    cpu: float = 0.0
+    # Stages whose result was restored from the step cache instead of run.
+    cached_stages: int = 0
+    tiles: Optional[int] = None
+
+
+class StepEvent(NamedTuple):
+    """One stage of a run: a single step, or adjacent steps run fused.
+
+    ``before_step`` receives the event without the output fields. Times are
+    in seconds, ``start`` on the ``time.perf_counter`` clock, and ``cpu`` is
+    the CPU time of the thread that ran the stage. ``allocated`` is the peak
+    of memory traced during the stage if ``tracemalloc`` is tracing (only
+    meaningful while tiles do not run concurrently), otherwise the size of
+    the output buffer when the stage allocated a new one rather than
+    writing into its input or a reused buffer.
+    """
+    run: int
+    index: int
+    steps: Tuple[Tuple[IBase, IParams], ...]
+    input_shape: Tuple[int, ...]
+    input_dtype: np.dtype
+    thread: int
+    tile: Optional[Tile] = None
+    output_shape: Optional[Tuple[int, ...]] = None
+    output_dtype: Optional[np.dtype] = None
+    start: float = 0.0
+    wall: float = 0.0
+    cpu: float = 0.0
+    allocated: int = 0
+
+    @property
+    def name(self) -> str:
+        return step_label(self.steps)
+
+
+class PipelineHook:
+    """Receives the events of pipeline runs; override the methods you need.
+
+    Register hooks for the whole process with ``register_hook`` or for the
+    current context with ``instrument``. Tiles of ``execute_tiled`` may run
+    on several threads, so hooks must be thread-safe.
+    """
+    def before_run(self, event: RunEvent):
+        pass
+
+    def before_step(self, event: StepEvent):
+        pass
+
+    def after_step(self, event: StepEvent):
+        pass
+
+    def after_run(self, event: RunEvent):
+        pass
+
+
+_global_hooks: Tuple[PipelineHook, ...] = ()
+_global_lock = threading.Lock()
+_context_hooks: ContextVar[Tuple[PipelineHook, ...]] = ContextVar('pipeline_hooks', default=())
+_run_ids = itertools.count(1)
+
+
+def register_hook(hook: PipelineHook):
+    """Report the runs of every pipeline in this process to ``hook``."""
+    global _global_hooks
+    with _global_lock:
+        if hook not in _global_hooks:
+            _global_hooks = _global_hooks + (hook,)
+
+
+def unregister_hook(hook: PipelineHook):
+    """Stop reporting to a hook added with ``register_hook``."""
+    global _global_hooks
+    with _global_lock:
+        _global_hooks = tuple(registered for registered in _global_hooks if registered is not hook)
+
+
+@contextmanager
+def instrument(*hooks: PipelineHook) -> Iterator[None]:
+    """Report the pipeline runs started in the current context to ``hooks``.
+
+    Like ``force_backend``, this is local to the thread or task, so
+    concurrent requests can be profiled separately.
+    """
+    token = _context_hooks.set(_context_hooks.get() + hooks)
+    try:
+        yield
+    finally:
+        _context_hooks.reset(token)
+
+
+def active_hooks() -> Tuple[PipelineHook, ...]:
+    """The hooks a pipeline run started now reports to."""
+    return _global_hooks + _context_hooks.get()
+
+
+def step_label(steps: Tuple[Tuple[IBase, IParams], ...]) -> str:
+    """Name a stage after its operators, e.g. ``GaussianConvolution+SharpeningConvolution``."""
+    return '+'.join(type(filter).__name__ for filter, _ in steps)
+
+
+def _new_buffer_bytes(output: np.array, img: np.array, out: Optional[np.array] = None) -> int:
+    """Size of the memory behind ``output``, unless it is shared with ``img`` or ``out``."""
+    buffer = output
+    while isinstance(buffer.base, np.ndarray):
+        buffer = buffer.base
+    if np.may_share_memory(buffer, img) or (out is not None and np.may_share_memory(buffer, out)):
+        return 0
+    return buffer.nbytes
+
+
+class PipelineRun:
+    """Reports one pipeline run, and every stage it runs, to a set of hooks.
+
+    Pipelines create one through ``begin_run``, which returns None when no
+    hook is active so that uninstrumented runs pay nothing per stage.
+    """
+    def __init__(self, hooks: Tuple[PipelineHook, ...], method: str, steps: List[Tuple[IBase, IParams]],
+                 shape: Tuple[int, ...], dtype: np.dtype, tiles: Optional[int] = None):
+        self.__hooks = hooks
+        self.__cpu = time.thread_time()
+        self.__event = RunEvent(next(_run_ids), method, tuple(steps), shape, np.dtype(dtype),
+                                threading.get_ident(), time.perf_counter(), tiles=tiles)
+        for hook in hooks:
+            hook.before_run(self.__event)
+
+    @property
+    def id(self) -> int:
+        return self.__event.run
+
+    def step(self, index: int, steps: List[Tuple[IBase, IParams]], img: np.array,
+             apply: Callable[[np.array], np.array], tile: Optional[Tile] = None,
+             out: Optional[np.array] = None) -> np.array:
+        """Run one stage as ``apply(img)`` and report it.
+
+        Args:
+            index (int): Position of the stage in the run.
+            steps (List[Tuple[IBase, IParams]]): The steps of the stage.
+            img (np.array): The stage's input.
+            apply (Callable): Computes the stage's output.
+            tile (Tile): The tile being processed, in tiled runs.
+            out (np.array): The preallocated buffer the stage writes into, if any.
+
+        Returns:
+            np.array: The stage's output.
+        """
+        event = StepEvent(self.id, index, tuple(steps), img.shape, img.dtype, threading.get_ident(), tile)
+        for hook in self.__hooks:
+            hook.before_step(event)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            traced = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        cpu = time.thread_time()
+        start = time.perf_counter()
+        output = apply(img)
+        wall = time.perf_counter() - start
+        cpu = time.thread_time() - cpu
+        allocated = tracemalloc.get_traced_memory()[1] - traced if tracing else _new_buffer_bytes(output, img, out)
+        event = event._replace(output_shape=output.shape, output_dtype=output.dtype,
+                               start=start, wall=wall, cpu=cpu, allocated=allocated)
+        for hook in self.__hooks:
+            hook.after_step(event)
+        return output
+
+    def finish(self, cached_stages: int = 0):
+        """Report the end of the run."""
+        event = self.__event._replace(wall=time.perf_counter() - self.__event.start,
+                                      cpu=time.thread_time() - self.__cpu, cached_stages=cached_stages)
+        for hook in self.__hooks:
+            hook.after_run(event)
+
+
+def begin_run(method: str, steps: List[Tuple[IBase, IParams]], shape: Tuple[int, ...],
+              dtype: np.dtype, tiles: Optional[int] = None) -> Optional[PipelineRun]:
+    """Start reporting a run to the active hooks, or return None if there are none."""
+    hooks = active_hooks()
+    if not hooks:
+        return None
+    return PipelineRun(hooks, method, steps, shape, dtype, tiles)
+
+
+class TraceCollector(PipelineHook):
+    """Keeps the events of recent runs and exports them as traces.
+
+    Traces use the Chrome trace-event format, which ``chrome://tracing``
+    and Perfetto open: every run and every stage is a complete ('X') event
+    on the thread it ran on. Only the latest ``max_events`` events are kept.
+    """
+    def __init__(self, max_events: int = DEFAULT_MAX_EVENTS):
+        if max_events <= 0:
+            raise ValueError("max_events must be positive")
+        self.__runs: "deque[RunEvent]" = deque(maxlen=max_events)
+        self.__steps: "deque[StepEvent]" = deque(maxlen=max_events)
+        self.__lock = threading.Lock()
+
+    def after_step(self, event: StepEvent):
+        with self.__lock:
+            self.__steps.append(event)
+
+    def after_run(self, event: RunEvent):
+        with self.__lock:
+            self.__runs.append(event)
+
+    @property
+    def runs(self) -> List[RunEvent]:
+        """The finished runs, oldest first."""
+        with self.__lock:
+            return list(self.__runs)
+
+    def steps(self, run: Optional[int] = None) -> List[StepEvent]:
+        """The stage events of one run, or of all runs."""
+        with self.__lock:
+            return [event for event in self.__steps if run is None or event.run == run]
+
+    def summary(self, run: int) -> List[Dict[str, Any]]:
+        """Totals per stage of a run, adding up the tiles of tiled runs.
+
+        Returns:
+            List[Dict[str, Any]]: ``{'index', 'name', 'calls', 'input_shape',
+            'output_shape', 'dtype', 'wall', 'cpu', 'allocated'}`` per stage.
+        """
+        stages: Dict[int, Dict[str, Any]] = {}
+        for event in self.steps(run):
+            stage = stages.setdefault(event.index, {
+                'index': event.index, 'name': event.name, 'calls': 0,
+                'input_shape': event.input_shape, 'output_shape': event.output_shape,
+                'dtype': str(event.output_dtype), 'wall': 0.0, 'cpu': 0.0, 'allocated': 0,
+            })
+            stage['calls'] += 1
+            stage['wall'] += event.wall
+            stage['cpu'] += event.cpu
+            stage['allocated'] = max(stage['allocated'], event.allocated)
+        return [stages[index] for index in sorted(stages)]
+
+    def to_chrome_trace(self, run: Optional[int] = None) -> Dict[str, Any]:
+        """Export one run, or all kept runs, as a Chrome trace-event document."""
+        pid = os.getpid()
+        trace = []
+        for event in self.runs:
+            if run is None or event.run == run:
+                trace.append({
+                    'name': f"{event.method} ({len(event.steps)} steps)", 'cat': 'pipeline', 'ph': 'X',
+                    'ts': event.start * 1e6, 'dur': event.wall * 1e6, 'pid': pid, 'tid': event.thread,
+                    'args': {'run': event.run, 'shape': list(event.shape), 'dtype': str(event.dtype),
+                             'cpu_ms': event.cpu * 1e3, 'cached_stages': event.cached_stages,
+                             'tiles': event.tiles},
+                })
+        for event in self.steps(run):
+            args = {
+                'run': event.run, 'stage': event.index,
+                'params': [repr(params) for _, params in event.steps],
+                'input': f"{event.input_shape} {event.input_dtype}",
+                'output': f"{event.output_shape} {event.output_dtype}",
+                'cpu_ms': event.cpu * 1e3, 'allocated_bytes': event.allocated,
+            }
+            if event.tile is not None:
+                args['tile'] = f"rows {event.tile.rows.start}:{event.tile.rows.stop}, " \
+                               f"cols {event.tile.cols.start}:{event.tile.cols.stop}"
+            trace.append({'name': event.name, 'cat': 'step', 'ph': 'X', 'ts': event.start * 1e6,
+                          'dur': event.wall * 1e6, 'pid': pid, 'tid': event.thread, 'args': args})
+        return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+    def save(self, path: str, run: Optional[int] = None):
+        """Write ``to_chrome_trace`` as JSON."""
+        with open(path, 'w') as file:
+            json.dump(self.to_chrome_trace(run), file)
+
+    def clear(self):
+        """Drop all kept events."""
+        with self.__lock:
+            self.__runs.clear()
+            self.__steps.clear()
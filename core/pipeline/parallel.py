@@ -0,0 +1,71 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Iterable, List, Optional, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def default_workers() -> int:
+    """Return the number of CPUs this process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+class ParallelExecutor:
+    """A reusable thread pool for running pipeline tiles on several cores.
+
+    NumPy and scipy.ndimage release the GIL inside their kernels, so threads
+    scale with the number of cores without copying tiles between processes.
+    The pool is created once and shared by every pipeline that uses the
+    executor; call ``shutdown`` (or use it as a context manager) when done.
+    """
+    def __init__(self, workers: Optional[int] = None):
+        """Create the pool.
+
+        Args:
+            workers (int): Number of threads; defaults to the number of usable CPUs.
+        """
+        workers = default_workers() if workers is None else workers
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.__workers = workers
+        self.__pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-pipeline')
+
+    @property
+    def workers(self) -> int:
+        return self.__workers
+
+    def map(self, fn: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        """Run ``fn`` on every item and wait for all of them.
+
+        Args:
+            fn (Callable): The function to run.
+            items (Iterable): Its arguments, one call per item.
+
+        Returns:
+            List: The results, in the order of ``items``.
+
+        Raises:
+            Exception: The first error raised by a call. Calls that have not
+                started yet are cancelled and running ones are waited for.
+        """
+        futures = [self.__pool.submit(fn, item) for item in items]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            raise
+
+    def shutdown(self):
+        """Stop the pool after the running calls have finished."""
+        self.__pool.shutdown(wait=True)
+
+    def __enter__(self) -> 'ParallelExecutor':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
@@ -0,0 +1,87 @@
+from typing import Iterator, Optional, Tuple
+import numpy as np
+
+# Working-precision policies accepted by ImagePipeline. Pixel values stay in
+# the [0, 255] range whatever the dtype; uint8 rounds and saturates after
+# every step, the float policies only clip.
+PRECISIONS = {
+    'uint8': np.uint8,
+    'float32': np.float32,
+    'float64': np.float64,
+}
+DEFAULT_PRECISION = 'uint8'
+# Elements per band when large arrays are processed a band of rows at a
+# time, so that temporaries stay small and in cache.
+BAND_SIZE = 2**16
+
+
+def get_dtype(precision: str) -> np.dtype:
+    """Return the numpy dtype of a working-precision policy.
+
+    Args:
+        precision (str): One of the keys of ``PRECISIONS``.
+
+    Returns:
+        np.dtype: The working dtype.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {', '.join(PRECISIONS)}")
+    return np.dtype(PRECISIONS[precision])
+
+
+def compute_dtype(dtype: np.dtype) -> np.dtype:
+    """Return the floating dtype operators should accumulate in for ``dtype``.
+
+    uint8 and float32 images are processed in float32, float64 images in
+    float64, so the float64 policy stays a full-precision reference.
+
+    Args:
+        dtype (np.dtype): The dtype of the operator's input image.
+
+    Returns:
+        np.dtype: The accumulation dtype.
+    """
+    return np.dtype(np.float64) if np.dtype(dtype) == np.float64 else np.dtype(np.float32)
+
+
+def row_bands(shape: Tuple[int, ...], band_size: int = BAND_SIZE) -> Iterator[slice]:
+    """Split the first axis of an array of ``shape`` into bands of about ``band_size`` elements."""
+    rows = max(1, band_size * shape[0] // max(int(np.prod(shape)), 1))
+    for top in range(0, shape[0], rows):
+        yield slice(top, top + rows)
+
+
+def saturate(values: np.array, dtype: np.dtype, out: Optional[np.array] = None) -> np.array:
+    """Clip values to [0, 255] and convert them to ``dtype``.
+
+    Integer targets are rounded to the nearest value first, so fixed-point
+    results never wrap around.
+
+    Args:
+        values (np.array): The values to convert.
+        dtype (np.dtype): The target dtype.
+        out (np.array): Array of ``dtype`` to write the result into, band by
+            band, so that rounding needs no full-size temporary. It may be
+            ``values`` itself.
+
+    Returns:
+        np.array: The saturated values (``out`` if given).
+    """
+    dtype = np.dtype(dtype)
+    if out is not None:
+        if values.dtype == dtype == np.uint8:
+            if values is not out:
+                np.copyto(out, values)
+        elif dtype.kind in 'iu' and values.dtype.kind == 'f':
+            for band in row_bands(values.shape):
+                np.clip(np.rint(values[band]), 0, 255, out=out[band], casting='unsafe')
+        else:
+            np.clip(values, 0, 255, out=out, casting='unsafe')
+        return out
+    if values.dtype == dtype and dtype == np.uint8:
+        return values
+    if np.issubdtype(dtype, np.integer):
+        if np.issubdtype(values.dtype, np.floating):
+            values = np.rint(values)
+        return np.clip(values, 0, 255).astype(dtype)
+    return np.clip(values, 0, 255).astype(dtype, copy=False)
@@ -0,0 +1,66 @@
+from typing import List, Tuple
+import numpy as np
+
+# Levels are not reduced below this width or height.
+MIN_LEVEL_SIZE = 64
+
+
+class ImagePyramid:
+    """Successive 2x reductions of an image, for fast approximate previews.
+
+    Level 0 is the image itself; every further level averages 2x2 blocks of
+    the previous one. Building all levels costs about a third of one pass
+    over the image.
+    """
+    def __init__(self, img: np.array, min_size: int = MIN_LEVEL_SIZE):
+        """Build the pyramid.
+
+        Args:
+            img (np.array): The full-resolution image.
+            min_size (int): Levels stop before either side drops below this.
+        """
+        self.__levels: List[np.ndarray] = [img]
+        while min(self.__levels[-1].shape[:2]) // 2 >= min_size:
+            self.__levels.append(self._reduce(self.__levels[-1]))
+
+    @staticmethod
+    def _reduce(img: np.array) -> np.array:
+        """Halve the image size by averaging 2x2 blocks.
+
+        Args:
+            img (np.array): The image to reduce. An odd last row or column
+                is dropped.
+
+        Returns:
+            np.array: The reduced image, in the input dtype.
+        """
+        height, width = img.shape[0] // 2, img.shape[1] // 2
+        blocks = img[:2 * height, :2 * width].reshape((height, 2, width, 2) + img.shape[2:])
+        if np.issubdtype(img.dtype, np.integer):
+            total = blocks.sum(axis=(1, 3), dtype=np.uint32)
+            return ((total + 2) // 4).astype(img.dtype)
+        return blocks.mean(axis=(1, 3), dtype=img.dtype)
+
+    def level_for(self, width: int) -> Tuple[np.array, float]:
+        """Return the smallest level that is at least ``width`` pixels wide.
+
+        Args:
+            width (int): The display width, in device pixels.
+
+        Returns:
+            Tuple[np.array, float]: The level and its scale relative to level 0.
+        """
+        full_width = self.__levels[0].shape[1]
+        for level in reversed(self.__levels):
+            if level.shape[1] >= width:
+                return level, level.shape[1] / full_width
+        return self.__levels[0], 1.0
+
+    @property
+    def levels(self) -> List[np.ndarray]:
+        return list(self.__levels)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of all levels except level 0, which is owned by the caller."""
+        return sum(level.nbytes for level in self.__levels[1:])
@@ -0,0 +1,66 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple, Union
+import numpy as np
+from interfaces.IBase import IBase
+from interfaces.IParams import IParams
+from pipeline.image_pipeline import ImagePipeline
+from pipeline.precision import DEFAULT_PRECISION, get_dtype
+from pipeline.step_cache import StepCache
+from pipeline.registry import create_step
+
+
+def parse_recipe(recipe: Union[Dict[str, Any], List[Dict[str, Any]]]) -> Tuple[str, List[Tuple[IBase, IParams]]]:
+    """Turn a JSON pipeline recipe into validated pipeline steps.
+
+    A recipe is either a list of steps or an object with a ``steps`` list
+    and an optional ``precision``. Every step names an operator of the
+    registry (see ``registry.list_operators``) and may give its parameters;
+    omitted ones keep their defaults::
+
+        {"precision": "uint8",
+         "steps": [{"name": "gaussian", "params": {"kernel_size": 5, "sigma": 1.5}},
+                   {"name": "sobel", "params": {"threshold": 4}}]}
+
+    Args:
+        recipe (dict | list): The decoded JSON recipe.
+
+    Returns:
+        Tuple[str, List[Tuple[IBase, IParams]]]: The precision and the steps.
+    """
+    if isinstance(recipe, list):
+        recipe = {'steps': recipe}
+    precision = recipe.get('precision', DEFAULT_PRECISION)
+    get_dtype(precision)
+    steps = []
+    for index, step in enumerate(recipe.get('steps', [])):
+        name = step.get('name')
+        try:
+            steps.append(create_step(name, step.get('params', {})))
+        except ValueError as exc:
+            raise ValueError(f"step {index} ({name}): {exc}") from exc
+    return precision, steps
+
+
+def load_recipe(path: str) -> Tuple[str, List[Tuple[IBase, IParams]]]:
+    """Read and parse a JSON recipe file (see ``parse_recipe``)."""
+    with open(path) as file:
+        return parse_recipe(json.load(file))
+
+
+def build_pipeline(img: np.array, recipe: Union[Dict[str, Any], List[Dict[str, Any]]],
+                   cache: Optional[StepCache] = None) -> ImagePipeline:
+    """Create a pipeline for ``img`` with the steps of a recipe.
+
+    Args:
+        img (np.array): The input image.
+        recipe (dict | list): The decoded JSON recipe.
+        cache (StepCache): Passed on to ``ImagePipeline``.
+
+    Returns:
+        ImagePipeline: The pipeline, ready to execute.
+    """
+    precision, steps = parse_recipe(recipe)
+    pipeline = ImagePipeline(img, precision, cache)
+    for filter, params in steps:
+        pipeline.add_step(filter, params)
+    return pipeline
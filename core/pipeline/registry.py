@@ -0,0 +1,153 @@
+import importlib
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+from interfaces.IBase import IBase
+from interfaces.IParams import IParams
+
+# Packages whose __init__ registers the built-in operators. Importing them is
+# cheap: operator modules (and the libraries they need) load on first use.
+BUILTIN_PACKAGES = ('filters', 'convolutions', 'edges')
+
+
+def _import_attribute(path: str) -> Any:
+    """Import ``'module:attribute'`` and return the attribute."""
+    module, _, attribute = path.partition(':')
+    return getattr(importlib.import_module(module), attribute)
+
+
+@dataclass(frozen=True)
+class OperatorSpec:
+    """What the UI, recipes and scheduling need to know about an operator.
+
+    The operator and its parameters are given as ``'module:Class'`` paths
+    and are imported only when first needed.
+
+    Attributes:
+        name (str): The step name used in recipes and the filter dropdown.
+        label (str): The name shown to users.
+        operator (str): Path of the ``IBase`` class.
+        params (str): Path of the ``IParams`` class.
+        footprint (int | str | None): Radius the operator reads around a
+            pixel, the name of the kernel-size parameter that sets it
+            (radius ``size // 2``), or None if it needs the whole image.
+        cost (float): Rough time per pixel at default parameters, relative
+            to a point operator.
+    """
+    name: str
+    label: str
+    operator: str
+    params: str
+    footprint: Union[int, str, None] = 0
+    cost: float = 1.0
+
+    def load(self) -> Tuple[type, type]:
+        """Import and return the operator and parameter classes."""
+        classes = _loaded.get(self)
+        if classes is None:
+            classes = _loaded[self] = (_import_attribute(self.operator), _import_attribute(self.params))
+        return classes
+
+    @property
+    def operator_class(self) -> type:
+        return self.load()[0]
+
+    @property
+    def params_class(self) -> type:
+        return self.load()[1]
+
+    def estimate_footprint(self, values: Dict[str, Any]) -> Optional[int]:
+        """The footprint for the given parameter values, without importing the operator."""
+        if isinstance(self.footprint, str):
+            return int(values[self.footprint]) // 2
+        return self.footprint
+
+
+_operators: Dict[str, OperatorSpec] = {}
+_loaded: Dict[OperatorSpec, Tuple[type, type]] = {}
+_lock = threading.RLock()
+_discovered = False
+
+
+def register_operator(name: str, label: str, operator: str, params: str,
+                      footprint: Union[int, str, None] = 0, cost: float = 1.0) -> OperatorSpec:
+    """Make an operator available under ``name`` (see ``OperatorSpec``).
+
+    Registering the same operator again is a no-op, so a package imported
+    under two names does not conflict with itself.
+
+    Returns:
+        OperatorSpec: The registered operator.
+    """
+    spec = OperatorSpec(name, label, operator, params, footprint, cost)
+    with _lock:
+        registered = _operators.get(name)
+        if registered is not None:
+            if registered != spec:
+                raise ValueError(f"operator {name!r} is already registered as {registered.operator}")
+            return registered
+        _operators[name] = spec
+    return spec
+
+
+def _discover():
+    global _discovered
+    with _lock:
+        if not _discovered:
+            _discovered = True
+            for package in BUILTIN_PACKAGES:
+                importlib.import_module(package)
+
+
+def _package_rank(spec: OperatorSpec) -> int:
+    package = spec.operator.partition('.')[0]
+    return BUILTIN_PACKAGES.index(package) if package in BUILTIN_PACKAGES else len(BUILTIN_PACKAGES)
+
+
+def list_operators() -> List[OperatorSpec]:
+    """All registered operators: built-in ones by package, then the others.
+
+    Operators of a package keep their registration order, whichever package
+    happened to be imported first.
+    """
+    _discover()
+    with _lock:
+        return sorted(_operators.values(), key=_package_rank)
+
+
+def get_operator(name: str) -> OperatorSpec:
+    """Look up an operator by its step name.
+
+    Raises:
+        ValueError: If no operator of that name is registered.
+    """
+    _discover()
+    with _lock:
+        spec = _operators.get(name)
+    if spec is None:
+        raise ValueError(f"unknown operator {name!r}, expected one of {', '.join(_operators)}")
+    return spec
+
+
+def create_step(name: str, values: Optional[Dict[str, Any]] = None) -> Tuple[IBase, IParams]:
+    """Create a validated pipeline step from an operator name and parameter values.
+
+    Omitted parameters keep their defaults.
+
+    Args:
+        name (str): The operator's step name.
+        values (Dict[str, Any]): Parameter values by name.
+
+    Returns:
+        Tuple[IBase, IParams]: The operator and its parameters.
+
+    Raises:
+        ValueError: For unknown operators, parameters or invalid values.
+    """
+    operator_class, params_class = get_operator(name).load()
+    try:
+        params = params_class(**(values or {}))
+    except TypeError as exc:
+        raise ValueError(str(exc)) from exc
+    params.validate()
+    return operator_class(), params
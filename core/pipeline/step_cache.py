@@ -0,0 +1,102 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+from interfaces.IBase import IBase
+from interfaces.IParams import IParams
+
+DEFAULT_CACHE_BYTES = 512 * 2**20
+
+
+def fingerprint_image(img: np.array) -> str:
+    """Return a content hash of an image, including its shape and dtype.
+
+    Args:
+        img (np.array): The image to hash.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{img.shape}{img.dtype.str}".encode())
+    digest.update(memoryview(np.ascontiguousarray(img)).cast('B'))
+    return digest.hexdigest()
+
+
+def chain_key(previous_key: str, filter: IBase, params: IParams) -> str:
+    """Extend a cache key with one more (operator, params) step.
+
+    Args:
+        previous_key (str): The key of the step's input.
+        filter (IBase): The operator of the step.
+        params (IParams): The parameters of the step.
+
+    Returns:
+        str: The key of the step's output.
+    """
+    filter_type = type(filter)
+    step = f"{filter_type.__module__}.{filter_type.__qualname__}:{params!r}"
+    return hashlib.blake2b(f"{previous_key}|{step}".encode(), digest_size=16).hexdigest()
+
+
+class StepCache:
+    """Thread-safe LRU cache of intermediate pipeline results with a byte budget.
+
+    Cached arrays are made read-only, since they are shared between runs.
+    """
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        if max_bytes < 0:
+            raise ValueError("max_bytes must not be negative")
+        self.__max_bytes = max_bytes
+        self.__entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.__nbytes = 0
+        self.__lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[np.array]:
+        """Return the cached result for ``key`` and mark it as recently used."""
+        with self.__lock:
+            img = self.__entries.get(key)
+            if img is not None:
+                self.__entries.move_to_end(key)
+            return img
+
+    def put(self, key: str, img: np.array):
+        """Store a result, evicting the least recently used ones if needed.
+
+        Results larger than the whole budget are not stored.
+        """
+        if img.nbytes > self.__max_bytes:
+            return
+        img.setflags(write=False)
+        with self.__lock:
+            previous = self.__entries.pop(key, None)
+            if previous is not None:
+                self.__nbytes -= previous.nbytes
+            self.__entries[key] = img
+            self.__nbytes += img.nbytes
+            while self.__nbytes > self.__max_bytes:
+                _, evicted = self.__entries.popitem(last=False)
+                self.__nbytes -= evicted.nbytes
+
+    def clear(self):
+        """Drop all cached results."""
+        with self.__lock:
+            self.__entries.clear()
+            self.__nbytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Whether anything can be cached at all (a zero budget disables it)."""
+        return self.__max_bytes > 0
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of the cached results."""
+        return self.__nbytes
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__entries
+
+    def __len__(self) -> int:
+        return len(self.__entries)
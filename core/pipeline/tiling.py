@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+from typing import List, Tuple
+import numpy as np
+
+DEFAULT_TILE_SIZE = 512
+
+
+@dataclass(frozen=True)
+class Tile:
+    """One output tile and the input region (tile plus halo) it depends on."""
+    rows: slice
+    cols: slice
+    src_rows: slice
+    src_cols: slice
+
+    @property
+    def crop(self) -> Tuple[slice, slice]:
+        """Position of the output tile inside the processed input region."""
+        top = self.rows.start - self.src_rows.start
+        left = self.cols.start - self.src_cols.start
+        return (slice(top, top + self.rows.stop - self.rows.start),
+                slice(left, left + self.cols.stop - self.cols.start))
+
+
+def plan_tiles(shape: Tuple[int, ...], tile_size: int, halo: int) -> List[Tile]:
+    """Split an image into tiles, each with the input region it needs.
+
+    Input regions extend ``halo`` pixels past the tile on every side, clipped
+    to the image, so operators still see the real image border where there
+    is one and their own padding only corrupts the halo elsewhere.
+
+    Args:
+        shape (Tuple[int, ...]): The image shape; only the first two axes are tiled.
+        tile_size (int): The side of a tile, in pixels.
+        halo (int): The accumulated footprint of all steps.
+
+    Returns:
+        List[Tile]: The tiles, in row-major order.
+    """
+    if tile_size <= 0:
+        raise ValueError("tile_size must be positive")
+    if halo < 0:
+        raise ValueError("halo must not be negative")
+    height, width = shape[:2]
+    tiles = []
+    for top in range(0, height, tile_size):
+        bottom = min(top + tile_size, height)
+        for left in range(0, width, tile_size):
+            right = min(left + tile_size, width)
+            tiles.append(Tile(
+                rows=slice(top, bottom),
+                cols=slice(left, right),
+                src_rows=slice(max(top - halo, 0), min(bottom + halo, height)),
+                src_cols=slice(max(left - halo, 0), min(right + halo, width)),
+            ))
+    return tiles
+
+
+def open_memmap(path: str, shape: Tuple[int, ...], dtype=np.uint8, mode: str = 'w+') -> np.memmap:
+    """Open a ``.npy`` file as a memory-mapped array for tiled input or output.
+
+    Args:
+        path (str): The file path.
+        shape (Tuple[int, ...]): The array shape, used when creating the file.
+        dtype: The array dtype, used when creating the file.
+        mode (str): 'w+' to create the file, 'r' or 'r+' to open an existing one.
+
+    Returns:
+        np.memmap: The memory-mapped array.
+    """
+    if mode == 'w+':
+        return np.lib.format.open_memmap(path, mode=mode, dtype=dtype, shape=shape)
+    return np.load(path, mmap_mode=mode)
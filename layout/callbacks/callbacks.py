@@ -1,36 +1,53 @@
 from dash import html, dcc
 import dash
 from dash.dependencies import Input, Output, State, ALL
-from core.pipeline.image_pipeline import ImagePipeline
-from core.pipeline.filters.brightness import BrightnessParams, BrightnessFilter
-from core.pipeline.filters.contrast import ContrastParams, ContrastFilter
-from core.pipeline.filters.grayscale import GrayscaleParams, GrayscaleFilter
-from core.pipeline.filters.binarization import BinarizationParams, BinarizationFilter
-from core.pipeline.filters.negative import NegativeParams, NegativeFilter
-from core.pipeline.convolutions.average import AverageParams, AverageConvolution
-from core.pipeline.convolutions.gaussian import GaussianParams, GaussianConvolution
-from core.pipeline.convolutions.sharpening import SharpeningParams, SharpeningConvolution
-from core.pipeline.edges.sobel import SobelParams, SobelEdge
-from core.pipeline.edges.roberts import RobertsParams, RobertsEdge
-import base64
-import io
+# Pipeline modules import each other as top-level 'pipeline.*' modules, so hooks
+# and operators must be registered in that instance of these modules, and
+# importing them as 'core.pipeline.*' would load a second copy.
+from pipeline.analytics import AnalyticsCache
+from pipeline.frames import encode_frames, frame_format, process_frames
+from pipeline.history import EditHistory
+from pipeline.image_pipeline import ImagePipeline
+from pipeline.instrumentation import TraceCollector, instrument
+from pipeline.precision import saturate
+from pipeline.pyramid import ImagePyramid
+from pipeline.registry import create_step, get_operator
+from pipeline.step_cache import StepCache
+import json
+import os
+import time
 import numpy as np
-from PIL import Image
 import dash_bootstrap_components as dbc
-from .utils import parse_contents, generate_histogram, generate_projections, generate_image_stats
-
-FILTER_PARAM_MAPPING = {
-    'brightness': BrightnessParams,
-    'contrast': ContrastParams,
-    'grayscale': GrayscaleParams,
-    'binarization': BinarizationParams,
-    'negative': NegativeParams,
-    'average': AverageParams,
-    'gaussian': GaussianParams,
-    'sharpening': SharpeningParams,
-    'sobel': SobelParams,
-    'roberts': RobertsParams
-}
+from contextlib import nullcontext
+from dataclasses import asdict
+from urllib.parse import quote
+from .image_server import RenderedImageStore, frames_url, register_frames_route, register_image_route
+from .jobs import DEFAULT_JOBS_DIR, JobManager
+from .session_store import ImageSessionStore
+from .utils import parse_contents, decode_upload, generate_histogram, generate_projections, generate_image_stats, \
+    generate_timing_table
+
+# Decoded images live on the server; the browser only keeps a session handle
+# in 'image-store' / 'original-store'.
+session_store = ImageSessionStore(int(os.environ.get('IMAGE_STORE_MAX_MB', 1024)) * 2**20)
+# Intermediate results of reduced-size previews, shared by all sessions.
+preview_cache = StepCache(int(os.environ.get('PREVIEW_CACHE_MAX_MB', 128)) * 2**20)
+# Encoded PNGs served by URL (see image_server), so callbacks return a short
+# URL instead of a base64 data URI and browsers can cache the image.
+rendered_images = RenderedImageStore(int(os.environ.get('RENDERED_IMAGE_CACHE_MAX_MB', 256)) * 2**20)
+# Budget for full-size undo checkpoints of every session.
+HISTORY_MAX_BYTES = int(os.environ.get('HISTORY_MAX_MB', 256)) * 2**20
+# Heavy steps on large images run as background callbacks through files on disk.
+job_manager = JobManager(os.environ.get('IMAGE_JOBS_DIR', DEFAULT_JOBS_DIR),
+                         int(float(os.environ.get('BACKGROUND_MIN_MEGAPIXELS', 4)) * 2**20))
+# Histograms, projections and statistics of recently displayed images.
+analytics_cache = AnalyticsCache()
+# Used until the browser has reported the width of the preview card.
+DEFAULT_PREVIEW_WIDTH = 1024
+# Per-step timings of every session's pipelines, shown in a collapsible panel.
+TIMING_PANEL = os.environ.get('PIPELINE_TIMING_PANEL', '0') not in ('', '0')
+# Most recent runs listed in the timing panel.
+TIMING_PANEL_RUNS = 5
 
 def create_param_ui(param_name, param_info):
     """Generate UI element based on parameter type and constraints"""
@@ -67,17 +84,96 @@ def create_param_ui(param_name, param_info):
         ]
     return []
 
+def build_step(filter_value, slider_values, dropdown_values, radio_values):
+    """Create the (filter, params) step selected in the "Add Filter" card.
+
+    Controls are created in the order of the parameter definitions, so the
+    n-th slider (dropdown, radio) holds the n-th parameter of that type.
+
+    Raises:
+        ValueError: For unknown filters or invalid values.
+        IndexError: If the controls do not match the filter's parameters.
+    """
+    spec = get_operator(filter_value)
+    controls = {'slider': list(slider_values), 'dropdown': list(dropdown_values), 'radio': list(radio_values)}
+    values = {name: controls[info['type']].pop(0)
+              for name, info in spec.params_class.get_param_definitions().items()
+              if info.get('type') in controls}
+    return create_step(filter_value, values)
+
+def publish_current(session):
+    """Return the URL of a session's current image."""
+    return rendered_images.publish(session.current, key=session.fingerprint)
+
+def preview_frame(session, index, width, step=None):
+    """Return the URL of a reduced preview of one frame of a multi-frame session.
+
+    Only that frame is decoded and processed, with the steps applied so far
+    and ``step``, if given.
+    """
+    frame = session.frames.read(index).image
+    pipeline = ImagePipeline(frame, cache=preview_cache)
+    for filter, params in session.history.applied_steps + ([step] if step else []):
+        pipeline.add_step(filter, params)
+    with timed(session):
+        preview = pipeline.preview(ImagePyramid(frame.pixels), width or DEFAULT_PREVIEW_WIDTH)
+    return rendered_images.publish(saturate(preview, np.uint8))
+
+def render_frames(session_id, version, format):
+    """Encode every frame of a multi-frame session with the steps applied so far.
+
+    Returns:
+        Iterator[bytes]: The encoded file, produced while it is read, or
+        None if the session has no such version (see ``register_frames_route``).
+    """
+    session = session_store.get({'session_id': session_id})
+    if session is None or session.frames is None or session.version != version:
+        return None
+    # Unfused like the history's replays, so the first frame matches the displayed image.
+    frames = process_frames(session.frames, session.history.applied_steps, fuse_linear=False)
+    return encode_frames(frames, format, session.frames.loop)
+
+def timed(session):
+    """Record the pipelines run in this context in the session's timings, if collected."""
+    if session is None or session.timings is None:
+        return nullcontext()
+    return instrument(session.timings)
+
+def history_state(history):
+    """Describe a session's history for 'pipeline-store' (no image data)."""
+    return {
+        'cursor': history.cursor,
+        'steps': [{'operator': type(filter).__name__, 'params': asdict(params)}
+                  for filter, params in history.steps],
+    }
+
+def show_history_state(handle, history):
+    """Make the current state of ``history`` the session's image.
+
+    Returns:
+        tuple: The image component, the new session handle and the
+        'pipeline-store' data.
+    """
+    image = saturate(history.current, np.uint8)
+    new_handle = session_store.update(handle, image, ImagePyramid(image))
+    new_session = session_store.get(new_handle)
+    url = publish_current(new_session) if new_session is not None else rendered_images.publish(image)
+    return parse_contents(url), new_handle, history_state(history)
+
 def register_callbacks(app):
+    register_image_route(app.server, rendered_images)
+    register_frames_route(app.server, render_frames)
+
     @app.callback(
         Output('filter-parameters', 'children'),
         Input('filter-dropdown', 'value')
     )
     def update_filter_parameters(selected_filter):
         """Display parameter controls based on the filter's parameter class"""
-        if not selected_filter or selected_filter not in FILTER_PARAM_MAPPING:
+        if not selected_filter:
             return None
-        param_class = FILTER_PARAM_MAPPING[selected_filter]
-        param_definitions = param_class.get_param_definitions()
+        # The operator's module is imported the first time it is selected.
+        param_definitions = get_operator(selected_filter).params_class.get_param_definitions()
         ui_elements = []
         for param_name, param_info in param_definitions.items():
             ui_elements.extend(create_param_ui(param_name, param_info))
@@ -88,96 +184,275 @@ def register_callbacks(app):
         ])
 
     @app.callback(Output('add-filter', 'disabled'),
-                  [Input('upload-image', 'contents'),
+                  [Input('image-store', 'data'),
                    Input('filter-dropdown', 'value')])
-    def toggle_add_filter_button(contents, filter_value):
-        return contents is None or filter_value is None
+    def toggle_add_filter_button(handle, filter_value):
+        return handle is None or filter_value is None
 
     @app.callback(
         Output('output-image-upload', 'children', allow_duplicate=True),
-        Output('color-histogram', 'figure'),
-        Input('add-filter', 'n_clicks'),
+        Output('image-store', 'data', allow_duplicate=True),
+        Output('original-store', 'data'),
+        Output('pipeline-store', 'data'),
+        Output('frame-slider', 'max'),
+        Output('frame-slider', 'value'),
+        Output('frame-controls', 'style'),
         Input('upload-image', 'contents'),
+        prevent_initial_call=True
+    )
+    def upload_image(contents):
+        if contents is None:
+            return (dash.no_update,) * 7
+        # Multi-frame images are edited on their first frame; the others are
+        # decoded when scrubbed to or downloaded.
+        image, frames = decode_upload(contents)
+        history = EditHistory(image, HISTORY_MAX_BYTES)
+        timings = TraceCollector() if TIMING_PANEL else None
+        handle = session_store.create(image, ImagePyramid(image), history, timings, frames)
+        frame_controls = {'display': 'none'} if frames is None else {'display': 'block'}
+        return (parse_contents(publish_current(session_store.get(handle))), handle, handle, history_state(history),
+                len(frames) - 1 if frames is not None else 0, 0, frame_controls)
+
+    @app.callback(
+        Output('output-image-upload', 'children', allow_duplicate=True),
+        Input('frame-slider', 'value'),
+        Input('pipeline-store', 'data'),
+        State('image-store', 'data'),
+        State('preview-width', 'data'),
+        prevent_initial_call=True
+    )
+    def show_frame(index, state, handle, preview_width):
+        """Show the scrubbed frame of a multi-frame image, also after the steps change.
+
+        Frame 0 is the session's image, which the other callbacks show.
+        """
+        session = session_store.get(handle)
+        if session is None or session.frames is None or not 0 <= (index or 0) < len(session.frames):
+            return dash.no_update
+        if not index:
+            if dash.ctx.triggered_id == 'frame-slider':
+                return parse_contents(publish_current(session))
+            return dash.no_update
+        return parse_contents(preview_frame(session, index, preview_width))
+
+    app.clientside_callback(
+        """
+        function(handle) {
+            var el = document.getElementById('output-image-upload');
+            if (!el || !el.clientWidth) {
+                return window.dash_clientside.no_update;
+            }
+            return Math.round(el.clientWidth * (window.devicePixelRatio || 1));
+        }
+        """,
+        Output('preview-width', 'data'),
+        Input('image-store', 'data')
+    )
+
+    @app.callback(
+        Output('output-image-upload', 'children', allow_duplicate=True),
+        Input('filter-dropdown', 'value'),
+        Input({'type': 'slider', 'index': ALL}, 'value'),
+        Input({'type': 'dropdown', 'index': ALL}, 'value'),
+        Input({'type': 'radio', 'index': ALL}, 'value'),
+        State('image-store', 'data'),
+        State('preview-width', 'data'),
+        State('frame-slider', 'value'),
+        prevent_initial_call=True
+    )
+    def update_preview(filter_value, slider_values, dropdown_values, radio_values, handle, preview_width,
+                       frame_index):
+        """Show the selected filter on a reduced copy of the current image,
+        or of the scrubbed frame of a multi-frame image.
+
+        The full-resolution image is only processed when the filter is added.
+        """
+        session = session_store.get(handle)
+        if session is None or session.pyramid is None or filter_value is None:
+            return dash.no_update
+        try:
+            step = build_step(filter_value, slider_values, dropdown_values, radio_values)
+        except (IndexError, TypeError, ValueError):
+            # Parameter controls of the previously selected filter.
+            return dash.no_update
+        if session.frames is not None and frame_index:
+            return parse_contents(preview_frame(session, frame_index, preview_width, step))
+        pipeline = ImagePipeline(session.current, cache=preview_cache)
+        pipeline.add_step(*step)
+        with timed(session):
+            preview = pipeline.preview(session.pyramid, preview_width or DEFAULT_PREVIEW_WIDTH)
+        return parse_contents(rendered_images.publish(saturate(preview, np.uint8)))
+
+    @app.callback(
+        Output('output-image-upload', 'children', allow_duplicate=True),
+        Output('image-store', 'data', allow_duplicate=True),
+        Output('pipeline-store', 'data', allow_duplicate=True),
+        Output('job-request', 'data'),
+        Input('add-filter', 'n_clicks'),
         State('filter-dropdown', 'value'),
         State({'type': 'slider', 'index': ALL}, 'value'),
         State({'type': 'dropdown', 'index': ALL}, 'value'),
         State({'type': 'radio', 'index': ALL}, 'value'),
-        State('output-image-upload', 'children'),
+        State('image-store', 'data'),
         prevent_initial_call=True
     )
-    def update_history(n_clicks, upload_image, filter_value, slider_values, dropdown_values, radio_values, image):
+    def update_history(n_clicks, filter_value, slider_values, dropdown_values, radio_values, handle):
         if n_clicks == 0 or n_clicks is None:
-            return parse_contents(upload_image), dash.no_update
-        header, _, encoded = image['props']['src'].partition(',')
-        decoded = base64.b64decode(encoded)
-        with io.BytesIO(decoded) as buf:
-            pil_img = Image.open(buf).convert('RGB')
-            image = np.array(pil_img)
-        pipeline = ImagePipeline(image)
-        if filter_value == 'brightness':
-            pipeline.add_step(filter=BrightnessFilter(), params=BrightnessParams(value=slider_values[0]))
-        elif filter_value == 'contrast':
-            pipeline.add_step(filter=ContrastFilter(), params=ContrastParams(value=slider_values[0]))
-        elif filter_value == 'grayscale':
-            pipeline.add_step(filter=GrayscaleFilter(), params=GrayscaleParams(method=radio_values[0], intensity=slider_values[0]))
-        elif filter_value == 'binarization':
-            pipeline.add_step(filter=BinarizationFilter(), params=BinarizationParams(threshold=slider_values[0]))
-        elif filter_value == 'negative':
-            pipeline.add_step(filter=NegativeFilter(), params=NegativeParams())
-        elif filter_value == 'average':
-            pipeline.add_step(filter=AverageConvolution(), params=AverageParams(slider_values[0]))
-        elif filter_value == 'gaussian':
-            pipeline.add_step(filter=GaussianConvolution(), params=GaussianParams(kernel_size=slider_values[0], sigma=slider_values[1]))
-        elif filter_value == 'sharpening':
-            pipeline.add_step(filter=SharpeningConvolution(), params=SharpeningParams(kernel_size=slider_values[0], alpha=slider_values[1]))
-        elif filter_value == 'sobel':
-            pipeline.add_step(filter=SobelEdge(), params=SobelParams(slider_values[0]))
-        elif filter_value == 'roberts':
-            pipeline.add_step(filter=RobertsEdge(), params=RobertsParams(slider_values[0]))
-        result_array = pipeline.execute()
-        result_array = result_array.astype(np.uint8)
-        result_img = Image.fromarray(result_array)
-        buff = io.BytesIO()
-        result_img.save(buff, format="PNG")
-        encoded_result = base64.b64encode(buff.getvalue()).decode("utf-8")
-        base64_uri = f"data:image/png;base64,{encoded_result}"
-        fig = generate_histogram(result_array)
-        return parse_contents(base64_uri), fig
+            return dash.no_update, dash.no_update, dash.no_update, dash.no_update
+        session = session_store.get(handle)
+        if session is None:
+            return html.P("The image session has expired, please upload the image again."), None, dash.no_update, dash.no_update
+        values = [filter_value, slider_values, dropdown_values, radio_values]
+        step = build_step(*values)
+        if job_manager.is_heavy(*step, session.current.shape):
+            # A new request replaces the job in flight, which Dash then cancels.
+            job = {'handle': handle, 'input': job_manager.write_input(session.current, session.fingerprint), 'step': values}
+            return dash.no_update, dash.no_update, dash.no_update, job
+        with timed(session):
+            session.history.push(*step)
+        return show_history_state(handle, session.history) + (dash.no_update,)
+
+    @app.callback(
+        Output('job-result', 'data'),
+        Input('job-request', 'data'),
+        background=True,
+        manager=job_manager.callback_manager,
+        progress=[Output('job-progress', 'value'), Output('job-progress', 'label')],
+        running=[(Output('job-status', 'style'), {'display': 'block'}, {'display': 'none'})],
+        cancel=[Input('cancel-job', 'n_clicks'), Input('upload-image', 'contents'),
+                Input('undo-button', 'n_clicks'), Input('redo-button', 'n_clicks')],
+        interval=250,
+        prevent_initial_call=True
+    )
+    def run_job(set_progress, job):
+        def report(step, steps, tile, tiles):
+            percent = 100 * ((step - 1) * tiles + tile) // (steps * tiles)
+            set_progress((percent, f"Step {step}/{steps}, tile {tile}/{tiles}"))
+        start = time.perf_counter()
+        result = job_manager.run(job['input'], [build_step(*job['step'])], report)
+        return {**job, 'result': result, 'cost': time.perf_counter() - start}
+
+    @app.callback(
+        Output('output-image-upload', 'children', allow_duplicate=True),
+        Output('image-store', 'data', allow_duplicate=True),
+        Output('pipeline-store', 'data', allow_duplicate=True),
+        Input('job-result', 'data'),
+        State('image-store', 'data'),
+        prevent_initial_call=True
+    )
+    def apply_job_result(job, handle):
+        # Results computed from an image that is no longer displayed are stale.
+        session = session_store.get(handle)
+        if not job or session is None or job['handle'] != handle:
+            job_manager.discard_result(job and job.get('result'))
+            return dash.no_update, dash.no_update, dash.no_update
+        step = build_step(*job['step'])
+        session.history.push(*step, result=job_manager.load_result(job['result']), cost=job['cost'])
+        return show_history_state(handle, session.history)
+
+    @app.callback(
+        Output('output-image-upload', 'children', allow_duplicate=True),
+        Output('image-store', 'data', allow_duplicate=True),
+        Output('pipeline-store', 'data', allow_duplicate=True),
+        Input('undo-button', 'n_clicks'),
+        Input('redo-button', 'n_clicks'),
+        Input({'type': 'history-item', 'index': ALL}, 'n_clicks'),
+        State('image-store', 'data'),
+        prevent_initial_call=True
+    )
+    def navigate_history(undo_clicks, redo_clicks, item_clicks, handle):
+        # Re-rendering the history strip adds items without clicks, which also fires this.
+        if not dash.ctx.triggered or not dash.ctx.triggered[0]['value']:
+            return dash.no_update, dash.no_update, dash.no_update
+        session = session_store.get(handle)
+        if session is None:
+            return html.P("The image session has expired, please upload the image again."), None, dash.no_update
+        history = session.history
+        with timed(session):
+            if dash.ctx.triggered_id == 'undo-button':
+                history.undo()
+            elif dash.ctx.triggered_id == 'redo-button':
+                history.redo()
+            else:
+                history.goto(dash.ctx.triggered_id['index'])
+        return show_history_state(handle, history)
+
+    @app.callback(
+        Output('history-strip', 'children'),
+        Output('undo-button', 'disabled'),
+        Output('redo-button', 'disabled'),
+        Input('pipeline-store', 'data'),
+        State('image-store', 'data')
+    )
+    def render_history_strip(state, handle):
+        session = session_store.get(handle)
+        if session is None or session.history is None:
+            return [], True, True
+        history = session.history
+        labels = ['Original'] + [type(filter).__name__ for filter, _ in history.steps]
+        items = [
+            html.Button(
+                html.Img(src=rendered_images.publish(thumbnail), style={'height': '48px'}),
+                id={'type': 'history-item', 'index': index},
+                title=label,
+                className="btn p-0",
+                style={'border': '2px solid ' + ('#198754' if index == history.cursor else 'transparent'),
+                       'opacity': 1 if index <= history.cursor else 0.5}
+            )
+            for index, (label, thumbnail) in enumerate(zip(labels, history.thumbnails))
+        ]
+        return items, not history.can_undo, not history.can_redo
+
+    @app.callback(
+        Output('color-histogram', 'figure', allow_duplicate=True),
+        Input('histogram-scale', 'value'),
+        prevent_initial_call=True
+    )
+    def update_histogram_scale(scale):
+        # Only the axis type changes, so patch it instead of resending the counts.
+        fig = dash.Patch()
+        fig['layout']['yaxis']['type'] = 'log' if 'log' in (scale or []) else 'linear'
+        return fig
 
     @app.callback(
         Output('image-stats-container', 'children'),
-        Input('output-image-upload', 'children')
+        Output('color-histogram', 'figure'),
+        Input('image-store', 'data'),
+        State('histogram-scale', 'value')
     )
-    def update_image_stats_and_projections(image_children):
-        if not image_children:
-            return dash.no_update
-        header, _, encoded = image_children['props']['src'].partition(',')
-        decoded = base64.b64decode(encoded)
-        with io.BytesIO(decoded) as buf:
-            pil_img = Image.open(buf).convert('RGB')
-            image_array = np.array(pil_img)
-        stats_div = generate_image_stats(image_array)
-        fig_h, fig_v = generate_projections(image_array)
+    def update_image_stats_and_projections(handle, scale):
+        session = session_store.get(handle)
+        if session is None:
+            return dash.no_update, dash.no_update
+        analytics = analytics_cache.get(session.current, key=session.fingerprint)
+        stats_div = generate_image_stats(analytics)
+        fig_h, fig_v = generate_projections(analytics)
         return html.Div([
             stats_div,
             dcc.Graph(figure=fig_h),
             dcc.Graph(figure=fig_v),
-        ])
+        ]), generate_histogram(analytics, log_scale='log' in (scale or []))
 
     @app.callback(
         Output('download-link', 'href'),
         Output('download-link', 'download'),
         Output('download-link', 'style'),
         Input('save-photo', 'n_clicks'),
-        State('output-image-upload', 'children'),
+        State('image-store', 'data'),
         State('filename-input', 'value'),
         prevent_initial_call=True
     )
-    def save_image(n_clicks, image, filename):
-        if n_clicks is None or image is None or filename is None:
+    def save_image(n_clicks, handle, filename):
+        session = session_store.get(handle)
+        if n_clicks is None or session is None or filename is None:
             return dash.no_update, dash.no_update, {'display': 'none'}
-        header, _, encoded = image['props']['src'].partition(',')
-        download_link = f"data:image/png;base64,{encoded}"
+        # Multi-frame images keep all their frames when saved as GIF or TIFF.
+        format = frame_format(filename) if session.frames is not None else None
+        if format is not None:
+            url = frames_url(handle['session_id'], session.version, format)
+        else:
+            url = publish_current(session)
+        download_link = f"{url}?download={quote(filename)}"
         return download_link, filename, {'display': 'block'}
 
     @app.callback(
@@ -188,4 +463,45 @@ def register_callbacks(app):
     def update_save_status(href):
         if href:
             return "Image ready for download."
-        return "Failed to prepare image for download."
\ No newline at end of file
+        return "Failed to prepare image for download."
+
+    if TIMING_PANEL:
+        register_timing_callbacks(app)
+
+def register_timing_callbacks(app):
+    """Register the callbacks of the timing panel (see ``create_layout(timing_panel=True)``)."""
+    @app.callback(
+        Output('timing-collapse', 'is_open'),
+        Input('timing-toggle', 'n_clicks'),
+        State('timing-collapse', 'is_open'),
+        prevent_initial_call=True
+    )
+    def toggle_timing_panel(n_clicks, is_open):
+        return not is_open
+
+    @app.callback(
+        Output('timing-panel', 'children'),
+        Input('timing-collapse', 'is_open'),
+        Input('output-image-upload', 'children'),
+        State('image-store', 'data')
+    )
+    def update_timing_panel(is_open, image, handle):
+        # Previews only change the displayed image, so refresh on that too.
+        if not is_open:
+            return dash.no_update
+        session = session_store.get(handle)
+        if session is None or session.timings is None:
+            return html.P("No pipeline has run yet.")
+        return generate_timing_table(session.timings, TIMING_PANEL_RUNS)
+
+    @app.callback(
+        Output('trace-download', 'data'),
+        Input('download-trace', 'n_clicks'),
+        State('image-store', 'data'),
+        prevent_initial_call=True
+    )
+    def download_trace(n_clicks, handle):
+        session = session_store.get(handle)
+        if not n_clicks or session is None or session.timings is None:
+            return dash.no_update
+        return dcc.send_string(json.dumps(session.timings.to_chrome_trace()), 'pipeline-trace.json')
@@ -0,0 +1,151 @@
+import io
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterator, Optional
+import numpy as np
+from flask import Flask, Response, abort, request, send_file
+from PIL import Image
+from pipeline.frames import frame_format
+from pipeline.step_cache import fingerprint_image
+
+DEFAULT_MAX_BYTES = 256 * 2**20
+IMAGE_ROUTE = '/rendered-images'
+FRAMES_ROUTE = '/rendered-frames'
+FRAME_MIMETYPES = {'GIF': 'image/gif', 'TIFF': 'image/tiff'}
+# URLs are content-addressed, so a response never changes.
+CACHE_MAX_AGE = 365 * 24 * 3600
+
+
+def encode_png(image: np.array) -> bytes:
+    """Encode a uint8 image array as PNG bytes.
+
+    Gray images (2-D arrays) are stored as one-channel PNGs, which the
+    browser expands to RGB, and alpha is kept.
+    """
+    buff = io.BytesIO()
+    Image.fromarray(image).save(buff, format="PNG")
+    return buff.getvalue()
+
+
+class RenderedImageStore:
+    """Thread-safe LRU store of encoded images, addressed by content hash.
+
+    Every image is published under the fingerprint of its pixels, so the
+    same result is encoded once and keeps the same URL, which lets browsers
+    cache it. When the total size exceeds ``max_bytes`` the least recently
+    used images are dropped; their URLs then answer 404.
+    """
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, route: str = IMAGE_ROUTE):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+        self.__max_bytes = max_bytes
+        self.__route = route.rstrip('/')
+        self.__entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self.__nbytes = 0
+        self.__lock = threading.Lock()
+
+    def publish(self, image: np.array, key: Optional[str] = None) -> str:
+        """Store an image (unless already stored) and return its URL.
+
+        Args:
+            image (np.array): The uint8 image to serve.
+            key (str): The image's fingerprint, if already known.
+
+        Returns:
+            str: The URL of the PNG, relative to the server root.
+        """
+        key = key or fingerprint_image(image)
+        with self.__lock:
+            if key in self.__entries:
+                self.__entries.move_to_end(key)
+                return self.url_for(key)
+        data = encode_png(image)
+        with self.__lock:
+            if key not in self.__entries:
+                self.__entries[key] = data
+                self.__nbytes += len(data)
+                while self.__nbytes > self.__max_bytes and len(self.__entries) > 1:
+                    _, evicted = self.__entries.popitem(last=False)
+                    self.__nbytes -= len(evicted)
+        return self.url_for(key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the PNG bytes stored under ``key`` and mark them as recently used."""
+        with self.__lock:
+            data = self.__entries.get(key)
+            if data is not None:
+                self.__entries.move_to_end(key)
+            return data
+
+    def url_for(self, key: str) -> str:
+        return f"{self.__route}/{key}.png"
+
+    @property
+    def route(self) -> str:
+        return self.__route
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of the stored images."""
+        return self.__nbytes
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+
+def register_image_route(server: Flask, store: RenderedImageStore):
+    """Serve the images of ``store`` from ``server``.
+
+    Responses carry the content hash as a strong ETag and a long-lived,
+    immutable Cache-Control header. Werkzeug answers conditional requests
+    (304 Not Modified) and byte ranges (206 Partial Content). A
+    ``download`` query parameter sends the image as an attachment with
+    that file name.
+    """
+    @server.route(f"{store.route}/<key>.png")
+    def serve_rendered_image(key):
+        data = store.get(key)
+        if data is None:
+            abort(404)
+        download_name = request.args.get('download')
+        response = send_file(
+            io.BytesIO(data),
+            mimetype='image/png',
+            as_attachment=download_name is not None,
+            download_name=download_name or f"{key}.png",
+            etag=key,
+            conditional=True,
+            max_age=CACHE_MAX_AGE,
+        )
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+def frames_url(session_id: str, version: int, format: str, route: str = FRAMES_ROUTE) -> str:
+    """The URL of a session version's frames encoded as ``format`` (see ``register_frames_route``)."""
+    return f"{route.rstrip('/')}/{session_id}/{version}.{format.lower()}"
+
+
+def register_frames_route(server: Flask, render: Callable[[str, int, str], Optional[Iterator[bytes]]],
+                          route: str = FRAMES_ROUTE):
+    """Serve multi-frame results, encoded while they are sent.
+
+    ``render(session_id, version, format)`` returns the chunks of the
+    encoded file, or None if that version of the session is gone (404).
+    Frames are processed as the response streams (see
+    ``frames.encode_frames``), so a download holds a few frames in memory
+    and nothing is stored. A ``download`` query parameter sends the file as
+    an attachment with that file name.
+    """
+    @server.route(f"{route.rstrip('/')}/<session_id>/<int:version>.<extension>")
+    def serve_rendered_frames(session_id, version, extension):
+        format = frame_format(f"{session_id}.{extension}")
+        chunks = render(session_id, version, format) if format is not None else None
+        if chunks is None:
+            abort(404)
+        response = Response(chunks, mimetype=FRAME_MIMETYPES[format])
+        download_name = request.args.get('download')
+        if download_name is not None:
+            response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+        return response
@@ -0,0 +1,133 @@
+import glob
+import os
+import tempfile
+import time
+import uuid
+from typing import Callable, List, Optional, Tuple
+import diskcache
+import numpy as np
+from dash import DiskcacheManager
+# Jobs run registered operators, which subclass the top-level 'interfaces.*'
+# classes and use the top-level 'pipeline.*' modules; import those, not a
+# second copy under 'core.'.
+from pipeline.image_pipeline import ImagePipeline
+from pipeline.precision import DEFAULT_PRECISION, get_dtype
+from pipeline.step_cache import StepCache
+from pipeline.tiling import open_memmap
+from interfaces.IBase import IBase
+from interfaces.IParams import IParams
+
+DEFAULT_JOBS_DIR = os.path.join(tempfile.gettempdir(), 'image-editor-jobs')
+# Steps that read neighbouring pixels run in the background from this size on.
+DEFAULT_BACKGROUND_MIN_PIXELS = 4 * 2**20
+# Job inputs kept on disk, so repeated jobs on the same image skip writing it.
+MAX_INPUT_FILES = 8
+# Results nobody picked up and leftovers of killed jobs are deleted after this many seconds.
+RESULT_MAX_AGE = 3600
+
+
+class JobManager:
+    """Runs pipeline steps as Dash background callbacks, through files on disk.
+
+    Background callbacks run in a separate process that cannot see the
+    in-memory session store, so the input image is written once to a
+    content-addressed ``.npy`` file, memory-mapped by the job and processed
+    tile by tile into a result file. A result only becomes visible under its
+    final name once complete, so cancelled jobs never leave partial output.
+    """
+    def __init__(self, directory: str = DEFAULT_JOBS_DIR,
+                 min_pixels: int = DEFAULT_BACKGROUND_MIN_PIXELS):
+        """Create the job directories and the Dash callback manager.
+
+        Args:
+            directory (str): Where inputs, results and job state are kept.
+            min_pixels (int): Smallest image worth a background job.
+        """
+        self.__directory = directory
+        self.__min_pixels = min_pixels
+        for name in ('inputs', 'results'):
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+        self.callback_manager = DiskcacheManager(diskcache.Cache(os.path.join(directory, 'cache')))
+
+    def is_heavy(self, filter: IBase, params: IParams, shape: Tuple[int, ...]) -> bool:
+        """Whether a step should run in the background on an image of ``shape``.
+
+        Point operators are single fast passes and always run in the request.
+        """
+        footprint = filter.get_footprint(params)
+        return footprint != 0 and shape[0] * shape[1] >= self.__min_pixels
+
+    def write_input(self, image: np.array, key: str) -> str:
+        """Store ``image`` for a job under its fingerprint and return the path."""
+        path = os.path.join(self.__directory, 'inputs', f"{key}.npy")
+        if os.path.exists(path):
+            os.utime(path)
+            return path
+        partial = f"{path}.{uuid.uuid4().hex}.partial"
+        np.save(partial, image)
+        os.replace(partial + '.npy', path)
+        self.__prune()
+        return path
+
+    def run(self, input_path: str, steps: List[Tuple[IBase, IParams]],
+            progress: Optional[Callable[[int, int, int, int], None]] = None,
+            precision: str = DEFAULT_PRECISION) -> str:
+        """Apply ``steps`` to a stored image, tile by tile, one step at a time.
+
+        Args:
+            input_path (str): The image written by ``write_input``.
+            steps (List[Tuple[IBase, IParams]]): The steps to apply.
+            progress (Callable): Called with (step, steps, tile, tiles), all
+                counted from 1, after every tile.
+            precision (str): The working precision of the steps.
+
+        Returns:
+            str: The path of the result ``.npy`` file.
+        """
+        job_id = uuid.uuid4().hex
+        img = open_memmap(input_path, None, mode='r')
+        partials = []
+        try:
+            for index, step in enumerate(steps, start=1):
+                partial = os.path.join(self.__directory, 'results', f"{job_id}.{index}.partial.npy")
+                partials.append(partial)
+                pipeline = ImagePipeline(img, precision, StepCache(0), fuse_linear=False)
+                pipeline.add_step(*step)
+                report = None
+                if progress is not None:
+                    report = lambda done, total, index=index: progress(index, len(steps), done, total)
+                img = pipeline.execute_tiled(out=open_memmap(partial, pipeline.get_output_shape(), get_dtype(precision)),
+                                             progress=report)
+            path = os.path.join(self.__directory, 'results', f"{job_id}.npy")
+            del img
+            os.replace(partials.pop(), path)
+            return path
+        finally:
+            for partial in partials:
+                if os.path.exists(partial):
+                    os.remove(partial)
+
+    @staticmethod
+    def load_result(path: str) -> np.array:
+        """Read a job's result into memory and delete its file."""
+        result = np.load(path)
+        os.remove(path)
+        return result
+
+    @staticmethod
+    def discard_result(path: str):
+        """Delete the result of a job that is no longer wanted."""
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def __prune(self):
+        """Delete the least recently used inputs and old results."""
+        inputs = sorted(glob.glob(os.path.join(self.__directory, 'inputs', '*.npy')), key=os.path.getmtime)
+        expired = time.time() - RESULT_MAX_AGE
+        results = [path for path in glob.glob(os.path.join(self.__directory, 'results', '*.npy'))
+                   if os.path.getmtime(path) < expired]
+        for path in inputs[:-MAX_INPUT_FILES] + results:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,164 @@
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+import numpy as np
+from pipeline.frames import FrameSource
+from pipeline.history import EditHistory
+from pipeline.pyramid import ImagePyramid
+from pipeline.step_cache import fingerprint_image
+from pipeline.instrumentation import TraceCollector
+
+DEFAULT_MAX_BYTES = 1024 * 2**20
+
+
+@dataclass
+class ImageSession:
+    """Decoded images kept on the server for one browser session."""
+    original: np.ndarray
+    current: np.ndarray
+    version: int = 0
+    pyramid: Optional[ImagePyramid] = None
+    history: Optional[EditHistory] = None
+    # Timings of the pipelines run for this session, if they are collected.
+    timings: Optional[TraceCollector] = None
+    # All frames of an animation or multi-page upload; the images above are its first frame.
+    frames: Optional[FrameSource] = None
+    _fingerprint: Optional[str] = field(default=None, repr=False, compare=False)
+
+    @property
+    def fingerprint(self) -> str:
+        """Content hash of ``current``, computed once per version."""
+        if self._fingerprint is None:
+            self._fingerprint = fingerprint_image(self.current)
+        return self._fingerprint
+
+    @property
+    def nbytes(self) -> int:
+        nbytes = self.original.nbytes
+        if self.history is not None:
+            # The history's checkpoints include the current image.
+            nbytes += self.history.nbytes
+        elif self.current is not self.original:
+            nbytes += self.current.nbytes
+        if self.pyramid is not None:
+            nbytes += self.pyramid.nbytes
+        if self.frames is not None:
+            nbytes += self.frames.nbytes
+        return nbytes
+
+
+class ImageSessionStore:
+    """Thread-safe LRU store of decoded images, keyed by session ID.
+
+    Only a small handle (``{'session_id': ..., 'version': ...}``) is sent to
+    the browser; the arrays never leave the server. When the total size of
+    stored images exceeds ``max_bytes`` the least recently used sessions are
+    evicted. The session being written is never evicted, even if it alone is
+    over the budget.
+
+    A session's size is taken when it is stored, and that same amount is
+    subtracted when it is replaced or removed: its ``EditHistory`` is shared
+    by all its versions and grows in place, so measuring it again would
+    subtract more than was added.
+    """
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+        self.__max_bytes = max_bytes
+        self.__sessions: "OrderedDict[str, ImageSession]" = OrderedDict()
+        self.__sizes: Dict[str, int] = {}
+        self.__nbytes = 0
+        self.__lock = threading.Lock()
+
+    def create(self, img: np.array, pyramid: Optional[ImagePyramid] = None,
+               history: Optional[EditHistory] = None, timings: Optional[TraceCollector] = None,
+               frames: Optional[FrameSource] = None) -> dict:
+        """Start a new session whose original and current image is ``img``.
+
+        Args:
+            img (np.array): The decoded uploaded image.
+            pyramid (ImagePyramid): Reduced copies of ``img`` for previews.
+            history (EditHistory): The undo/redo history of the session.
+            timings (TraceCollector): Collects the session's pipeline runs.
+            frames (FrameSource): All frames, if ``img`` is the first frame
+                of a multi-frame image.
+
+        Returns:
+            dict: The handle to keep in a ``dcc.Store``.
+        """
+        session_id = uuid.uuid4().hex
+        img.setflags(write=False)
+        with self.__lock:
+            self.__put(session_id, ImageSession(original=img, current=img, pyramid=pyramid,
+                                                 history=history, timings=timings, frames=frames))
+        return self.__handle(session_id, 0)
+
+    def update(self, handle: dict, img: np.array, pyramid: Optional[ImagePyramid] = None) -> Optional[dict]:
+        """Replace the current image of a session.
+
+        Args:
+            handle (dict): The session handle.
+            img (np.array): The new current image.
+            pyramid (ImagePyramid): Reduced copies of ``img`` for previews.
+
+        Returns:
+            Optional[dict]: The new handle, or None if the session was evicted.
+        """
+        session_id = handle.get('session_id') if handle else None
+        img.setflags(write=False)
+        with self.__lock:
+            session = self.__sessions.get(session_id)
+            if session is None:
+                return None
+            updated = ImageSession(original=session.original, current=img, version=session.version + 1,
+                                   pyramid=pyramid, history=session.history, timings=session.timings,
+                                   frames=session.frames)
+            self.__put(session_id, updated)
+        return self.__handle(session_id, updated.version)
+
+    def get(self, handle: dict) -> Optional[ImageSession]:
+        """Look up a session and mark it as recently used.
+
+        Args:
+            handle (dict): The session handle.
+
+        Returns:
+            Optional[ImageSession]: The session, or None if it was evicted.
+        """
+        session_id = handle.get('session_id') if handle else None
+        with self.__lock:
+            session = self.__sessions.get(session_id)
+            if session is not None:
+                self.__sessions.move_to_end(session_id)
+            return session
+
+    def discard(self, handle: dict):
+        """Drop a session, if it is still stored."""
+        session_id = handle.get('session_id') if handle else None
+        with self.__lock:
+            if self.__sessions.pop(session_id, None) is not None:
+                self.__nbytes -= self.__sizes.pop(session_id)
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of all stored images."""
+        return self.__nbytes
+
+    def __len__(self) -> int:
+        return len(self.__sessions)
+
+    def __put(self, session_id: str, session: ImageSession):
+        if self.__sessions.pop(session_id, None) is not None:
+            self.__nbytes -= self.__sizes.pop(session_id)
+        self.__sessions[session_id] = session
+        self.__sizes[session_id] = session.nbytes
+        self.__nbytes += self.__sizes[session_id]
+        while self.__nbytes > self.__max_bytes and len(self.__sessions) > 1:
+            evicted_id, _ = self.__sessions.popitem(last=False)
+            self.__nbytes -= self.__sizes.pop(evicted_id)
+
+    @staticmethod
+    def __handle(session_id: str, version: int) -> dict:
+        return {'session_id': session_id, 'version': version}
@@ -1,65 +1,108 @@
 from dash import html
 import base64
-import io
 import numpy as np
-import pandas as pd
-from PIL import Image
-import plotly.express as px
+import plotly.graph_objects as go
+from pipeline.frames import FrameSource
+
+HISTOGRAM_CHANNELS = (('R', 'red'), ('G', 'green'), ('B', 'blue'))
 
 def parse_contents(contents):
     return html.Img(src=contents, style={'width': '100%', 'height': 'auto'})
 
-def generate_histogram(image):
-    """Generate an RGB histogram plot for the image with frequency on the y-axis."""
-    r = image[:, :, 0].flatten()
-    g = image[:, :, 1].flatten()
-    b = image[:, :, 2].flatten()
+def decode_upload(contents):
+    """Decode a base64 data URI (as sent by dcc.Upload).
 
-    df = pd.DataFrame({
-        'Channel': ['R'] * len(r) + ['G'] * len(g) + ['B'] * len(b),
-        'Value': np.concatenate([r, g, b])
-    })
+    Gray images stay 2-D and alpha is kept (see ``ChannelLayout``).
 
-    fig = px.histogram(
-        df,
-        x='Value',
-        color='Channel',
-        nbins=256,
-        barmode='overlay',
-        color_discrete_map={'R': 'red', 'G': 'green', 'B': 'blue'}
-    )
+    Returns:
+        tuple: The (first) frame as a uint8 array and, for animations and
+        multi-page files, the ``FrameSource`` of all frames, otherwise None.
+    """
+    header, _, encoded = contents.partition(',')
+    frames = FrameSource(base64.b64decode(encoded))
+    image = np.array(frames.read(0).image.pixels)
+    return image, frames if len(frames) > 1 else None
+
+def generate_histogram(analytics, log_scale=False):
+    """Generate an RGB histogram plot from image analytics with frequency on the y-axis.
+
+    Only the 256 counts per channel are sent to the browser, so the figure
+    has the same size for any image. Alpha is left out.
+    """
+    color_channels = analytics.layout.color_channels
+    counts = analytics.histogram[:color_channels]
+    values = np.arange(256)
+    channels = HISTOGRAM_CHANNELS if color_channels == 3 else (('Gray', 'gray'),)
+    fig = go.Figure([
+        go.Bar(x=values, y=channel_counts, name=name, marker_color=color, opacity=0.5)
+        for (name, color), channel_counts in zip(channels, counts)
+    ])
     fig.update_layout(
         title='RGB Histogram',
         xaxis_title='Channel Value',
-        yaxis_title='Frequency'
+        yaxis_title='Frequency',
+        yaxis_type='log' if log_scale else 'linear',
+        barmode='overlay',
+        bargap=0,
+        legend_title_text='Channel'
     )
     return fig
 
-def generate_projections(image):
-    """Generate horizontal and vertical projection figures by converting image to grayscale first, then summing pixel values."""
-    gray = np.mean(image, axis=2)
-    h_proj = np.sum(gray, axis=1)
-    v_proj = np.sum(gray, axis=0)
-
-    fig_h = px.line(y=h_proj, title="Horizontal Projection")
-    fig_h.update_layout(xaxis_title="Row", yaxis_title="Sum of Intensity")
+def generate_projections(analytics):
+    """Generate horizontal and vertical projection figures from the sums of the grayscale (channel mean) image."""
+    # graph_objects rather than plotly.express, which imports pandas.
+    fig_h = go.Figure(go.Scatter(y=analytics.row_projection, mode='lines'))
+    fig_h.update_layout(title="Horizontal Projection", xaxis_title="Row", yaxis_title="Sum of Intensity")
 
-    fig_v = px.line(y=v_proj, title="Vertical Projection")
-    fig_v.update_layout(xaxis_title="Column", yaxis_title="Sum of Intensity")
+    fig_v = go.Figure(go.Scatter(y=analytics.column_projection, mode='lines'))
+    fig_v.update_layout(title="Vertical Projection", xaxis_title="Column", yaxis_title="Sum of Intensity")
 
     return fig_h, fig_v
 
-def generate_image_stats(image):
+def generate_image_stats(analytics):
     """Return a Dash component with basic image stats, like dimensions, min/max, and mean pixel."""
-    height, width, channels = image.shape
-    min_val = image.min()
-    max_val = image.max()
-    mean_val = image.mean()
+    height, width = analytics.shape[:2]
+    layout = analytics.layout
+    names = [name for name, _ in HISTOGRAM_CHANNELS] if layout.color_channels == 3 else ['Gray']
+    names += ['Alpha'] if layout.has_alpha else []
+    color = slice(0, layout.color_channels)
+    channel_stats = [
+        html.Li(f"{name}: min {low}, max {high}, mean {mean:.2f}, std {std:.2f}")
+        for name, low, high, mean, std in zip(names, analytics.min, analytics.max, analytics.mean, analytics.std)
+    ]
 
     return html.Div([
         html.P(f"Dimensions: {width} x {height}"),
-        html.P(f"Channels: {channels}"),
-        html.P(f"Min Pixel Value: {min_val}"),
-        html.P(f"Max Pixel Value: {max_val}"),
-        html.P(f"Mean Pixel Value: {mean_val:.2f}")
-    ])
\ No newline at end of file
+        html.P(f"Channels: {analytics.channels} ({layout.value})"),
+        html.P(f"Min Pixel Value: {analytics.min[color].min()}"),
+        html.P(f"Max Pixel Value: {analytics.max[color].max()}"),
+        html.P(f"Mean Pixel Value: {analytics.mean[color].mean():.2f}"),
+        html.Ul(channel_stats, className="small")
+    ])
+
+def generate_timing_table(timings, max_runs=5):
+    """Return a Dash component listing the stages of the most recent pipeline runs.
+
+    Tiles of tiled runs are added up per stage; fused steps are one stage.
+    """
+    runs = timings.runs[-max_runs:]
+    if not runs:
+        return html.P("No pipeline has run yet.")
+    sections = []
+    for run in reversed(runs):
+        height, width = run.shape[:2]
+        cached = f", {run.cached_stages} stages from cache" if run.cached_stages else ""
+        sections.append(html.P(
+            f"{run.method}: {len(run.steps)} steps on {width} x {height} {run.dtype}, "
+            f"{run.wall * 1000:.1f} ms{cached}", className="mb-1 fw-bold"))
+        rows = [
+            html.Tr([html.Td(stage['index']), html.Td(stage['name']), html.Td(stage['calls']),
+                     html.Td(f"{stage['wall'] * 1000:.1f}"), html.Td(f"{stage['cpu'] * 1000:.1f}"),
+                     html.Td(f"{stage['allocated'] / 2**20:.1f}")])
+            for stage in timings.summary(run.run)
+        ]
+        sections.append(html.Table([
+            html.Thead(html.Tr([html.Th(name) for name in ('#', 'Step', 'Calls', 'Wall ms', 'CPU ms', 'MB')])),
+            html.Tbody(rows)
+        ], className="table table-sm mb-3"))
+    return html.Div(sections)
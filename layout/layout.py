@@ -1,14 +1,34 @@
 from dash import html, dcc
 import dash_bootstrap_components as dbc
+from pipeline.registry import list_operators
 
-def create_layout():
+def create_timing_panel():
+    """
+    Creates a collapsible card with the per-step timings of recent pipeline runs.
+    """
+    return dbc.Card([
+        dbc.CardHeader(dbc.Button("Pipeline Timing", id="timing-toggle", color="link", className="p-0")),
+        dbc.Collapse(dbc.CardBody([
+            html.Div(id='timing-panel', className="small"),
+            dbc.Button("Download trace", id="download-trace", color="secondary", size="sm", outline=True),
+            dcc.Download(id='trace-download')
+        ]), id='timing-collapse', is_open=False)
+    ], className="mt-4")
+
+def create_layout(timing_panel=False):
     """
     Creates and returns the layout for the application.
+
+    Args:
+        timing_panel (bool): Whether to add the pipeline timing panel.
     """
     return dbc.Container([
         dcc.Store(id='image-store'),
         dcc.Store(id='pipeline-store'),
         dcc.Store(id='original-store'),  # Do przechowywania oryginalnego obrazu
+        dcc.Store(id='preview-width'),
+        dcc.Store(id='job-request'),
+        dcc.Store(id='job-result'),
         
         # Nagłówek
         dbc.Row(
@@ -52,24 +72,28 @@ def create_layout():
                         dbc.CardGroup([
                             dcc.Dropdown(
                                 id='filter-dropdown',
-                                options=[
-                                    {'label': 'Brightness', 'value': 'brightness'},
-                                    {'label': 'Contrast', 'value': 'contrast'},
-                                    {'label': 'Grayscale', 'value': 'grayscale'},
-                                    {'label': 'Binarization', 'value': 'binarization'},
-                                    {'label': 'Negative', 'value': 'negative'},
-                                    {'label': 'Average Blur', 'value': 'average'},
-                                    {'label': 'Gaussian Blur', 'value': 'gaussian'},
-                                    {'label': 'Sharpening', 'value': 'sharpening'},
-                                    {'label': 'Sobel Edge', 'value': 'sobel'},
-                                    {'label': 'Roberts Edge', 'value': 'roberts'},
-                                ],
+                                options=[{'label': spec.label, 'value': spec.name} for spec in list_operators()],
                                 placeholder="Select a filter",
                                 style={"min-width": "300px"}
                             )
                         ]),
                         html.Div(id='filter-parameters', className="mt-3"),
-                        dbc.Button("Add Filter!", id="add-filter", color="success", className="mt-3", disabled=True)
+                        dbc.Button("Add Filter!", id="add-filter", color="success", className="mt-3", disabled=True),
+                        html.Div([
+                            dbc.Progress(id='job-progress', value=0, striped=True, animated=True, className="mb-2"),
+                            dbc.Button("Cancel", id="cancel-job", color="danger", size="sm", outline=True)
+                        ], id='job-status', className="mt-3", style={'display': 'none'})
+                    ])
+                ], className="mb-4"),
+                
+                dbc.Card([
+                    dbc.CardHeader("History"),
+                    dbc.CardBody([
+                        dbc.ButtonGroup([
+                            dbc.Button("Undo", id="undo-button", color="secondary", outline=True, disabled=True),
+                            dbc.Button("Redo", id="redo-button", color="secondary", outline=True, disabled=True)
+                        ], className="mb-3"),
+                        html.Div(id='history-strip', style={'display': 'flex', 'overflowX': 'auto', 'gap': '4px'})
                     ])
                 ], className="mb-4"),
                 
@@ -95,16 +119,28 @@ def create_layout():
                 dbc.Card([
                     dbc.CardHeader("Image Preview"),
                     dbc.CardBody([
-                        html.Div(id='output-image-upload', className="text-center")
+                        html.Div(id='output-image-upload', className="text-center"),
+                        html.Div([
+                            html.Label("Frame:"),
+                            dcc.Slider(id='frame-slider', min=0, max=0, step=1, value=0, marks=None,
+                                       tooltip={"placement": "bottom", "always_visible": True}),
+                            html.Small("Filters are shown on the selected frame and applied to all of them. "
+                                       "Save as .gif or .tif to keep every frame.", className="text-muted")
+                        ], id='frame-controls', className="mt-3", style={'display': 'none'})
                     ])
                 ], className="mb-4"),
                 
                 dbc.Card([
                     dbc.CardHeader("Color Histogram"),
                     dbc.CardBody([
+                        dcc.Checklist(
+                            id='histogram-scale',
+                            options=[{'label': ' Log scale', 'value': 'log'}],
+                            value=[]
+                        ),
                         dcc.Graph(id='color-histogram')
                     ])
                 ])
-            ], md=8)
+            ] + ([create_timing_panel()] if timing_panel else []), md=8)
         ])
     ], fluid=True, className="mt-4")
\ No newline at end of file
@@ -1 +1,203 @@
-print('Hello, world!')
\ No newline at end of file
+"""Headless batch processing: apply a JSON pipeline recipe to many images.
+
+Example:
+    python main.py recipe.json "photos/*.jpg" -o processed/ --workers 8
+
+Many small images (thumbnails) go faster with ``--batch-size 32``, which
+runs same-sized images through the pipeline as stacked batches.
+
+Animated GIFs and multi-page TIFFs keep all their frames with ``--format gif``
+or ``--format tif``; they are processed a frame at a time. Other formats get
+the first frame.
+
+See ``core/pipeline/recipes.py`` for the recipe format.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+root_path = os.path.dirname(os.path.abspath(__file__))
+for path in ('core', os.path.join('core', 'pipeline')):
+    sys.path.append(os.path.join(root_path, path))
+
+from pipeline.batching import execute_batches
+from pipeline.frames import FrameSource, frame_format, process_frames, save_frames
+from pipeline.image_buffer import ImageBuffer
+from pipeline.recipes import parse_recipe
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.gif', '.webp')
+
+# Parsed recipe of the current worker process, set by _init_worker.
+_worker_recipe = None
+
+
+def find_images(inputs):
+    """Expand directories and glob patterns into a sorted list of image files."""
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = (os.path.join(item, name) for name in os.listdir(item))
+        else:
+            candidates = glob.glob(item, recursive=True)
+        paths.update(path for path in candidates
+                     if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+def _init_worker(recipe):
+    global _worker_recipe
+    _worker_recipe = parse_recipe(recipe)
+
+
+def _error_message(exc):
+    return f"{type(exc).__name__}: {exc}"
+
+
+def process_images(jobs):
+    """Decode images, run the worker's recipe on them and encode the results.
+
+    Consecutive images of the same size are processed as stacked batches
+    (see ``batching.execute_batches``). Multi-frame images written to a
+    multi-frame format are streamed frame by frame instead (see
+    ``frames.process_frames``).
+
+    Args:
+        jobs (list): ``(src, dst)`` file name pairs.
+
+    Returns:
+        list: ``(src, bytes read, error message or None)`` per job.
+    """
+    precision, steps = _worker_recipe
+    results, decoded = [], []
+    for src, dst in jobs:
+        try:
+            frames = FrameSource(src)
+            if len(frames) > 1 and frame_format(dst) is not None:
+                save_frames(process_frames(frames, steps, precision), dst, loop=frames.loop)
+                results.append((src, os.path.getsize(src), None))
+            else:
+                decoded.append((src, dst, frames.read(0).image))
+        except Exception as exc:
+            results.append((src, 0, _error_message(exc)))
+    try:
+        outputs = list(execute_batches([img for _, _, img in decoded], steps, precision))
+    except Exception as exc:
+        return results + [(src, 0, _error_message(exc)) for src, _, _ in decoded]
+    for (src, dst, img), output in zip(decoded, outputs):
+        try:
+            ImageBuffer.from_array(output, img.colorspace).save(dst)
+            results.append((src, os.path.getsize(src), None))
+        except Exception as exc:
+            results.append((src, 0, _error_message(exc)))
+    return results
+
+
+def assign_outputs(sources, output_dir, extension):
+    """Name the output file of every source: its base name with ``extension``.
+
+    Sources whose outputs would have the same name (``a/x.jpg`` and
+    ``b/x.jpg``, or ``x.jpg`` and ``x.png``) would overwrite each other, so
+    none of them gets one.
+
+    Returns:
+        tuple: ``(jobs, clashes)``, the ``(src, dst)`` pairs of the sources
+        with an output of their own and ``(src, dst, other sources)`` for
+        the others.
+    """
+    by_name = {}
+    for src in sources:
+        name = os.path.splitext(os.path.basename(src))[0] + extension
+        by_name.setdefault(os.path.normcase(name), (name, []))[1].append(src)
+    jobs, clashes = [], []
+    for name, srcs in by_name.values():
+        dst = os.path.join(output_dir, name)
+        if len(srcs) == 1:
+            jobs.append((srcs[0], dst))
+        else:
+            clashes.extend((src, dst, [other for other in srcs if other != src]) for src in srcs)
+    return jobs, clashes
+
+
+def run_batch(recipe, sources, output_dir, workers=None, max_in_flight=None, extension='.png', batch_size=1):
+    """Process ``sources`` in a process pool with a bounded number of queued tasks.
+
+    Every worker decodes, processes and encodes its own images, ``batch_size``
+    per task, so only file names cross process boundaries and memory stays
+    proportional to ``max_in_flight`` tasks. Sources whose output names
+    clash are not processed and count as failed (see ``assign_outputs``).
+
+    Returns:
+        tuple: ``(processed, failed, bytes read, elapsed seconds)``.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    processed = failed = total_bytes = 0
+    start = time.perf_counter()
+    jobs, clashes = assign_outputs(sources, output_dir, extension)
+    for src, dst, others in clashes:
+        failed += 1
+        print(f"{src}: {dst} would also be written for {', '.join(others)}", file=sys.stderr)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(recipe,)) as pool:
+        pending = set()
+        queue = iter(jobs)
+        while True:
+            for first in queue:
+                pending.add(pool.submit(process_images, [first] + list(islice(queue, batch_size - 1))))
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for src, nbytes, error in future.result():
+                    if error is None:
+                        processed += 1
+                        total_bytes += nbytes
+                    else:
+                        failed += 1
+                        print(f"{src}: {error}", file=sys.stderr)
+    return processed, failed, total_bytes, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply a pipeline recipe to a batch of images.")
+    parser.add_argument('recipe', help="JSON recipe file")
+    parser.add_argument('inputs', nargs='+', help="image files, directories or glob patterns")
+    parser.add_argument('-o', '--output', required=True, help="output directory")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help="tasks queued or being processed at once (default: 2 x workers)")
+    parser.add_argument('-b', '--batch-size', type=int, default=1,
+                        help="images per task, run as stacked batches when of the same size (default: 1)")
+    parser.add_argument('--format', default='png', help="output file extension (default: png)")
+    args = parser.parse_args(argv)
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+
+    with open(args.recipe) as file:
+        recipe = json.load(file)
+    try:
+        parse_recipe(recipe)
+    except ValueError as exc:
+        parser.error(f"invalid recipe: {exc}")
+    sources = find_images(args.inputs)
+    if not sources:
+        parser.error("no images found")
+
+    processed, failed, total_bytes, elapsed = run_batch(
+        recipe, sources, args.output, args.workers, args.max_in_flight, '.' + args.format.lstrip('.'),
+        args.batch_size)
+    elapsed = max(elapsed, 1e-9)
+    print(f"Processed {processed} images ({failed} failed) in {elapsed:.2f} s: "
+          f"{processed / elapsed:.2f} images/s, {total_bytes / elapsed / 2**20:.2f} MB/s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())